@@ -0,0 +1,66 @@
+"""Per-megapixel throughput of the compositing kernels.
+
+Run from the repository root:
+
+    python benchmarks/bench_compositing.py --size 2048 --repeat 5
+
+Prints one JSON object per mode and dtype on stdout.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'example3'))
+
+from compositing import KERNELS  # noqa: E402
+
+
+def bench_mode(mode, dtype, size, repeat, nodata_fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+    high = min(info.max, 10000)
+    base = rng.integers(0, high, (size, size)).astype(dtype)
+    data = rng.integers(0, high, (size, size)).astype(dtype)
+    base_valid = rng.random((size, size)) >= nodata_fraction
+    data_valid = rng.random((size, size)) >= nodata_fraction
+
+    timings = []
+    for _ in range(repeat):
+        tile, valid = base.copy(), base_valid.copy()
+        count = valid.astype(np.uint32)
+        start = time.perf_counter()
+        KERNELS[mode](tile, valid, count, data, data_valid, 1)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        'benchmark': 'compositing',
+        'mode': mode,
+        'dtype': np.dtype(dtype).name,
+        'megapixels': size * size / 1e6,
+        'nodata_fraction': nodata_fraction,
+        'best_seconds': best,
+        'mpix_per_second': size * size / 1e6 / best,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=2048, help='window edge in pixels')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--nodata-fraction', type=float, default=0.2)
+    parser.add_argument('--dtypes', default='uint8,uint16,float32')
+    args = parser.parse_args()
+
+    for dtype in args.dtypes.split(','):
+        for mode in KERNELS:
+            result = bench_mode(mode, np.dtype(dtype).type, args.size, args.repeat, args.nodata_fraction)
+            print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
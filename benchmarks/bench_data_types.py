@@ -0,0 +1,99 @@
+"""Bytes moved and merge time with native, Float32 and packed mosaic types.
+
+Run from the repository root (needs GDAL's Python bindings and NumPy):
+
+    python benchmarks/bench_data_types.py --size 4096 --bands 3 --dtype uint8
+
+Two overlapping synthetic scenes are merged into a GeoTIFF created with the
+type common_data_type picks, with Float32 as merge_rasters used to force,
+and (for float inputs) packed into UInt16 with a scale/offset. "bytes_moved"
+counts the pixels read from the inputs plus those written to the mosaic at
+the mosaic's type. Prints one JSON object per variant on stdout.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from osgeo import gdal, gdal_array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'example3'))
+
+from compositing import last_valid  # noqa: E402
+from output_profiles import DEFLATE, creation_options  # noqa: E402
+from raster_merge import common_data_type, stream_merge, union_grid, value_packing  # noqa: E402
+
+
+def synthetic_scene(path, origin, size, bands, dtype, rng):
+    high = np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1000.0
+    data_type = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+    ds = gdal.GetDriverByName('GTiff').Create(path, size, size, bands, data_type,
+                                              options=['TILED=YES'])
+    ds.SetGeoTransform((origin, 1.0, 0, size + origin, 0, -1.0))
+    y, x = np.mgrid[0:size, 0:size]
+    for i in range(1, bands + 1):
+        data = (np.sin(x / 97.0 + i) + np.cos(y / 61.0) + 2) / 4 * high * 0.9
+        data += rng.normal(0, high * 0.01, (size, size))
+        ds.GetRasterBand(i).WriteArray(np.clip(data, 0, high).astype(dtype))
+    ds.FlushCache()
+    return ds
+
+
+def bench_variant(name, path, scenes, data_type, packing=None):
+    gt, x_size, y_size = union_grid(scenes)
+    bands = scenes[0].RasterCount
+    start = time.perf_counter()
+    out_ds = gdal.GetDriverByName('GTiff').Create(
+        path, x_size, y_size, bands, data_type,
+        options=creation_options(DEFLATE, data_type, x_size, y_size, bands))
+    out_ds.SetGeoTransform(gt)
+    placements = [(ds, int(round((ds.GetGeoTransform()[0] - gt[0]) / gt[1])),
+                   int(round((ds.GetGeoTransform()[3] - gt[3]) / gt[5]))) for ds in scenes]
+    stream_merge(out_ds, placements, last_valid, packings=[packing] * len(scenes) if packing else None)
+    out_ds = None
+    seconds = time.perf_counter() - start
+
+    input_bytes = sum(ds.RasterXSize * ds.RasterYSize * bands *
+                      gdal.GetDataTypeSize(ds.GetRasterBand(1).DataType) // 8 for ds in scenes)
+    output_bytes = x_size * y_size * bands * gdal.GetDataTypeSize(data_type) // 8
+    return {
+        'benchmark': 'data_type',
+        'variant': name,
+        'output_type': gdal.GetDataTypeName(data_type),
+        'merge_seconds': seconds,
+        'bytes_moved': input_bytes + output_bytes,
+        'file_bytes': os.path.getsize(path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--bands', type=int, default=3)
+    parser.add_argument('--dtype', default='uint8')
+    args = parser.parse_args()
+
+    dtype = np.dtype(args.dtype).type
+    rng = np.random.default_rng(0)
+    folder = tempfile.mkdtemp()
+    try:
+        scenes = [synthetic_scene(os.path.join(folder, f'scene{i}.tif'), i * args.size // 2,
+                                  args.size, args.bands, dtype, rng) for i in range(2)]
+        native = common_data_type(scenes)
+        variants = [('native', native, None), ('float32', gdal.GDT_Float32, None)]
+        if np.issubdtype(dtype, np.floating):
+            variants.append(('packed_uint16', gdal.GDT_UInt16, value_packing(scenes)))
+        for name, data_type, packing in variants:
+            path = os.path.join(folder, f'{name}.tif')
+            print(json.dumps(bench_variant(name, path, scenes, data_type, packing)))
+        scenes = None
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
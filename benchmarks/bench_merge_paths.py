@@ -0,0 +1,254 @@
+"""Throughput, peak memory and latency of the plugins' merge paths on synthetic scenes.
+
+Run from the repository root with QGIS's Python (needs qgis, GDAL and NumPy):
+
+    python benchmarks/bench_merge_paths.py --size 4096 --scenes 4 --bands 3 --dtype uint16 \
+        --overlap 0.25 --pattern grid --crs 32633,32634 --workers 0,1
+
+Synthetic georeferenced scenes of the given size, band count and dtype are
+laid out in an overlap pattern ("grid", "strip" or "stack") and assigned
+EPSG codes from --crs in turn, so scenes in a second CRS exercise the
+reprojection path. Every merge path then runs headlessly in a fresh
+process, so its peak RSS is its own:
+
+    example2_build      Example2.merge_images building the mosaic from the base image
+    example2_update     Example2.merge_images updating an existing mosaic in place
+    example3_merge      Example3.merge_rasters writing a new mosaic
+    example3_in_place   Example3.merge_rasters into a mosaic that already covers the scenes
+
+The plugins get the iface of test/qgis_interface.py when that stub loads
+(it targets the QGIS 2 API), else a bare headless QgsApplication; the merge
+paths do not use the iface. QSettings go to a temporary INI file, so the
+user's QGIS profile is left alone.
+
+Prints one JSON object per path and worker count on stdout: input and
+output megapixels, end-to-end seconds of the call, MPix/s of input, peak
+RSS of the merging process and of its pool workers, the per-stage seconds
+recorded by the plugin's PipelineMetrics, and the git commit of the tree.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from osgeo import gdal, gdal_array, osr
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+PATHS = ('example2_build', 'example2_update', 'example3_merge', 'example3_in_place')
+PATTERNS = ('grid', 'strip', 'stack')
+
+# Where the first scene's upper-left corner lands, in the first CRS (metres)
+ORIGIN = (300000.0, 5600000.0)
+
+
+def scene_origins(count, size, pixel_size, overlap, pattern):
+    """Return the upper-left (x, y) of each scene in the first CRS."""
+    step = size * pixel_size * (1 - overlap)
+    if pattern == 'stack':
+        return [ORIGIN] * count
+    if pattern == 'strip':
+        return [(ORIGIN[0] + i * step, ORIGIN[1]) for i in range(count)]
+    columns = int(np.ceil(np.sqrt(count)))
+    return [(ORIGIN[0] + (i % columns) * step, ORIGIN[1] - (i // columns) * step) for i in range(count)]
+
+
+def to_crs(x, y, src_epsg, dst_epsg):
+    if src_epsg == dst_epsg:
+        return x, y
+    src, dst = osr.SpatialReference(), osr.SpatialReference()
+    src.ImportFromEPSG(src_epsg)
+    dst.ImportFromEPSG(dst_epsg)
+    src.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    dst.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return osr.CoordinateTransformation(src, dst).TransformPoint(x, y)[:2]
+
+
+def synthetic_scene(path, origin, epsg, size, bands, dtype, pixel_size, rng):
+    """Write a tiled GeoTIFF with smooth per-band patterns plus noise and a nodata value."""
+    high = np.iinfo(dtype).max - 1 if np.issubdtype(dtype, np.integer) else 1000.0
+    data_type = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+    ds = gdal.GetDriverByName('GTiff').Create(path, size, size, bands, data_type,
+                                              options=['TILED=YES', 'COMPRESS=DEFLATE'])
+    ds.SetGeoTransform((origin[0], pixel_size, 0, origin[1], 0, -pixel_size))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    ds.SetProjection(srs.ExportToWkt())
+    y, x = np.mgrid[0:size, 0:size]
+    for i in range(1, bands + 1):
+        data = (np.sin(x / 97.0 + i) + np.cos(y / 61.0) + 2) / 4 * high * 0.9
+        data += rng.normal(0, high * 0.01, (size, size))
+        band = ds.GetRasterBand(i)
+        band.SetNoDataValue(high + 1 if np.issubdtype(dtype, np.integer) else -9999)
+        band.WriteArray(np.clip(data, 0, high).astype(dtype))
+    ds = None
+
+
+def make_scenes(folder, args):
+    epsgs = [int(code) for code in args.crs.split(',')]
+    dtype = np.dtype(args.dtype).type
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, origin in enumerate(scene_origins(args.scenes, args.size, args.pixel_size, args.overlap, args.pattern)):
+        epsg = epsgs[i % len(epsgs)]
+        path = os.path.join(folder, f'scene{i:03d}.tif')
+        synthetic_scene(path, to_crs(*origin, epsgs[0], epsg), epsg, args.size, args.bands, dtype,
+                        args.pixel_size, rng)
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb(who):
+    """Peak resident set size in MiB of this process or of its waited-for children."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1024.0 / (1024.0 if sys.platform == 'darwin' else 1.0)
+
+
+def qgis_session(settings_folder):
+    """Start QGIS headlessly with QSettings kept in settings_folder; returns (app, iface)."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.PyQt.QtCore import QSettings
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, settings_folder)
+
+    sys.path.insert(0, ROOT)
+    from example3.test.utilities import get_qgis_app
+    app, _, iface, _ = get_qgis_app()
+    if app is None:
+        from qgis.core import QgsApplication
+        app = QgsApplication([], False)
+        app.initQgis()
+    QSettings().setValue('locale/userLocale', 'en_US')
+    return app, iface
+
+
+def run_path(path_name, scene_paths, folder, workers, results):
+    """Child process: prepare and time one merge path, then report through results."""
+    _app, iface = qgis_session(os.path.join(folder, 'settings'))
+    from qgis.PyQt.QtCore import QSettings
+    from example2.example2 import Example2
+    from example3.example3 import Example3
+
+    plugin_name = path_name.split('_')[0]
+    settings = QSettings()
+    settings.setValue(f'{plugin_name}/merge_workers', workers)
+    base, new = scene_paths[0], scene_paths[1:]
+    output_path = os.path.join(folder, 'merged_output.tif')
+
+    if plugin_name == 'example2':
+        plugin = Example2(iface)
+        if path_name == 'example2_update':
+            # Build the mosaic first; the timed call then updates it image by image
+            plugin.merge_images(base, new, output_path)
+            settings.setValue('example2/incremental_merge', True)
+        else:
+            settings.setValue('example2/incremental_merge', False)
+        plugin.metrics = type(plugin.metrics)()
+        start = time.perf_counter()
+        ok = plugin.merge_images(base, new, output_path)
+    else:
+        plugin = Example3(iface)
+        if path_name == 'example3_in_place':
+            # The first merge grows the mosaic to cover every scene; the timed one rewrites in place
+            plugin.merge_rasters(base, new)
+            base = output_path
+        plugin.metrics = type(plugin.metrics)()
+        start = time.perf_counter()
+        ok = plugin.merge_rasters(base, new)
+    seconds = time.perf_counter() - start
+    plugin.datasets.close()
+
+    # Updates read the new scenes; full merges also read the base scene
+    out_ds = gdal.Open(output_path)
+    input_pixels = 0
+    for path in new if path_name in ('example2_update', 'example3_in_place') else scene_paths:
+        ds = gdal.Open(path)
+        input_pixels += ds.RasterXSize * ds.RasterYSize
+    results.put({
+        'ok': bool(ok),
+        'input_mpix': input_pixels / 1e6,
+        'output_mpix': out_ds.RasterXSize * out_ds.RasterYSize / 1e6 if out_ds else 0.0,
+        'seconds': seconds,
+        'mpix_per_second': input_pixels / 1e6 / seconds if seconds else None,
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_worker_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        'stages': {stage: total for stage, count, total, *_ in plugin.metrics.snapshot() if count},
+    })
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=2048, help='scene edge in pixels')
+    parser.add_argument('--scenes', type=int, default=4)
+    parser.add_argument('--bands', type=int, default=3)
+    parser.add_argument('--dtype', default='uint16')
+    parser.add_argument('--pixel-size', type=float, default=10.0, help='metres')
+    parser.add_argument('--overlap', type=float, default=0.25, help='fraction shared by neighbouring scenes')
+    parser.add_argument('--pattern', choices=PATTERNS, default='grid')
+    parser.add_argument('--crs', default='32633', help='comma-separated EPSG codes assigned to scenes in turn')
+    parser.add_argument('--workers', default='0', help='comma-separated merge_workers values; 0 is one per CPU')
+    parser.add_argument('--paths', default=','.join(PATHS))
+    args = parser.parse_args()
+
+    commit = git_commit()
+    context = multiprocessing.get_context('spawn')
+    folder = tempfile.mkdtemp()
+    try:
+        scene_folder = os.path.join(folder, 'scenes')
+        os.mkdir(scene_folder)
+        scene_paths = make_scenes(scene_folder, args)
+        for path_name in args.paths.split(','):
+            for workers in [int(value) for value in args.workers.split(',')]:
+                case_folder = tempfile.mkdtemp(dir=folder)
+                # example3 writes the mosaic next to the scenes, so every case gets its own copies
+                case_paths = [shutil.copy(path, case_folder) for path in scene_paths]
+                results = context.Queue()
+                child = context.Process(target=run_path, args=(path_name, case_paths, case_folder, workers, results))
+                child.start()
+                child.join()
+                if child.exitcode == 0:
+                    result = results.get()
+                else:
+                    result = {'ok': False, 'error': f'merge process exited with code {child.exitcode}'}
+                result.update({
+                    'benchmark': 'merge_path',
+                    'path': path_name,
+                    'workers': workers,
+                    'scenes': args.scenes,
+                    'size': args.size,
+                    'bands': args.bands,
+                    'dtype': args.dtype,
+                    'pattern': args.pattern,
+                    'overlap': args.overlap,
+                    'crs': args.crs,
+                    'commit': commit,
+                })
+                print(json.dumps(result), flush=True)
+                shutil.rmtree(case_folder)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
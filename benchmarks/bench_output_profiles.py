@@ -0,0 +1,95 @@
+"""Write time, file size and render time of each mosaic output profile.
+
+Run from the repository root (needs GDAL's Python bindings and NumPy):
+
+    python benchmarks/bench_output_profiles.py --size 8192 --bands 3 --dtype uint16
+
+Each profile writes the same synthetic raster, then "render time" reads a
+1024 px wide view of the whole raster (served from overviews when present)
+followed by 16 random 512 px full-resolution windows, like a pan and zoom.
+Prints one JSON object per profile on stdout.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from osgeo import gdal, gdal_array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'example3'))
+
+from output_profiles import PROFILES, creation_options, finalize_output  # noqa: E402
+
+
+def synthetic_band(size, dtype, rng):
+    """Smooth gradients plus noise, which compresses like real imagery rather than random bytes."""
+    y, x = np.mgrid[0:size, 0:size]
+    high = np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1.0
+    data = (np.sin(x / 97.0) + np.cos(y / 61.0) + 2) / 4 * high * 0.9
+    data += rng.normal(0, high * 0.01, (size, size))
+    return np.clip(data, 0, high).astype(dtype)
+
+
+def bench_profile(profile, path, bands_data, data_type):
+    size = bands_data[0].shape[0]
+    options = creation_options(profile, data_type, size, size, len(bands_data))
+    start = time.perf_counter()
+    ds = gdal.GetDriverByName('GTiff').Create(path, size, size, len(bands_data), data_type, options=options)
+    for i, data in enumerate(bands_data, start=1):
+        ds.GetRasterBand(i).WriteArray(data)
+    ds = None
+    finalize_output(path, profile)
+    write_seconds = time.perf_counter() - start
+
+    gdal.SetCacheMax(0)
+    rng = np.random.default_rng(1)
+    start = time.perf_counter()
+    ds = gdal.Open(path)
+    ds.ReadAsArray(buf_xsize=1024, buf_ysize=1024)
+    for _ in range(16):
+        xoff, yoff = rng.integers(0, size - 512, 2)
+        ds.ReadAsArray(int(xoff), int(yoff), 512, 512)
+    ds = None
+    render_seconds = time.perf_counter() - start
+    gdal.SetCacheMax(256 * 1024 * 1024)
+
+    return {
+        'benchmark': 'output_profile',
+        'profile': profile,
+        'size': size,
+        'bands': len(bands_data),
+        'dtype': np.dtype(bands_data[0].dtype).name,
+        'write_seconds': write_seconds,
+        'file_bytes': os.path.getsize(path),
+        'render_seconds': render_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--bands', type=int, default=3)
+    parser.add_argument('--dtype', default='uint8')
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    args = parser.parse_args()
+
+    dtype = np.dtype(args.dtype).type
+    data_type = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+    rng = np.random.default_rng(0)
+    bands_data = [synthetic_band(args.size, dtype, rng) for _ in range(args.bands)]
+
+    folder = tempfile.mkdtemp()
+    try:
+        for profile in args.profiles.split(','):
+            path = os.path.join(folder, f'{profile}.tif')
+            print(json.dumps(bench_profile(profile, path, bands_data, data_type)))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
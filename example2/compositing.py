@@ -0,0 +1,79 @@
+"""Vectorized, nodata-aware compositing kernels for window-by-window merges.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Every kernel updates one output window in place from one source window:
+
+    kernel(tile, valid, count, data, data_valid, weight)
+
+`tile` holds the composited values and `valid` marks pixels that already
+have one. `count` is the number of scenes behind each pixel (only the mean
+kernels read or update it). `data` and `data_valid` are the source values and
+its validity mask (nodata, mask and alpha bands already applied), and
+`weight` is how many scenes each source pixel stands for, either 1 or an
+array such as the count sidecar of an existing mosaic.
+"""
+import numpy as np
+
+LAST_VALID = 'last_valid'
+FIRST_VALID = 'first_valid'
+MAXIMUM = 'max'
+MINIMUM = 'min'
+MEAN = 'mean'
+RUNNING_MEAN = 'running_mean'
+
+
+def last_valid(tile, valid, count, data, data_valid, weight):
+    """Valid source pixels replace whatever is there."""
+    np.copyto(tile, data, where=data_valid, casting='unsafe')
+
+
+def first_valid(tile, valid, count, data, data_valid, weight):
+    """Source pixels only fill gaps; the first valid value is kept."""
+    np.copyto(tile, data, where=data_valid & ~valid, casting='unsafe')
+
+
+def maximum(tile, valid, count, data, data_valid, weight):
+    np.copyto(tile, data, where=data_valid & (~valid | (data > tile)), casting='unsafe')
+
+
+def minimum(tile, valid, count, data, data_valid, weight):
+    np.copyto(tile, data, where=data_valid & (~valid | (data < tile)), casting='unsafe')
+
+
+def mean(tile, valid, count, data, data_valid, weight):
+    """Count-weighted running mean: each source pixel counts `weight` times."""
+    if not data_valid.any():
+        return
+    if np.ndim(weight):
+        weight = np.maximum(weight[data_valid], 1)
+    current = np.where(valid[data_valid], tile[data_valid], 0).astype(np.float64)
+    total = count[data_valid] + weight
+    merged = current + (data[data_valid] - current) * (weight / total)
+    if np.issubdtype(tile.dtype, np.integer):
+        merged = np.rint(merged)
+    tile[data_valid] = merged
+    count[data_valid] = total
+
+
+KERNELS = {
+    LAST_VALID: last_valid,
+    FIRST_VALID: first_valid,
+    MAXIMUM: maximum,
+    MINIMUM: minimum,
+    MEAN: mean,
+    RUNNING_MEAN: mean,
+}
+
+# Modes that need the per-pixel scene count of the existing mosaic kept on disk
+COUNTED_MODES = (RUNNING_MEAN,)
+
+MODE_LABELS = {
+    LAST_VALID: 'Last valid wins',
+    FIRST_VALID: 'First valid wins',
+    MAXIMUM: 'Maximum',
+    MINIMUM: 'Minimum',
+    MEAN: 'Mean of inputs',
+    RUNNING_MEAN: 'Running mean (count weighted)',
+}
@@ -0,0 +1,124 @@
+"""LRU pool of open GDAL datasets and a cache of their header metadata.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Entries are keyed by path and validated against the file's size and mtime,
+so a file rewritten on disk is reopened rather than served stale. Handles
+are read-only; code that writes a cached path must call invalidate() first
+so no stale handle (and its block cache) outlives the write. GDAL dataset
+handles are not thread-safe, so each thread gets handles of its own.
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from osgeo import gdal
+
+Header = namedtuple('Header', 'x_size y_size geotransform projection band_count data_types nodata')
+
+DEFAULT_MAX_HANDLES = 16
+DEFAULT_MAX_HEADERS = 1024
+
+
+class DatasetCache:
+    """Keep at most `max_handles` datasets open, closing the least recently used first.
+
+    Handles are pooled per thread: a handle is only ever returned to the
+    thread that opened it. A handle evicted while a caller still holds it
+    stays valid for that caller; GDAL closes it once the last reference is dropped.
+    """
+
+    def __init__(self, max_handles=DEFAULT_MAX_HANDLES, max_headers=DEFAULT_MAX_HEADERS):
+        self.max_handles = max_handles
+        self.max_headers = max_headers
+        self.handles = OrderedDict()  # (thread id, path) -> (signature, dataset)
+        self.headers = OrderedDict()  # path -> (signature, Header)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def open(self, path):
+        """Return a read-only dataset for path, or None if GDAL cannot open it."""
+        signature = file_signature(path)
+        key = (threading.get_ident(), path)
+        with self.lock:
+            entry = self.handles.get(key)
+            if entry is not None and entry[0] == signature:
+                self.handles.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.handles.pop(key, None)
+            self.misses += 1
+
+        ds = gdal.Open(path)
+        if ds is None:
+            return None
+        with self.lock:
+            self.handles[key] = (signature, ds)
+            self.handles.move_to_end(key)
+            while len(self.handles) > self.max_handles:
+                self.handles.popitem(last=False)
+        return ds
+
+    def header(self, path):
+        """Return the Header of path, reading it (through the handle pool) only when the file changed."""
+        signature = file_signature(path)
+        with self.lock:
+            entry = self.headers.get(path)
+            if entry is not None and entry[0] == signature:
+                self.headers.move_to_end(path)
+                return entry[1]
+
+        ds = self.open(path)
+        if ds is None:
+            return None
+        bands = [ds.GetRasterBand(i) for i in range(1, ds.RasterCount + 1)]
+        header = Header(ds.RasterXSize, ds.RasterYSize, ds.GetGeoTransform(), ds.GetProjection(),
+                        ds.RasterCount, tuple(band.DataType for band in bands),
+                        tuple(band.GetNoDataValue() for band in bands))
+        with self.lock:
+            self.headers[path] = (signature, header)
+            self.headers.move_to_end(path)
+            while len(self.headers) > self.max_headers:
+                self.headers.popitem(last=False)
+        return header
+
+    def invalidate(self, path):
+        """Drop the handles (of every thread) and header of path, e.g. before it is rewritten."""
+        with self.lock:
+            for key in [key for key in self.handles if key[1] == path]:
+                del self.handles[key]
+            self.headers.pop(path, None)
+
+    def close(self):
+        """Close every pooled handle and forget all headers."""
+        with self.lock:
+            self.handles.clear()
+            self.headers.clear()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.handles)
+
+
+def header_bounds(header):
+    """Return the (min_x, min_y, max_x, max_y) footprint of a north-up Header."""
+    gt = header.geotransform
+    return (gt[0], gt[3] + header.y_size * gt[5], gt[0] + header.x_size * gt[1], gt[3])
+
+
+def file_signature(path):
+    """Return (size, mtime) of path, or None if it does not exist.
+
+    GDAL virtual paths (e.g. /vsizip/ members) are stat'ed through GDAL,
+    with the member's size and mtime as recorded in the archive.
+    """
+    if path.startswith('/vsi'):
+        stat = gdal.VSIStatL(path)
+        return (stat.size, stat.mtime) if stat is not None else None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
@@ -1,15 +1,34 @@
-from qgis.core import QgsRasterLayer, QgsProject, QgsMessageLog
-from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication
+from qgis.core import QgsMessageLog
+from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication, QTimer, Qt
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction
 from PyQt5.QtWidgets import QDialog
 from osgeo import gdal
 import os
 import time
-from threading import Thread
+from threading import Event, Thread
 
 from .resources import *
 from .example2_dialog import Example2Dialog
+from .folder_watcher import IMAGE_EXTENSIONS, FolderWatcher
+from .archives import ARCHIVE_EXTENSIONS, expand_archives, source_file
+from .ingest_journal import IngestJournal, SEEN, MERGED, FAILED, SHED
+from .ingest_queue import BLOCK, DEFAULT_MAX_DEPTH, POLICIES, IngestQueue
+from .footprint_index import FootprintIndex, acquisition_time, grid_window, same_crs, transform_bounds, union_bounds
+from .backfill import BY_TIME, BackfillProgress, BackfillScene, batched, order_scenes, read_parallel
+from .dataset_cache import DatasetCache, header_bounds
+from .layer_refresh import show_raster
+from .notifications import DEFAULT_INTERVAL, EventLog, UiThrottle
+from .pipeline_metrics import PipelineMetrics
+from .metrics_dock import MetricsDock
+from .merge_task import GuiDispatcher, MergeTask, submit
+from .raster_merge import (
+    common_data_type, contains, fits_data_type, footprint_window, merge_windows, place_on_grid, stream_merge,
+    output_nodata, to_projection, union_grid, union_window, update_window, window_bounds)
+from .parallel_merge import parallel_merge
+from .compositing import KERNELS, LAST_VALID
+from .vrt_mosaic import VrtMosaic
+from .output_profiles import COG, DEFAULT_PROFILE, creation_options, finalize_output, update_overviews
 
 class Example2:
     """QGIS Plugin Implementation."""
@@ -28,7 +47,28 @@ class Example2:
         self.actions = []
         self.menu = self.tr(u'&example2')
         self.first_start = True
-        self.previous_raster_layer = None  # Initialize the previous raster layer reference
+        self.raster_layer_id = None  # The mosaic layer, reloaded in place after every merge
+        # Read-only handles of the base image, mosaic and recent images, reused across batches
+        self.datasets = DatasetCache(max_handles=QSettings().value('example2/max_open_datasets', 16, type=int))
+        # Merges run as QgsTasks; the dispatcher brings monitor-thread calls to the GUI thread
+        self.gui = GuiDispatcher()
+        self.active_task = None
+        self.materialize_task = None
+        self.backfill = None  # Progress of merging the images already in the folder at start-up
+        self.pending = None  # Ingest queue between the folder watcher and the merges
+        self.monitor_thread = None
+        self.stopping = Event()  # Set by unload() to end the monitor thread
+        # Batch summaries and layer refreshes are shown at most once per interval;
+        # per-image detail goes to the JSON-lines event log next to the output
+        self.ui = None
+        self.events = None
+        self.ui_timer = QTimer()
+        self.ui_timer.timeout.connect(self.flush_ui)
+        # Stage timings from image detection to repaint, exported and shown on the same timer
+        self.metrics = PipelineMetrics()
+        self.metrics_path = None
+        self.metrics_dock = None
+        self.ui_timer.timeout.connect(self.flush_metrics)
 
     def tr(self, message):
         return QCoreApplication.translate('example2', message)
@@ -65,12 +105,44 @@ class Example2:
             callback=self.run,
             parent=self.iface.mainWindow()
         )
+        self.add_action(
+            icon_path,
+            text=self.tr(u'Materialize Mosaic'),
+            callback=self.materialize_mosaic,
+            add_to_toolbar=False,
+            parent=self.iface.mainWindow()
+        )
+        self.add_action(
+            icon_path,
+            text=self.tr(u'Pipeline Metrics'),
+            callback=self.show_metrics,
+            add_to_toolbar=False,
+            parent=self.iface.mainWindow()
+        )
 
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
+        self.stop_monitoring()
         for action in self.actions:
             self.iface.removePluginMenu(self.tr(u'&example2'), action)
             self.iface.removeToolBarIcon(action)
+        if self.metrics_dock is not None:
+            self.iface.removeDockWidget(self.metrics_dock)
+            self.metrics_dock.deleteLater()
+            self.metrics_dock = None
+
+    def stop_monitoring(self):
+        """Stop the monitor thread, its detector and the folder watcher, and wait for them (GUI thread)."""
+        self.stopping.set()
+        if self.active_task is not None:
+            self.active_task.cancel()
+        # Releases the monitor and the detector if they wait on the queue
+        pending = self.pending
+        if pending is not None:
+            pending.close()
+        if self.monitor_thread is not None:
+            self.monitor_thread.join()
+            self.monitor_thread = None
 
     def run(self):
         """Run method that performs all the real work."""
@@ -101,76 +173,569 @@ class Example2:
                     QgsMessageLog.logMessage(f"Error: The directory '{os.path.dirname(self.output_path)}' does not exist.", 'Example2')
                     return
 
-                Thread(target=self.monitor_folder, daemon=True).start()
+                notify_interval = QSettings().value('example2/notify_interval', DEFAULT_INTERVAL, type=float)
+                self.ui = UiThrottle(notify_interval)
+                self.events = EventLog(os.path.join(os.path.dirname(self.output_path), '.example2_events.jsonl'))
+                self.ui_timer.start(int(notify_interval * 1000))
+                # A .csv path is written as CSV, anything else in the Prometheus text format
+                self.metrics = PipelineMetrics()
+                self.metrics_path = QSettings().value(
+                    'example2/metrics_path', os.path.join(os.path.dirname(self.output_path), '.example2_metrics.prom'))
+                self.stopping.clear()
+                self.monitor_thread = Thread(target=self.monitor_folder, daemon=True)
+                self.monitor_thread.start()
         else:
             QgsMessageLog.logMessage("Dialog not initialized properly.", 'Example2')
 
     def monitor_folder(self, check_interval=10, max_idle_time=60):
-        processed_files = set()
         last_update_time = time.time()
 
-        while True:
-            # List all image files in the directory
-            image_files = [os.path.join(self.image_folder, f) for f in os.listdir(self.image_folder) if f.endswith(('.png', '.jpg', '.jpeg'))]
-            new_images = [f for f in image_files if f not in processed_files]
+        # The journal lives next to the output so it follows the mosaic across restarts
+        journal_path = os.path.join(os.path.dirname(self.output_path), '.example2_journal.sqlite')
+        # Images inside a ZIP or TAR delivery are versioned by the archive
+        journal = IngestJournal(journal_path, source_file=source_file)
+        # Footprints of everything in the mosaic, for "which scenes cover this window" queries
+        footprints = FootprintIndex(os.path.join(os.path.dirname(self.output_path), '.example2_footprints.sqlite'))
+        if os.path.exists(self.base_image_path) and footprints.get(self.base_image_path) is None:
+            footprints.add(self.base_image_path, self.datasets.open(self.base_image_path))
+        # Archives are watched too; their images are read in place through /vsizip/ or /vsitar/.
+        # An image is queued once its size and mtime stay unchanged for quiet_period seconds
+        watcher = FolderWatcher(self.image_folder, extensions=IMAGE_EXTENSIONS + ARCHIVE_EXTENSIONS,
+                                quiet_period=QSettings().value('example2/quiet_period', 2.0, type=float))
+        new_images = expand_archives(watcher.start(), IMAGE_EXTENSIONS)
+        mode = 'filesystem events' if watcher.event_driven else 'polling'
+        QgsMessageLog.logMessage(f"Monitoring '{self.image_folder}' using {mode}.", 'Example2')
 
-            if new_images:
+        # New images wait in a bounded queue fed by a detector thread; when they arrive faster
+        # than they are merged, the policy blocks the detector, coalesces images of one region
+        # or sheds images a newer one covers
+        policy = QSettings().value('example2/queue_policy', BLOCK)
+        if policy not in POLICIES:
+            QgsMessageLog.logMessage(f"Unknown queue policy '{policy}', using '{BLOCK}'.", 'Example2')
+            policy = BLOCK
+        pending = IngestQueue(
+            max_depth=QSettings().value('example2/max_queue_depth', DEFAULT_MAX_DEPTH, type=int), policy=policy,
+            on_shed=lambda paths, reason: self.shed_images(paths, reason, journal))
+        self.pending = pending
+        batch_size = QSettings().value('example2/max_batch_size', 64, type=int)
+        detector = Thread(target=self.detect_images, args=(watcher, pending, journal, check_interval), daemon=True)
+        detector.start()
+
+        try:
+            # Images that were already in the folder are merged in ordered batches first
+            existing = [f for f in new_images if not journal.is_done(f)]
+            if existing and QSettings().value('example2/backfill', True, type=bool):
+                self.backfill_images(existing, journal, footprints)
                 last_update_time = time.time()
-                processed_files.update(new_images)
-                self.merge_images(self.base_image_path, new_images, self.output_path)
-                QgsMessageLog.logMessage(f"New images detected and processed: {new_images}", 'Example2')
             else:
-                if time.time() - last_update_time > max_idle_time:
+                for batch in batched(existing, batch_size):
+                    if self.stopping.is_set():
+                        break
+                    self.merge_new_images(batch, journal, footprints)
+
+            while not self.stopping.is_set():
+                # Returns as soon as images are queued; check_interval only bounds the idle check
+                if pending.wait(check_interval):
+                    last_update_time = time.time()
+                    new_images = [f for f in pending.take(batch_size) if not journal.is_done(f)]
+                    if new_images:
+                        self.merge_new_images(new_images, journal, footprints)
+                elif time.time() - last_update_time > max_idle_time:
                     QgsMessageLog.logMessage("No new images detected for the specified time. Stopping folder monitoring.", 'Example2')
                     break
+        finally:
+            # Closing the queue releases the detector if it is blocked on a full queue
+            pending.close()
+            detector.join()
+            self.pending = None
+            watcher.stop()
+            journal.close()
+            footprints.close()
+            self.datasets.close()
+            self.gui.post(self.stop_notifications)
 
-            time.sleep(check_interval)
+    def detect_images(self, watcher, pending, journal, check_interval):
+        """Queue the images the watcher reports until the queue is closed (detector thread)."""
+        while not pending.closed:
+            # A short wait, so the detector notices a closed queue soon after unload()
+            for image_path in expand_archives(watcher.wait(min(check_interval, 1.0)), IMAGE_EXTENSIONS):
+                if not journal.is_done(image_path) and not self.queue_image(pending, image_path):
+                    return
 
-    def add_raster_layer(self, image_path):
-        layer_name = os.path.basename(image_path)
-        raster_layer = QgsRasterLayer(image_path, layer_name)
-        
-        if raster_layer.isValid():
-            QgsProject.instance().addMapLayer(raster_layer)
-            self.previous_raster_layer = raster_layer  # Update the previous layer reference
-            QgsMessageLog.logMessage(f"Raster layer '{layer_name}' added to QGIS project.", 'Example2')
+    def queue_image(self, pending, image_path):
+        """Queue an image with its footprint, if the policy needs it; False once the queue is closed."""
+        self.metrics.received(image_path, written=modified_time(source_file(image_path)))
+        bounds = self.image_bounds(image_path) if pending.policy != BLOCK else None
+        return pending.put(image_path, bounds)
+
+    def image_bounds(self, image_path):
+        """Return the footprint of an image in the base image's CRS, or None if it is not georeferenced."""
+        header, base = self.datasets.header(image_path), self.datasets.header(self.base_image_path)
+        if header is None or not header.projection:
+            return None
+        return transform_bounds(header_bounds(header), header.projection,
+                                base.projection if base and base.projection else header.projection)
+
+    def shed_images(self, paths, reason, journal):
+        """Journal images the ingest queue dropped, so they are neither merged nor backfilled (any thread)."""
+        journal.mark_many(paths, SHED)
+        self.metrics.done(paths, merged=False)
+        self.log_event('shed', images=paths, reason=reason)
+        ui = self.ui
+        if ui is not None:
+            ui.notify(f"images shed ({reason})", len(paths))
+
+    def merge_new_images(self, new_images, journal, footprints):
+        """Merge one batch and journal its outcome (monitor thread).
+
+        The merge indexes the footprint of each image as soon as its pixels
+        reach the mosaic, also when the batch fails part way.
+        """
+        journal.mark_many(new_images, SEEN)
+        merged = self.run_merge_task(new_images, footprints)
+        if merged is None:
+            # Interrupted by unload: left as seen, so the batch is merged again next time
+            return False
+        journal.mark_many(new_images, MERGED if merged else FAILED)
+        self.log_event('processed', images=new_images, merged=merged)
+        return merged
+
+    def backfill_images(self, images, journal, footprints):
+        """Merge the images already in the folder in ordered batches (monitor thread).
+
+        Headers are read on a thread pool to order the images by acquisition
+        time or location; each batch then goes through the tile-parallel merge
+        engine, instead of a single merge of every image at once.
+        """
+        order = QSettings().value('example2/backfill_order', BY_TIME)
+        batch_size = QSettings().value('example2/backfill_batch_size', 64, type=int)
+        base = self.datasets.header(self.base_image_path)
+        projection = base.projection if base else None
+        scenes = read_parallel(images, lambda path: self.backfill_scene(path, projection))
+        ordered = [scene.path for scene in order_scenes(scenes, order)]
+        # Images GDAL cannot read go last, so they are still journaled as failed
+        readable = set(ordered)
+        ordered += [path for path in images if path not in readable]
+
+        self.backfill = BackfillProgress(ordered)
+        self.log_event('backfill', images=len(ordered), order=order)
+        QgsMessageLog.logMessage(f"Merging {len(ordered)} images already in '{self.image_folder}'.", 'Example2')
+        for batch in batched(ordered, batch_size):
+            if self.stopping.is_set():
+                break
+            merged = self.merge_new_images(batch, journal, footprints)
+            self.backfill.update(batch, failed=not merged)
+        self.log_event('backfill_done', images=self.backfill.total, failed=self.backfill.failed)
+        QgsMessageLog.logMessage(self.backfill.message(), 'Example2')
+        self.backfill = None
+
+    def backfill_scene(self, path, projection):
+        """Read the acquisition time and centre of an image for backfill ordering (any thread)."""
+        ds = gdal.Open(path)
+        if ds is None:
+            return None
+        gt = ds.GetGeoTransform()
+        bounds = (gt[0], gt[3] + ds.RasterYSize * gt[5], gt[0] + ds.RasterXSize * gt[1], gt[3])
+        min_x, min_y, max_x, max_y = transform_bounds(bounds, ds.GetProjection(), projection)
+        return BackfillScene(path, acquisition_time(ds, path), (min_x + max_x) / 2, (min_y + max_y) / 2)
+
+    def run_merge_task(self, new_images, footprints=None):
+        """Merge a batch in a background QgsTask and wait for it (monitor thread).
+
+        The task is started from the GUI thread, which also swaps the layer
+        once the merge is done; this thread only waits for the outcome.
+        Returns None if monitoring stopped before the merge finished.
+        """
+        outcome = {'merged': False}
+        done = Event()
+        self.gui.post(self.start_merge_task, new_images, footprints, outcome, done)
+        # unload() joins this thread on the GUI thread, which then cannot finish the task
+        while not done.wait(0.5):
+            if self.stopping.is_set():
+                return None
+        return outcome['merged']
+
+    def start_merge_task(self, new_images, footprints, outcome, done):
+        """Start the merge of a batch as a cancellable background task (GUI thread)."""
+        base_image_path, output_path = self.base_image_path, self.output_path
+        if QSettings().value('example2/lazy_vrt', False, type=bool):
+            layer_path = self.lazy_mosaic(output_path).vrt_path
         else:
-            QgsMessageLog.logMessage(f"Failed to add raster layer '{layer_name}'.", 'Example2')
+            layer_path = output_path
+
+        def work(task):
+            merged = self.merge_images(base_image_path, new_images, output_path, task.progress, footprints)
+            return merged, self.changed_bounds(new_images, layer_path)
+
+        def on_finished(result):
+            try:
+                outcome['merged'] = result is not None and result[0]
+                self.metrics.done(new_images, outcome['merged'])
+                if result is None:
+                    QgsMessageLog.logMessage("Merge task failed or was cancelled.", 'Example2')
+                if os.path.exists(layer_path):
+                    self.ui.refresh('mosaic', layer_path, result[1] if result else None)
+                if outcome['merged']:
+                    due = self.ui.notify("images merged", len(new_images))
+                else:
+                    due = self.ui.notify("images failed to merge", len(new_images))
+                if due:
+                    self.flush_ui()
+            finally:
+                self.active_task = None
+                done.set()
+
+        self.active_task = submit(MergeTask(f"Merging {len(new_images)} images", work, on_finished))
+
+    def merge_images(self, base_image_path, new_images, output_path, progress=None, footprints=None):
+        """Merge new images into the mosaic (task thread); layers are refreshed by the caller.
+
+        `footprints`, the index of the images already in the mosaic, lets a
+        re-delivered image replace its previous version entirely; merged
+        images are added to it in the order they are drawn.
+        """
+        # Lazy mode only references the images from a VRT; see materialize_mosaic
+        if QSettings().value('example2/lazy_vrt', False, type=bool):
+            return self.update_lazy_mosaic(base_image_path, new_images, output_path, footprints)
+
+        # Once a mosaic exists, only the footprint of each new image is rewritten
+        incremental = QSettings().value('example2/incremental_merge', True, type=bool)
+        if incremental and os.path.exists(output_path):
+            return self.update_mosaic(new_images, output_path, progress, footprints)
 
-    def merge_images(self, base_image_path, new_images, output_path):
         # Check if base image exists
         if os.path.exists(base_image_path):
-            base_image = gdal.Open(base_image_path)
-            QgsMessageLog.logMessage(f"Base image '{base_image_path}' loaded successfully.", 'Example2')
+            with self.metrics.timer('open'):
+                base_image = self.datasets.open(base_image_path)
+            self.log_event('base_loaded', path=base_image_path)
         else:
             QgsMessageLog.logMessage(f"Error: Base image '{base_image_path}' not found.", 'Example2')
-            return
+            return False
 
+        merged = False
+        datasets = [base_image]
         try:
             # Open new images
-            datasets = [base_image] + [gdal.Open(img) for img in new_images]
-            QgsMessageLog.logMessage(f"{len(new_images)} new images loaded.", 'Example2')
+            with self.metrics.timer('open'):
+                datasets = [base_image] + [self.datasets.open(img) for img in new_images]
+            self.log_event('images_loaded', count=len(new_images))
             
             # Merge images
-            updated_image = gdal.Warp(output_path, datasets, format='GTiff')
-            QgsMessageLog.logMessage(f"Updated merged image saved to '{output_path}'.", 'Example2')
+            merged = self.build_mosaic(datasets, output_path, progress)
+            if merged:
+                self.index_images(footprints, new_images)
+            self.log_event('mosaic_built', path=output_path, merged=merged)
             
         except Exception as e:
             QgsMessageLog.logMessage(f"Error during image merging: {str(e)}", 'Example2')
         
         finally:
-            # Close the GDAL datasets
-            for ds in datasets:
-                ds = None
-            QgsMessageLog.logMessage("GDAL datasets closed.", 'Example2')
-
-            # Remove the previous raster layer if it exists
-            if hasattr(self, 'previous_raster_layer') and self.previous_raster_layer:
-                QgsProject.instance().removeMapLayer(self.previous_raster_layer.id())
-                QgsMessageLog.logMessage("Previous raster layer removed from QGIS project.", 'Example2')
+            # Release the GDAL datasets; the handle pool closes them on eviction
+            datasets = None
+
+        return merged
+
+    def update_mosaic(self, new_images, output_path, progress=None, footprints=None):
+        """Composite new images into the existing mosaic, touching only their footprints.
+
+        Images that extend past the mosaic, or whose values its data type cannot
+        hold, and all images of a COG mosaic are merged by a full rebuild of the
+        mosaic and those images into a temporary file that then replaces the output.
+        An image already in `footprints` was delivered again: the area of its
+        previous version is recomposited too (see remerge_region).
+        """
+        # Rewriting blocks and overviews in place would break a COG's layout
+        if QSettings().value('example2/output_profile', DEFAULT_PROFILE) == COG:
+            merged = self.rebuild_mosaic(new_images, output_path, progress, footprints)
+            self.log_event('mosaic_updated', path=output_path, count=len(new_images), merged=merged)
+            return merged
+
+        # Pooled read-only handles must not outlive the write
+        self.datasets.invalidate(output_path)
+        with self.metrics.timer('open'):
+            out_ds = gdal.Open(output_path, gdal.GA_Update)
+        if out_ds is None:
+            QgsMessageLog.logMessage(f"Error: Could not open '{output_path}' for update.", 'Example2')
+            return False
+
+        merged = True
+        cancelled = False
+        rebuild = []
+        redelivered = []
+        dirty_windows = []
+        timings = {}
+        try:
+            for i, image_path in enumerate(new_images):
+                if progress is not None and not progress(i, len(new_images)):
+                    cancelled = True
+                    break
+                with self.metrics.timer('open'):
+                    src_ds = self.datasets.open(image_path)
+                if src_ds is None:
+                    QgsMessageLog.logMessage(f"Error: Could not open '{image_path}'.", 'Example2')
+                    merged = False
+                    continue
+                # Writing a wider type in place would wrap or truncate the new values
+                if not contains(out_ds, src_ds) or not fits_data_type(out_ds, [src_ds]):
+                    rebuild.append(image_path)
+                    continue
+                window = footprint_window(out_ds, src_ds)
+                if window is not None:
+                    if update_window(out_ds, src_ds, window, timings=timings):
+                        dirty_windows.append(window)
+                        previous = footprints.get(image_path) if footprints is not None else None
+                        if previous is not None:
+                            redelivered.append(previous)
+                        # Indexed before any re-merge, which must redraw this image too
+                        self.index_images(footprints, [image_path])
+                    else:
+                        QgsMessageLog.logMessage(f"Error: Failed to composite '{image_path}'.", 'Example2')
+                        merged = False
+                src_ds = None
+
+            # A re-delivered image may cover less than its previous version did, which would
+            # leave old pixels outside its new valid area
+            if redelivered and not cancelled:
+                tiles = self.remerge_region(out_ds, footprints, redelivered, timings)
+                if tiles is None:
+                    QgsMessageLog.logMessage("Error: Failed to re-merge the area of re-delivered images.", 'Example2')
+                    merged = False
+                else:
+                    dirty_windows += tiles
+
+            # Refresh only the overview pixels above the changed windows
+            with self.metrics.timer('overviews'):
+                for window in dirty_windows:
+                    update_overviews(out_ds, window)
+            with self.metrics.timer('write'):
+                out_ds.FlushCache()
+        finally:
+            out_ds = None
+            self.metrics.observe_many(timings)
+
+        if cancelled:
+            return False
+        if rebuild and not self.rebuild_mosaic(rebuild, output_path, progress, footprints):
+            return False
+
+        self.log_event('mosaic_updated', path=output_path, count=len(new_images), merged=merged)
+        return merged
+
+    def remerge_region(self, out_ds, footprints, scenes, timings=None):
+        """Recomposite the mosaic under the footprints of scenes from the indexed images there.
+
+        The mosaic is the base image plus every indexed image, so the tiles
+        covering those footprints are rebuilt from the base image and the
+        images the index finds under the tiles, in the order they reached the
+        mosaic. Returns the rewritten tiles, or None if an image cannot be read.
+        """
+        gt, projection = out_ds.GetGeoTransform(), out_ds.GetProjection()
+        # Index footprints are in the CRS of the base image, normally the mosaic's
+        if not same_crs(footprints.projection, projection):
+            return []
+        region = [grid_window(gt, out_ds.RasterXSize, out_ds.RasterYSize,
+                              (scene.min_x, scene.min_y, scene.max_x, scene.max_y)) for scene in scenes]
+        region = [window for window in region if window is not None]
+        if not region:
+            return []
+        # Whole tiles are rewritten, so every image touching them takes part; they are sized
+        # for the base image and the images under the region
+        nearby = footprints.query(window_bounds(out_ds, union_window(region)))
+        tiles = merge_windows(out_ds, region=region, sources=len(nearby) + 1)
+        indexed = footprints.query(window_bounds(out_ds, union_window(tiles)), by_arrival=True)
+        paths = [scene.path for scene in indexed if scene.path != self.base_image_path]
+        with self.metrics.timer('open'):
+            datasets = [self.datasets.open(path) for path in [self.base_image_path] + paths]
+        if any(ds is None for ds in datasets):
+            return None
+        placements = [place_on_grid(gt, ds, projection) for ds in datasets]
+        self.log_event('region_remerged', images=paths, tiles=len(tiles))
+        stream_merge(out_ds, placements, KERNELS[LAST_VALID], timings=timings, windows=tiles)
+        return tiles
+
+    def rebuild_mosaic(self, new_images, output_path, progress=None, footprints=None):
+        """Composite the mosaic and new images into a temporary file that then replaces the output."""
+        self.log_event('mosaic_rebuilding', images=new_images)
+        staging_path = output_path + '.tmp.tif'
+        with self.metrics.timer('open'):
+            datasets = [self.datasets.open(path) for path in [output_path] + new_images]
+        rebuilt = self.build_mosaic(datasets, staging_path, progress)
+        datasets = None
+        if not rebuilt:
+            return False
+        self.datasets.invalidate(output_path)
+        os.replace(staging_path, output_path)
+        self.index_images(footprints, new_images)
+        return True
+
+    def index_images(self, footprints, image_paths):
+        """Index the footprints of images whose pixels have just reached the mosaic (task thread)."""
+        if footprints is None:
+            return
+        for image_path in image_paths:
+            footprints.add(image_path, self.datasets.open(image_path))
+
+    def lazy_mosaic(self, output_path):
+        return VrtMosaic(os.path.splitext(output_path)[0] + '.vrt')
+
+    def update_lazy_mosaic(self, base_image_path, new_images, output_path, footprints=None):
+        """Append the new images to the VRT mosaic, starting it from the base image."""
+        mosaic = self.lazy_mosaic(output_path)
+        images = new_images if mosaic.exists() else [base_image_path] + new_images
+        merged = True
+        for image_path in images:
+            with self.metrics.timer('write'):
+                added = mosaic.add(image_path)
+            if not added:
+                QgsMessageLog.logMessage(f"Error: Could not add '{image_path}' to '{mosaic.vrt_path}'.", 'Example2')
+                merged = False
+            elif image_path != base_image_path:
+                self.index_images(footprints, [image_path])
+        self.log_event('vrt_updated', path=mosaic.vrt_path, count=len(images))
+        return merged
+
+    def materialize_mosaic(self):
+        """Write the lazy VRT mosaic to the output path as a physical GeoTIFF, in a background task."""
+        output_path = getattr(self, 'output_path', None)
+        if not output_path or not self.lazy_mosaic(output_path).exists():
+            QgsMessageLog.logMessage("No VRT mosaic to materialize.", 'Example2')
+            return
+        mosaic = self.lazy_mosaic(output_path)
+        profile = QSettings().value('example2/output_profile', DEFAULT_PROFILE)
+
+        def work(task):
+            vrt_ds = gdal.Open(mosaic.vrt_path)
+            options = creation_options(profile, vrt_ds.GetRasterBand(1).DataType, vrt_ds.RasterXSize,
+                                       vrt_ds.RasterYSize, vrt_ds.RasterCount)
+            vrt_ds = None
+            self.datasets.invalidate(output_path)
+            return mosaic.materialize(output_path, options) and finalize_output(output_path, profile)
+
+        def on_finished(materialized):
+            if materialized:
+                QgsMessageLog.logMessage(f"VRT mosaic materialized to '{output_path}'.", 'Example2')
             else:
-                QgsMessageLog.logMessage("No previous raster layer found to remove.", 'Example2')
+                QgsMessageLog.logMessage(f"Error: Failed to materialize the VRT mosaic to '{output_path}'.", 'Example2')
+            self.materialize_task = None
+
+        self.materialize_task = submit(MergeTask("Materializing mosaic", work, on_finished))
+
+    def build_mosaic(self, datasets, output_path, progress=None):
+        """Composite datasets onto their union grid with the tile-parallel merge engine.
+
+        The first dataset sets the grid, CRS and band layout; later datasets are
+        drawn over earlier ones wherever they hold valid pixels.
+        """
+        if not datasets or any(ds is None for ds in datasets):
+            QgsMessageLog.logMessage("Error: Not all images could be opened for merging.", 'Example2')
+            return False
+
+        self.datasets.invalidate(output_path)
+        first = datasets[0]
+        projection = first.GetProjection()
+        geotransform, x_size, y_size = union_grid([to_projection(ds, projection) for ds in datasets])
+        # Promote only as far as needed to hold every input (e.g. Byte + UInt16 -> UInt16)
+        data_type = common_data_type(datasets)
+        profile = QSettings().value('example2/output_profile', DEFAULT_PROFILE)
+        options = creation_options(profile, data_type, x_size, y_size, first.RasterCount)
+        out_ds = gdal.GetDriverByName('GTiff').Create(output_path, x_size, y_size, first.RasterCount,
+                                                      data_type, options=options)
+        if out_ds is None:
+            return False
+        out_ds.SetGeoTransform(geotransform)
+        out_ds.SetProjection(projection)
+        # Always set, so the pixels of the union no input covers are not read as data later
+        for i in range(1, out_ds.RasterCount + 1):
+            out_ds.GetRasterBand(i).SetNoDataValue(output_nodata(datasets, i, data_type))
+
+        # Tiles are composited on a process pool; merge_workers 0 means one per CPU
+        workers = QSettings().value('example2/merge_workers', 0, type=int)
+        placements = [place_on_grid(geotransform, ds, projection) for ds in datasets]
+        timings = {}
+        completed = parallel_merge(out_ds, placements, LAST_VALID, workers=workers or None, progress=progress,
+                                   timings=timings)
+        self.metrics.observe_many(timings)
+        out_ds = placements = None
+        if not completed:
+            return False
+        with self.metrics.timer('overviews'):
+            return finalize_output(output_path, profile)
+
+    def changed_bounds(self, image_paths, mosaic_path):
+        """Return the footprint of image_paths in the mosaic's CRS: the part of its layer to repaint."""
+        mosaic = self.datasets.header(mosaic_path)
+        headers = [self.datasets.header(path) for path in image_paths]
+        if mosaic is None or None in headers:
+            return None
+        return union_bounds([(header_bounds(header), header.projection) for header in headers], mosaic.projection)
+
+    def refresh_raster_layer(self, output_path, dirty_bounds=None):
+        """Reload the mosaic layer in place, keeping its style; add it on the first merge."""
+        layer_name = os.path.basename(output_path)
+        layer = show_raster(output_path, layer_name, self.raster_layer_id, dirty_bounds, self.iface.mapCanvas())
+        if layer is None:
+            QgsMessageLog.logMessage(f"Failed to show raster layer '{layer_name}'.", 'Example2')
+            return
+        self.raster_layer_id = layer.id()
+        self.log_event('layer_refreshed', path=output_path, bounds=dirty_bounds)
+
+    def flush_ui(self, force=False):
+        """Apply the pending layer refresh and log one batch summary (GUI thread, at most once per interval)."""
+        if self.ui is None:
+            return
+        summary, _, refreshes = self.ui.flush(force=force)
+        for layer_path, dirty_bounds in refreshes.values():
+            with self.metrics.timer('layer_swap'):
+                self.refresh_raster_layer(layer_path, dirty_bounds)
+        if refreshes:
+            self.metrics.displayed()
+        if summary:
+            QgsMessageLog.logMessage(summary, 'Example2')
+        backfill = self.backfill
+        if summary and backfill is not None:
+            QgsMessageLog.logMessage(backfill.message(), 'Example2')
+
+    def flush_metrics(self):
+        """Refresh the metrics dock and rewrite the metrics file (GUI thread, on the notification timer)."""
+        pending = self.pending
+        if pending is not None:
+            self.metrics.set_gauges(pending.stats())
+        if self.metrics_dock is not None:
+            self.metrics_dock.update_rows(self.metrics.snapshot(), self.metrics.gauges())
+        if self.metrics_path:
+            try:
+                self.metrics.export(self.metrics_path, 'example2')
+            except OSError as e:
+                QgsMessageLog.logMessage(f"Error: Could not write metrics to '{self.metrics_path}': {e}", 'Example2')
+                self.metrics_path = None
+
+    def show_metrics(self):
+        """Show the dock with the per-stage timings of the current monitoring session."""
+        if self.metrics_dock is None:
+            self.metrics_dock = MetricsDock(self.tr(u'Example2 Pipeline Metrics'), self.iface.mainWindow())
+            self.iface.addDockWidget(Qt.BottomDockWidgetArea, self.metrics_dock)
+        self.metrics_dock.show()
+        self.metrics_dock.update_rows(self.metrics.snapshot(), self.metrics.gauges())
+
+    def stop_notifications(self):
+        self.flush_ui(force=True)
+        self.ui_timer.stop()
+        self.flush_metrics()
+        self.metrics_path = None
+        if self.events:
+            self.events.close()
+            self.events = None
+
+    def log_event(self, event, **fields):
+        """Record detail in the event log (any thread); a no-op when no folder is monitored."""
+        events = self.events
+        if events is not None:
+            events.write(event, **fields)
+
 
-            # Add the new raster layer to QGIS
-            self.add_raster_layer(output_path)
-            QgsMessageLog.logMessage(f"New raster layer '{os.path.basename(output_path)}' added to QGIS project.", 'Example2')
+def modified_time(path):
+    """Return the mtime of path, or None if it is gone."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
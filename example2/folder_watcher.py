@@ -0,0 +1,205 @@
+"""Detect new images dropped into the monitored folder.
+
+Uses the watchdog observer (inotify on Linux) when it is installed and falls
+back to polling: a stat of the folder every poll interval, with an os.scandir
+rescan when its mtime moved and at a slower fixed interval regardless, so
+files rewritten in place are reported again. Either way an image is only
+reported once it has finished being written.
+"""
+import os
+import queue
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class ImageEventHandler(FileSystemEventHandler):
+    """Push (path, closed) for every created, modified, moved-in or closed image to a queue."""
+
+    def __init__(self, pending, extensions):
+        self.pending = pending
+        self.extensions = extensions
+
+    def push(self, path, closed=False):
+        if path.lower().endswith(self.extensions):
+            self.pending.put((path, closed))
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.push(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.push(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.push(event.dest_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.push(event.src_path, closed=True)
+
+
+class FolderWatcher:
+    """Report image files that appear in a folder once they are completely written.
+
+    A changed file is reported once its size and mtime have stayed unchanged
+    for `quiet_period` seconds, or as soon as a close-write event is seen, so
+    an image still being copied in is not merged half-written (and again).
+    """
+
+    def __init__(self, folder, extensions=IMAGE_EXTENSIONS, poll_interval=1.0,
+                 settle_time=0.25, use_events=True, quiet_period=2.0, rescan_interval=30.0):
+        self.folder = folder
+        self.extensions = extensions
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.quiet_period = quiet_period
+        self.rescan_interval = rescan_interval
+        self.pending = queue.Queue()
+        self.observer = None
+        self.file_mtimes = {}
+        self.folder_mtime = None
+        self.last_rescan = None
+        self.settling = {}  # path -> ((size, mtime_ns), monotonic time of last change)
+
+        if use_events and Observer is not None:
+            self.observer = Observer()
+            self.observer.schedule(ImageEventHandler(self.pending, extensions), folder, recursive=False)
+
+    @property
+    def event_driven(self):
+        return self.observer is not None
+
+    def start(self):
+        """Start watching and return the images already in the folder."""
+        self.folder_mtime = folder_mtime(self.folder)
+        self.last_rescan = time.monotonic()
+        existing = self.scan()
+        if self.observer:
+            self.observer.start()
+        return existing
+
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def scan(self):
+        """Return the images whose mtime changed since the previous scan."""
+        changed = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(self.extensions) or not entry.is_file():
+                    continue
+                mtime = entry.stat().st_mtime_ns
+                if self.file_mtimes.get(entry.path) != mtime:
+                    self.file_mtimes[entry.path] = mtime
+                    changed.append(entry.path)
+        return sorted(changed)
+
+    def wait(self, timeout):
+        """Block until new images have finished being written or `timeout` seconds pass.
+
+        Returns the sorted list of image paths, empty on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if self.observer is None:
+                self.track(self.rescan(now), now)
+            ready = self.settled(now)
+            if ready:
+                return ready
+
+            remaining = deadline - now
+            if remaining <= 0:
+                return []
+            if self.observer is None:
+                time.sleep(min(self.poll_interval, remaining))
+            else:
+                # Files still being written are checked again every poll_interval
+                self.receive(min(self.poll_interval, remaining) if self.settling else remaining)
+
+    def receive(self, timeout):
+        """Track the images of the events received within `timeout` seconds (event-driven mode)."""
+        try:
+            events = [self.pending.get(timeout=timeout)]
+        except queue.Empty:
+            return
+
+        # Gather the rest of the burst so a multi-file drop is merged in one go
+        deadline = time.monotonic() + self.settle_time
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                events.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self.track([path for path, _ in events], time.monotonic(), {path for path, closed in events if closed})
+
+    def rescan(self, now):
+        """Polling fallback: scan the folder when its mtime moved, and every rescan_interval regardless.
+
+        Stat-ing the folder is cheap even for huge folders; its mtime does not
+        change when a file is rewritten in place, and two drops within one
+        coarse mtime tick look like one, which the periodic rescan catches.
+        """
+        mtime = folder_mtime(self.folder)
+        if mtime == self.folder_mtime and now - self.last_rescan < self.rescan_interval:
+            return []
+        self.folder_mtime, self.last_rescan = mtime, now
+        return self.scan()
+
+    def track(self, paths, now, closed=()):
+        """Start or restart the quiet period of changed files; closed files are ready at once."""
+        for path in paths:
+            signature = file_signature(path)
+            if signature is None:
+                self.settling.pop(path, None)
+            elif path in closed:
+                self.settling[path] = (signature, None)
+            elif path not in self.settling or self.settling[path][0] != signature:
+                self.settling[path] = (signature, now)
+
+    def settled(self, now):
+        """Return the tracked files whose size and mtime stayed unchanged for quiet_period."""
+        ready = []
+        for path, (signature, changed_at) in list(self.settling.items()):
+            current = file_signature(path)
+            if current is None:
+                del self.settling[path]
+            elif changed_at is None or (current == signature and now - changed_at >= self.quiet_period):
+                del self.settling[path]
+                ready.append(path)
+            elif current != signature:
+                self.settling[path] = (current, now)
+        return sorted(ready)
+
+
+def folder_mtime(folder):
+    try:
+        return os.stat(folder).st_mtime_ns
+    except OSError:
+        return None
+
+
+def file_signature(path):
+    """Return (size, mtime_ns) of `path`, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,211 @@
+"""Persistent spatial index of the footprints of ingested scenes.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Footprints live in an SQLite R*Tree, in the CRS of the first scene indexed
+(the index CRS) so scenes in other CRSs can be compared; every scene also
+keeps its own CRS, resolution, size and acquisition time. The R-tree stores
+single-precision boxes rounded outwards, so candidates are re-checked
+against the exact bounds kept next to them.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from osgeo import gdal, osr
+
+Scene = namedtuple('Scene', 'path crs res_x res_y x_size y_size band_count acquired min_x min_y max_x max_y')
+
+# Points sampled along each footprint edge when it is reprojected
+EDGE_POINTS = 21
+
+ACQUISITION_KEYS = (('ACQUISITIONDATETIME', 'IMAGERY'), ('TIFFTAG_DATETIME', ''))
+DATETIME_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y:%m:%d %H:%M:%S')
+
+
+class FootprintIndex:
+    """R-tree of scene footprints answering "which scenes intersect this window"."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS scenes ('
+            'id INTEGER PRIMARY KEY, path TEXT UNIQUE, crs TEXT, res_x REAL, res_y REAL, '
+            'x_size INTEGER, y_size INTEGER, band_count INTEGER, acquired REAL, '
+            'min_x REAL, min_y REAL, max_x REAL, max_y REAL)')
+        self.connection.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS footprints USING rtree(id, min_x, max_x, min_y, max_y)')
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'crs'").fetchone()
+        self.projection = row[0] if row else None
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def add(self, path, ds=None):
+        """Index the footprint of the scene at `path`; returns False if it cannot be read."""
+        ds = ds or gdal.Open(path)
+        if ds is None:
+            return False
+        gt = ds.GetGeoTransform()
+        crs = ds.GetProjection()
+        bounds = (gt[0], gt[3] + ds.RasterYSize * gt[5], gt[0] + ds.RasterXSize * gt[1], gt[3])
+        with self.lock:
+            if self.projection is None:
+                self.projection = crs
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('crs', ?)", (crs,))
+            bounds = transform_bounds(bounds, crs, self.projection)
+            self.connection.execute('BEGIN')
+            try:
+                self.delete(path)
+                cursor = self.connection.execute(
+                    'INSERT INTO scenes (path, crs, res_x, res_y, x_size, y_size, band_count, acquired, '
+                    'min_x, min_y, max_x, max_y) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (path, crs, gt[1], abs(gt[5]), ds.RasterXSize, ds.RasterYSize, ds.RasterCount,
+                     acquisition_time(ds, path)) + tuple(bounds))
+                min_x, min_y, max_x, max_y = bounds
+                self.connection.execute('INSERT INTO footprints VALUES (?, ?, ?, ?, ?)',
+                                        (cursor.lastrowid, min_x, max_x, min_y, max_y))
+                self.connection.execute('COMMIT')
+            except sqlite3.Error:
+                self.connection.execute('ROLLBACK')
+                raise
+        return True
+
+    def remove(self, path):
+        with self.lock:
+            self.delete(path)
+
+    def delete(self, path):
+        row = self.connection.execute('SELECT id FROM scenes WHERE path = ?', (path,)).fetchone()
+        if row:
+            self.connection.execute('DELETE FROM footprints WHERE id = ?', row)
+            self.connection.execute('DELETE FROM scenes WHERE id = ?', row)
+
+    def get(self, path):
+        """Return the indexed Scene of `path`, or None."""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT path, crs, res_x, res_y, x_size, y_size, band_count, acquired, '
+                'min_x, min_y, max_x, max_y FROM scenes WHERE path = ?', (path,)).fetchone()
+        return Scene(*row) if row else None
+
+    def query(self, bounds, by_arrival=False):
+        """Return the scenes intersecting (min_x, min_y, max_x, max_y) in the index CRS, oldest first.
+
+        Scenes are ordered by acquisition time or, with `by_arrival`, by when
+        they were last indexed, which is the order they reached the mosaic.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        order = 's.id' if by_arrival else 's.acquired, s.id'
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT s.path, s.crs, s.res_x, s.res_y, s.x_size, s.y_size, s.band_count, s.acquired, '
+                's.min_x, s.min_y, s.max_x, s.max_y FROM footprints f JOIN scenes s ON s.id = f.id '
+                'WHERE f.min_x < ? AND f.max_x > ? AND f.min_y < ? AND f.max_y > ? '
+                'AND s.min_x < ? AND s.max_x > ? AND s.min_y < ? AND s.max_y > ? '
+                'ORDER BY ' + order,
+                (max_x, min_x, max_y, min_y) * 2).fetchall()
+        return [Scene(*row) for row in rows]
+
+    def windows(self, gt, x_size, y_size, bounds=None):
+        """Return the pixel windows, on the grid gt of x_size by y_size, of the indexed scenes.
+
+        Only scenes intersecting `bounds` (default: the whole grid) are used,
+        and each window is clipped to the grid. The result can be passed as the
+        region of stream_merge to visit just the tiles those scenes touch.
+        """
+        grid = (gt[0], gt[3] + y_size * gt[5], gt[0] + x_size * gt[1], gt[3])
+        windows = [grid_window(gt, x_size, y_size, (scene.min_x, scene.min_y, scene.max_x, scene.max_y))
+                   for scene in self.query(bounds or grid)]
+        return [window for window in windows if window is not None]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM scenes').fetchone()[0]
+
+
+def grid_window(gt, x_size, y_size, bounds):
+    """Return the (xoff, yoff, xsize, ysize) pixel window of bounds on the grid gt, clipped to it, or None."""
+    x0 = max(0, int((bounds[0] - gt[0]) // gt[1]))
+    y0 = max(0, int((bounds[3] - gt[3]) // gt[5]))
+    x1 = min(x_size, int(-(-(bounds[2] - gt[0]) // gt[1])))
+    y1 = min(y_size, int(-(-(bounds[1] - gt[3]) // gt[5])))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def same_crs(a_wkt, b_wkt):
+    """True if two WKT strings describe the same CRS (or either is unknown)."""
+    if not a_wkt or not b_wkt or a_wkt == b_wkt:
+        return True
+    a_srs, b_srs = osr.SpatialReference(), osr.SpatialReference()
+    a_srs.ImportFromWkt(a_wkt)
+    b_srs.ImportFromWkt(b_wkt)
+    return bool(a_srs.IsSame(b_srs))
+
+
+def transform_bounds(bounds, src_wkt, dst_wkt):
+    """Reproject (min_x, min_y, max_x, max_y) by sampling points along its edges."""
+    if same_crs(src_wkt, dst_wkt):
+        return tuple(bounds)
+    src_srs, dst_srs = osr.SpatialReference(), osr.SpatialReference()
+    src_srs.ImportFromWkt(src_wkt)
+    dst_srs.ImportFromWkt(dst_wkt)
+    src_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    dst_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transform = osr.CoordinateTransformation(src_srs, dst_srs)
+
+    min_x, min_y, max_x, max_y = bounds
+    points = []
+    for i in range(EDGE_POINTS):
+        t = i / (EDGE_POINTS - 1)
+        x, y = min_x + (max_x - min_x) * t, min_y + (max_y - min_y) * t
+        points += [(x, min_y), (x, max_y), (min_x, y), (max_x, y)]
+    xs, ys, _ = zip(*transform.TransformPoints(points))
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def union_bounds(footprints, projection):
+    """Return the union of (bounds, crs) footprints reprojected into projection, or None if empty."""
+    boxes = [transform_bounds(bounds, crs, projection) for bounds, crs in footprints]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def acquisition_time(ds, path):
+    """Return the acquisition time of a scene as a Unix timestamp.
+
+    Read from the imagery or TIFF metadata when present, else the file's
+    mtime (a /vsizip/ or /vsitar/ member's as recorded in the archive).
+    """
+    for key, domain in ACQUISITION_KEYS:
+        value = ds.GetMetadataItem(key, domain)
+        if not value:
+            continue
+        for fmt in DATETIME_FORMATS:
+            try:
+                return time.mktime(time.strptime(value.strip()[:19], fmt))
+            except ValueError:
+                continue
+    if path.startswith('/vsi'):
+        stat = gdal.VSIStatL(path)
+        return stat.mtime if stat is not None else time.time()
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return time.time()
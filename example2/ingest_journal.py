@@ -0,0 +1,104 @@
+"""On-disk journal of the files the plugin has already ingested.
+
+The journal survives QGIS restarts and plugin reloads, so resuming a folder
+costs one primary-key lookup per file instead of a full re-merge.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SEEN = 'seen'
+MERGED = 'merged'
+FAILED = 'failed'
+# Dropped from a full or superseded ingest queue; not backfilled later
+SHED = 'shed'
+
+
+class IngestJournal:
+    """SQLite journal keyed by path, size, mtime and an optional content hash.
+
+    `source_file`, if given, maps a path to the file on disk whose size,
+    mtime and contents version it, e.g. the archive of a /vsizip/ member.
+    """
+
+    def __init__(self, db_path, hash_contents=False, source_file=None):
+        self.db_path = db_path
+        self.hash_contents = hash_contents
+        self.source_file = source_file or (lambda path: path)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+            'digest TEXT, state TEXT, updated REAL) WITHOUT ROWID')
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def lookup(self, path):
+        """Return the stored (size, mtime_ns, digest, state) of `path`, or None."""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT size, mtime_ns, digest, state FROM files WHERE path = ?', (path,)).fetchone()
+
+    def state(self, path):
+        """Return the state of `path` if the file is unchanged since it was recorded.
+
+        A file whose size or mtime changed is reported as unknown (None), unless
+        content hashing is enabled and the contents still match.
+        """
+        row = self.lookup(path)
+        if row is None:
+            return None
+        size, mtime_ns, digest, state = row
+        try:
+            stat = os.stat(self.source_file(path))
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+            return state
+        if (self.hash_contents and digest and stat.st_size == size
+                and file_digest(self.source_file(path)) == digest):
+            self.record(path, state, stat, digest)
+            return state
+        return None
+
+    def is_done(self, path):
+        """True if `path` was merged, failed or shed and has not changed since."""
+        return self.state(path) in (MERGED, FAILED, SHED)
+
+    def mark(self, path, state):
+        """Record `state` for the current version of `path`."""
+        try:
+            stat = os.stat(self.source_file(path))
+        except OSError:
+            return
+        digest = file_digest(self.source_file(path)) if self.hash_contents else None
+        self.record(path, state, stat, digest)
+
+    def mark_many(self, paths, state):
+        for path in paths:
+            self.mark(path, state)
+
+    def record(self, path, state, stat, digest):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO files (path, size, mtime_ns, digest, state, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime_ns, digest, state, time.time()))
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the BLAKE2b hex digest of the file contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,50 @@
+"""Refresh a persistent mosaic layer in place after its file changed.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Keeping one QgsRasterLayer per mosaic preserves its style and position in
+the layer tree. A rewritten file only needs the provider to reopen it
+(reloadData); a new file is swapped in with setDataSource. The repaint is
+skipped when the changed extent is outside the visible map.
+"""
+from qgis.core import (
+    QgsCoordinateTransform, QgsDataProvider, QgsProject, QgsRasterLayer, QgsRectangle)
+
+
+def refresh_layer(layer, path, dirty_bounds=None, canvas=None):
+    """Point layer at path and reload it; returns False if the layer is no longer valid.
+
+    dirty_bounds is the changed (min_x, min_y, max_x, max_y) in the layer's
+    CRS, or None if unknown, in which case the layer is always repainted.
+    """
+    if layer.source() != path:
+        layer.setDataSource(path, layer.name(), 'gdal', QgsDataProvider.ProviderOptions())
+    else:
+        layer.dataProvider().reloadData()
+        # A grown mosaic has a larger extent than the one probed when the layer was created
+        layer.setExtent(layer.dataProvider().extent())
+    if not layer.isValid():
+        return False
+    if dirty_bounds is None or canvas is None or is_visible(layer, dirty_bounds, canvas):
+        layer.triggerRepaint()
+    return True
+
+
+def is_visible(layer, bounds, canvas):
+    """True if bounds, in the layer's CRS, intersect the canvas's visible extent."""
+    transform = QgsCoordinateTransform(canvas.mapSettings().destinationCrs(), layer.crs(), QgsProject.instance())
+    visible = transform.transformBoundingBox(canvas.extent())
+    return visible.intersects(QgsRectangle(*bounds))
+
+
+def show_raster(path, name, layer_id=None, dirty_bounds=None, canvas=None):
+    """Refresh the layer with layer_id in place, or add a new layer for path; returns the layer or None."""
+    layer = QgsProject.instance().mapLayer(layer_id) if layer_id else None
+    if isinstance(layer, QgsRasterLayer):
+        return layer if refresh_layer(layer, path, dirty_bounds, canvas) else None
+    layer = QgsRasterLayer(path, name)
+    if not layer.isValid():
+        return None
+    QgsProject.instance().addMapLayer(layer)
+    return layer
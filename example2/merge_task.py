@@ -0,0 +1,83 @@
+"""Cancellable QgsTask wrapper for merges and a dispatcher onto the GUI thread.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+QgsTask.run executes on a thread of the QgsTaskManager pool, so the merge
+work must not touch QgsProject, layers or widgets; QgsTask.finished runs on
+the main thread and is where layers are swapped and messages shown. Tasks
+have to be created on the main thread too, so watcher threads go through
+GuiDispatcher and block on the task's `done` event.
+"""
+import threading
+import traceback
+
+from qgis.core import Qgis, QgsApplication, QgsMessageLog, QgsTask
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+# Message log tab of the plugin this copy belongs to, e.g. 'Example2'
+LOG_TAG = __name__.split('.')[0].capitalize()
+
+
+class MergeTask(QgsTask):
+    """Run work(task) on a task manager thread, then on_finished(result) on the GUI thread.
+
+    `work` reports through task.progress() and should stop early once the
+    task is cancelled. on_finished receives None if work raised, returned
+    None or was cancelled; an exception raised by work is also logged with
+    its traceback, and kept in `error`.
+    """
+
+    def __init__(self, description, work, on_finished):
+        super().__init__(description, QgsTask.CanCancel)
+        self.work = work
+        self.on_finished = on_finished
+        self.result = None
+        self.error = None
+        self.error_traceback = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.work(self)
+        except Exception as error:
+            self.error = error
+            self.error_traceback = traceback.format_exc()
+            return False
+        return self.result is not None and not self.isCanceled()
+
+    def finished(self, ok):
+        if self.error is not None:
+            QgsMessageLog.logMessage(f"{self.description()} failed: {self.error}\n{self.error_traceback}",
+                                     LOG_TAG, Qgis.Critical)
+        try:
+            self.on_finished(self.result if ok else None)
+        finally:
+            self.done.set()
+
+    def progress(self, done, total):
+        """Progress callback for stream_merge/parallel_merge: False once the task is cancelled."""
+        self.setProgress(100.0 * done / max(1, total))
+        return not self.isCanceled()
+
+
+def submit(task):
+    """Queue a task on the application's task manager; the caller keeps a reference to it."""
+    QgsApplication.taskManager().addTask(task)
+    return task
+
+
+class GuiDispatcher(QObject):
+    """Run calls posted from any thread on the thread that created the dispatcher."""
+
+    called = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.called.connect(self.dispatch)
+
+    def post(self, function, *args):
+        self.called.emit(lambda: function(*args))
+
+    def dispatch(self, call):
+        call()
@@ -0,0 +1,148 @@
+"""Tile-parallel merge engine running on a process pool.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+The output grid is split into the same windows stream_merge uses. Each
+window is composited by a worker process that opens its own GDAL handles,
+and the parent writes the finished tiles back into the mosaic (GDAL releases
+the GIL while writing). Small merges run serially through stream_merge.
+"""
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from osgeo import gdal
+
+try:
+    from .compositing import KERNELS
+    from .raster_merge import (
+        DEFAULT_MEMORY_BUDGET, add_timing, band_specs, composite_window, merge_windows, stream_merge, write_window)
+except ImportError:  # imported as a top-level module, e.g. by the tests
+    from compositing import KERNELS
+    from raster_merge import (
+        DEFAULT_MEMORY_BUDGET, add_timing, band_specs, composite_window, merge_windows, stream_merge, write_window)
+
+# Below this many output pixels the pool start-up costs more than it saves
+PARALLEL_MIN_PIXELS = 16 * 1024 * 1024
+
+# Per-process state set up by init_worker
+worker_state = {}
+
+
+def python_executable():
+    """Return a Python interpreter for worker processes.
+
+    Inside QGIS sys.executable is the QGIS binary, so look for the bundled
+    interpreter next to it instead.
+    """
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    names = ('pythonw.exe', 'python.exe') if os.name == 'nt' else ('python3', 'python')
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, 'bin')):
+        for name in names:
+            candidate = os.path.join(folder, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def pool_context():
+    """Return a spawn context so workers never inherit the GUI process state."""
+    context = multiprocessing.get_context('spawn')
+    executable = python_executable()
+    if executable:
+        context.set_executable(executable)
+    return context
+
+
+def dataset_source(ds):
+    """Return what a worker passes to gdal.Open to reopen ds.
+
+    That is the file path, or the XML of an in-memory VRT such as the warped
+    placements built by place_on_grid.
+    """
+    path = ds.GetDescription()
+    if ds.GetDriver().ShortName == 'VRT' and not os.path.exists(path):
+        return ds.GetMetadata('xml:VRT')[0]
+    return path
+
+
+def init_worker(sources, weight_sources, specs, mode, packings):
+    worker_state['placements'] = [(gdal.Open(source), x, y) for source, x, y in sources]
+    worker_state['weights'] = [gdal.Open(source) if source else None for source in weight_sources]
+    worker_state['specs'] = specs
+    worker_state['kernel'] = KERNELS[mode]
+    worker_state['packings'] = packings
+
+
+def merge_tile(window):
+    timings = {}
+    tiles, count = composite_window(worker_state['placements'], worker_state['weights'],
+                                    worker_state['specs'], window, worker_state['kernel'],
+                                    worker_state['packings'], timings)
+    return window, tiles, count, timings
+
+
+def write_tile(out_ds, result, count_ds, timings):
+    window, tiles, count, tile_timings = result
+    started = time.perf_counter()
+    write_window(out_ds, window, tiles, count, count_ds)
+    if timings is not None:
+        for stage, seconds in tile_timings.items():
+            add_timing(timings, stage, seconds)
+        add_timing(timings, 'write', time.perf_counter() - started)
+
+
+def parallel_merge(out_ds, placements, mode, workers=None, tile_size=None,
+                   memory_budget=DEFAULT_MEMORY_BUDGET, weights=None, count_ds=None,
+                   packings=None, progress=None, min_pixels=PARALLEL_MIN_PIXELS, timings=None):
+    """Composite placed sources into out_ds on a pool of worker processes.
+
+    Takes the same arguments as stream_merge except that the compositing mode
+    is passed by name so workers can look it up. `workers` defaults to the
+    number of CPUs; memory_budget applies per worker. At most two finished
+    tiles per worker wait for the writer, so memory stays bounded. When
+    `progress` returns False, tiles not yet started are cancelled and False
+    is returned. 'read' and 'composite' `timings` add up the time spent in
+    every worker, so with several workers they can exceed the wall time.
+    """
+    weights = weights or [None] * len(placements)
+    workers = workers or os.cpu_count() or 1
+    windows = merge_windows(out_ds, tile_size, memory_budget, sources=len(placements))
+    if workers < 2 or len(windows) < 2 or out_ds.RasterXSize * out_ds.RasterYSize < min_pixels:
+        return stream_merge(out_ds, placements, KERNELS[mode], tile_size=tile_size,
+                            memory_budget=memory_budget, weights=weights, count_ds=count_ds,
+                            packings=packings, progress=progress, timings=timings)
+
+    sources = [(dataset_source(ds), x, y) for ds, x, y in placements]
+    weight_sources = [dataset_source(ds) if ds is not None else None for ds in weights]
+    workers = min(workers, len(windows))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), initializer=init_worker,
+                             initargs=(sources, weight_sources, band_specs(out_ds), mode, packings)) as pool:
+        pending = set()
+        written = 0
+        for window in windows:
+            pending.add(pool.submit(merge_tile, window))
+            if len(pending) < 2 * workers:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                write_tile(out_ds, future.result(), count_ds, timings)
+            written += len(done)
+            if progress is not None and not progress(written, len(windows)):
+                pool.shutdown(wait=True, cancel_futures=True)
+                out_ds.FlushCache()
+                return False
+        for future in wait(pending).done:
+            write_tile(out_ds, future.result(), count_ds, timings)
+            written += 1
+            if progress is not None:
+                progress(written, len(windows))
+    started = time.perf_counter()
+    out_ds.FlushCache()
+    if timings is not None:
+        add_timing(timings, 'write', time.perf_counter() - started)
+    return True
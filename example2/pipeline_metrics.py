@@ -0,0 +1,203 @@
+"""Per-stage timing histograms for the ingest pipeline and their export.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Every stage between a file landing and it being visible in QGIS records
+its duration in seconds into a histogram: the watcher's detection lag,
+the wait for the file to be stable, opening, reading, compositing and
+writing pixels, building overviews and swapping the layer, plus the
+end-to-end detect-to-display latency per file. Gauges such as the depth
+and oldest age of the ingest queue are set as they change. Snapshots are
+exported as CSV or in the Prometheus text format (e.g. for node_exporter's
+textfile collector) and shown in the plugins' metrics dock.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ('event', 'stable', 'open', 'read', 'composite', 'write', 'overviews', 'layer_swap',
+          'detect_to_display')
+
+# Upper bounds of the histogram buckets, in seconds; the last one catches everything
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+           float('inf'))
+
+COLUMNS = ('stage', 'count', 'sum', 'mean', 'p50', 'p95', 'max')
+
+# Files that were seen but never displayed (e.g. failed merges) are forgotten past this many
+MAX_TRACKED_FILES = 10000
+
+
+class Histogram:
+    """Per-bucket (non-cumulative) counts plus count, sum and max of the observed durations."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimate the q-quantile by linear interpolation inside its bucket, like histogram_quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * max(0.0, rank - seen) / count
+            seen += count
+        return self.max
+
+
+class PipelineMetrics:
+    """Thread-safe set of stage histograms plus the arrival time of files in flight."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histograms = {stage: Histogram(buckets) for stage in STAGES}
+        self.arrivals = {}  # path -> monotonic time the first event for it was received
+        self.merged = []  # paths merged and waiting for their layer to be repainted
+        self.gauge_values = {}  # name -> latest value, e.g. from IngestQueue.stats()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_many(self, timings):
+        """Observe a {stage: seconds} dict, e.g. the timings collected by stream_merge."""
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the body of a with statement as one observation of stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def set_gauges(self, values):
+        """Set the current value of each gauge in a {name: value} dict."""
+        with self.lock:
+            self.gauge_values.update(values)
+
+    def gauges(self):
+        """Return the gauges as sorted (name, value) pairs."""
+        with self.lock:
+            return sorted(self.gauge_values.items())
+
+    def received(self, path, now=None, written=None):
+        """Note the first watcher event for path.
+
+        written is the file's mtime (wall clock) if known, to record how long
+        the watcher took to notice the write.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if path in self.arrivals:
+                return
+            if len(self.arrivals) >= MAX_TRACKED_FILES:
+                del self.arrivals[next(iter(self.arrivals))]
+            self.arrivals[path] = now
+        if written is not None:
+            self.observe('event', max(0.0, time.time() - written))
+
+    def stable(self, path, now=None):
+        """Note that path was found complete; records the wait since its first event."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            arrived = self.arrivals.get(path)
+        if arrived is not None:
+            self.observe('stable', now - arrived)
+
+    def expand(self, path, member_paths):
+        """Let the scenes unpacked from the archive at path inherit its arrival time."""
+        with self.lock:
+            arrived = self.arrivals.pop(path, None)
+            if arrived is not None:
+                for member_path in member_paths:
+                    self.arrivals.setdefault(member_path, arrived)
+
+    def done(self, paths, merged=True):
+        """Note the outcome of a merge; merged paths count as displayed at the next displayed()."""
+        with self.lock:
+            if merged:
+                self.merged.extend(path for path in paths if path in self.arrivals)
+            else:
+                for path in paths:
+                    self.arrivals.pop(path, None)
+
+    def displayed(self, now=None):
+        """Record detect-to-display latency for every merged file; call once the layer is repainted."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            arrivals = [self.arrivals.pop(path, None) for path in self.merged]
+            self.merged = []
+        for arrived in arrivals:
+            if arrived is not None:
+                self.observe('detect_to_display', now - arrived)
+
+    def snapshot(self):
+        """Return one row per stage with COLUMNS: count, sum, mean, p50, p95 and max in seconds."""
+        with self.lock:
+            rows = []
+            for stage, histogram in self.histograms.items():
+                mean = histogram.total / histogram.count if histogram.count else 0.0
+                rows.append((stage, histogram.count, histogram.total, mean, histogram.quantile(0.5),
+                             histogram.quantile(0.95), histogram.max))
+        return rows
+
+    def to_csv(self):
+        lines = [','.join(COLUMNS)]
+        for stage, count, *values in self.snapshot():
+            lines.append(','.join([stage, str(count)] + [f'{value:.6f}' for value in values]))
+        # Gauges only fill the count column
+        for name, value in self.gauges():
+            lines.append(','.join([name, f'{value:g}'] + [''] * (len(COLUMNS) - 2)))
+        return '\n'.join(lines) + '\n'
+
+    def to_prometheus(self, prefix):
+        """Render every stage as one labelled series of a <prefix>_stage_seconds histogram."""
+        name = f'{prefix}_stage_seconds'
+        lines = [f'# HELP {name} Time spent per ingest pipeline stage.', f'# TYPE {name} histogram']
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        for gauge, value in self.gauges():
+            lines += [f'# TYPE {prefix}_{gauge} gauge', f'{prefix}_{gauge} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path, prefix):
+        """Write a snapshot to path, as CSV for a .csv path and in the Prometheus text format otherwise.
+
+        The file is replaced atomically so a scraper never reads half of it.
+        """
+        text = self.to_csv() if path.lower().endswith('.csv') else self.to_prometheus(prefix)
+        staging_path = path + '.part'
+        with open(staging_path, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        os.replace(staging_path, path)
@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Startup backfill test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from backfill import (
+    BY_LOCALITY, BY_TIME, BackfillProgress, BackfillScene, batched, morton_key, order_scenes,
+    read_parallel, scan_folder)
+
+
+class BackfillTest(unittest.TestCase):
+    """Test listing, ordering and progress of the start-up backfill."""
+
+    def test_scan_folder_skips_hidden_and_excluded(self):
+        folder = tempfile.mkdtemp()
+        try:
+            for name in ('b.tif', 'a.TIF', '.hidden.tif', 'merged_output.tif', 'notes.txt'):
+                open(os.path.join(folder, name), 'w').close()
+            os.mkdir(os.path.join(folder, 'sub.tif'))
+            paths = scan_folder(folder, ('.tif', '.tiff'), exclude=('merged_output.tif',))
+            self.assertEqual([os.path.basename(path) for path in paths], ['a.TIF', 'b.tif'])
+        finally:
+            shutil.rmtree(folder)
+
+    def test_read_parallel_keeps_order_and_drops_unreadable(self):
+        calls = []
+        paths = [str(i) for i in range(50)]
+        results = read_parallel(paths, lambda path: None if int(path) % 10 == 0 else int(path), workers=4,
+                                progress=lambda done, total: calls.append(total))
+        self.assertEqual(results, [i for i in range(50) if i % 10])
+        self.assertEqual(calls, [50] * 50)
+
+    def test_order_by_time(self):
+        """Oldest acquisitions first; ties keep name order."""
+        scenes = [BackfillScene('c', 3.0, 0, 0), BackfillScene('b', 1.0, 0, 0), BackfillScene('a', 1.0, 0, 0)]
+        self.assertEqual([s.path for s in order_scenes(scenes, BY_TIME)], ['a', 'b', 'c'])
+
+    def test_order_by_locality(self):
+        """Neighbouring scenes end up next to each other along the Z-order curve."""
+        scenes = [BackfillScene(f'{x},{y}', 0.0, x, y) for x in (0, 1, 10, 11) for y in (0, 1, 10, 11)]
+        ordered = [s.path for s in order_scenes(scenes, BY_LOCALITY)]
+        self.assertEqual(ordered[:4], ['0,0', '1,0', '0,1', '1,1'])
+        self.assertEqual(set(ordered[12:]), {'10,10', '11,10', '10,11', '11,11'})
+        self.assertEqual(morton_key(0, 0, (0, 0, 0, 0)), 0)
+
+    def test_batched(self):
+        self.assertEqual(batched(list(range(5)), 2), [[0, 1], [2, 3], [4]])
+
+    def test_progress_and_eta(self):
+        """Only backfilled scenes count, and the ETA follows the rate so far."""
+        progress = BackfillProgress(['a', 'b', 'c', 'd'], now=0.0)
+        done, total, rate, eta = progress.update(['a', 'b', 'new'], now=10.0)
+        self.assertEqual((done, total, rate, eta), (2, 4, 0.2, 10.0))
+        progress.update(['c'], failed=True, now=10.0)
+        self.assertEqual(progress.message(now=15.0), '3 of 4 scenes backfilled (0.2/s), 1 failed, about 5 s left')
+        self.assertFalse(progress.finished)
+        progress.update(['d', 'a'])
+        self.assertTrue(progress.finished)
+        self.assertEqual(progress.done, 4)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BackfillTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
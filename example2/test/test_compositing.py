@@ -0,0 +1,60 @@
+# coding=utf-8
+"""Compositing kernels test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import unittest
+
+import numpy as np
+
+from compositing import KERNELS, LAST_VALID, FIRST_VALID, MAXIMUM, MINIMUM, MEAN
+
+
+class CompositingTest(unittest.TestCase):
+    """Test the compositing kernels honour validity masks."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # Pixel 0 has no value yet, pixels 1-3 already hold 10
+        self.tile = np.array([0, 10, 10, 10], dtype=np.uint8)
+        self.valid = np.array([False, True, True, True])
+        self.count = np.array([0, 1, 3, 1], dtype=np.uint32)
+        self.data = np.array([4, 20, 2, 255], dtype=np.uint8)
+        # The last source pixel is nodata
+        self.data_valid = np.array([True, True, True, False])
+
+    def composite(self, mode, weight=1):
+        KERNELS[mode](self.tile, self.valid, self.count, self.data, self.data_valid, weight)
+        return self.tile.tolist()
+
+    def test_last_valid(self):
+        self.assertEqual(self.composite(LAST_VALID), [4, 20, 2, 10])
+
+    def test_first_valid(self):
+        self.assertEqual(self.composite(FIRST_VALID), [4, 10, 10, 10])
+
+    def test_maximum(self):
+        self.assertEqual(self.composite(MAXIMUM), [4, 20, 10, 10])
+
+    def test_minimum(self):
+        self.assertEqual(self.composite(MINIMUM), [4, 10, 2, 10])
+
+    def test_count_weighted_mean(self):
+        """The mean weighs the tile by its scene count."""
+        self.assertEqual(self.composite(MEAN), [4, 15, 8, 10])
+        self.assertEqual(self.count.tolist(), [1, 2, 4, 1])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CompositingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
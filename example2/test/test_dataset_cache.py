@@ -0,0 +1,101 @@
+# coding=utf-8
+"""Dataset cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from osgeo import gdal
+
+from dataset_cache import DatasetCache, header_bounds
+
+
+class DatasetCacheTest(unittest.TestCase):
+    """Test the LRU pool of GDAL handles and the header cache."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.cache = DatasetCache(max_handles=2)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.cache.close()
+        shutil.rmtree(self.folder)
+
+    def make_raster(self, name, size=10, nodata=None):
+        path = os.path.join(self.folder, name)
+        ds = gdal.GetDriverByName('GTiff').Create(path, size, size, 1, gdal.GDT_UInt16)
+        ds.SetGeoTransform((0, 1, 0, size, 0, -1))
+        if nodata is not None:
+            ds.GetRasterBand(1).SetNoDataValue(nodata)
+        ds = None
+        return path
+
+    def test_repeated_open_reuses_handle(self):
+        """Opening an unchanged file again returns the pooled handle."""
+        path = self.make_raster('a.tif')
+        self.assertIs(self.cache.open(path), self.cache.open(path))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_rewritten_file_is_reopened(self):
+        """A file whose size or mtime changed is not served from the pool."""
+        path = self.make_raster('a.tif')
+        first = self.cache.open(path)
+        first = None
+        os.utime(path, ns=(0, 0))
+        self.cache.open(path)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_least_recently_used_is_evicted(self):
+        """The pool never holds more than max_handles datasets."""
+        paths = [self.make_raster(f'{name}.tif') for name in 'abc']
+        for path in paths:
+            self.cache.open(path)
+        self.cache.open(paths[1])
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual([path for _, path in self.cache.handles], [paths[2], paths[1]])
+
+    def test_threads_get_their_own_handles(self):
+        """A handle is never handed to another thread: GDAL datasets are not thread-safe."""
+        path = self.make_raster('a.tif')
+        mine = self.cache.open(path)
+        theirs = []
+        thread = threading.Thread(target=lambda: theirs.append(self.cache.open(path)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(theirs[0], mine)
+        self.assertIs(self.cache.open(path), mine)
+        self.cache.invalidate(path)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_header_is_cached(self):
+        """Header metadata is read once and dropped on invalidate."""
+        path = self.make_raster('a.tif', size=20, nodata=0)
+        header = self.cache.header(path)
+        self.assertEqual((header.x_size, header.y_size, header.band_count), (20, 20, 1))
+        self.assertEqual((header.data_types, header.nodata), ((gdal.GDT_UInt16,), (0.0,)))
+        self.assertIs(self.cache.header(path), header)
+        self.assertEqual(header_bounds(header), (0, 0, 20, 20))
+        self.cache.invalidate(path)
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNot(self.cache.header(path), header)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DatasetCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
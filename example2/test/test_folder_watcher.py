@@ -0,0 +1,90 @@
+# coding=utf-8
+"""Folder watcher test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from folder_watcher import FolderWatcher
+
+
+class FolderWatcherTest(unittest.TestCase):
+    """Test the polling fallback of the folder watcher."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.touch('existing.png')
+        self.watcher = FolderWatcher(self.folder, poll_interval=0.05, use_events=False, quiet_period=0.2,
+                                     rescan_interval=0.3)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.watcher.stop()
+        shutil.rmtree(self.folder)
+
+    def touch(self, name, mode='wb'):
+        path = os.path.join(self.folder, name)
+        with open(path, mode) as handle:
+            handle.write(b'0')
+        return path
+
+    def test_start_returns_existing_images(self):
+        """Images already in the folder are reported once at start."""
+        self.assertEqual(self.watcher.start(), [os.path.join(self.folder, 'existing.png')])
+        self.assertEqual(self.watcher.wait(0.1), [])
+
+    def test_new_image_detected(self):
+        """A new image is reported and other extensions are ignored."""
+        self.watcher.start()
+        self.touch('notes.txt')
+        path = self.touch('scene.JPG')
+        self.assertEqual(self.watcher.wait(1.0), [path])
+
+    def test_rewritten_image_detected_again(self):
+        """An image rewritten in place is reported again, though the folder itself did not change."""
+        path = self.watcher.start()[0]
+        folder_mtime = os.stat(self.folder).st_mtime_ns
+        os.utime(path, ns=(10 ** 18, 10 ** 18))
+        os.utime(self.folder, ns=(folder_mtime, folder_mtime))
+        self.assertEqual(self.watcher.wait(1.0), [path])
+        self.assertEqual(self.watcher.wait(0.1), [])
+
+
+    def test_image_reported_once_written(self):
+        """An image still growing is held back until it stays unchanged for the quiet period."""
+        self.watcher.start()
+        path = self.touch('scene.png')
+        for _ in range(4):
+            self.assertEqual(self.watcher.wait(0.1), [])
+            self.touch('scene.png', mode='ab')
+        self.assertEqual(self.watcher.wait(1.0), [path])
+        self.assertEqual(self.watcher.wait(0.4), [])
+
+    def test_unchanged_folder_is_not_rescanned(self):
+        """While the folder's mtime stays put, it is only rescanned every rescan_interval."""
+        self.watcher.start()
+        scans = []
+        scan = self.watcher.scan
+        self.watcher.scan = lambda: scans.append(time.monotonic()) or scan()
+        self.watcher.wait(0.5)
+        self.assertEqual(len(scans), 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FolderWatcherTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
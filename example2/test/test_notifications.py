@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Notification throttle test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from notifications import EventLog, UiThrottle
+
+
+class NotificationsTest(unittest.TestCase):
+    """Test that bursts of notifications become periodic summaries."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.throttle = UiThrottle(interval=5.0)
+
+    def test_first_notification_is_due(self):
+        """Nothing was shown yet, so the first event can be shown at once."""
+        self.assertTrue(self.throttle.notify('scenes merged', 3, now=0.0))
+        summary, counts, _ = self.throttle.flush(now=0.0)
+        self.assertEqual(summary, '3 scenes merged in the last 1 s')
+        self.assertEqual(counts, {'scenes merged': 3})
+
+    def test_burst_is_summarized(self):
+        """Events within one interval are aggregated into one summary."""
+        self.throttle.notify('scenes merged', 1, now=-1.0)
+        self.throttle.flush(now=0.0)
+        self.throttle.notify('scenes merged', 1, now=0.0)
+        for i in range(1, 37):
+            self.assertFalse(self.throttle.notify('scenes merged', 1, now=i * 0.1))
+        self.throttle.notify('scenes failed to merge', 2, now=4.0)
+        self.assertEqual(self.throttle.flush(now=4.0), (None, {}, {}))
+        summary, _, _ = self.throttle.flush(now=5.0)
+        self.assertEqual(summary, '37 scenes merged, 2 scenes failed to merge in the last 5 s')
+        self.assertEqual(self.throttle.flush(now=20.0, force=True), (None, {}, {}))
+
+    def test_refreshes_merge_bounds(self):
+        """Only the latest path per layer is refreshed, over the union of the changed bounds."""
+        self.throttle.refresh('mosaic', 'out.tif', (0, 0, 10, 10), now=0.0)
+        self.throttle.refresh('mosaic', 'out.tif', (5, -5, 20, 5), now=1.0)
+        _, _, refreshes = self.throttle.flush(now=1.0)
+        self.assertEqual(refreshes, {'mosaic': ('out.tif', (0, -5, 20, 10))})
+
+    def test_unknown_bounds_repaint_everything(self):
+        self.throttle.refresh('mosaic', 'out.tif', (0, 0, 10, 10), now=0.0)
+        self.throttle.refresh('mosaic', 'out.tif', None, now=0.0)
+        _, _, refreshes = self.throttle.flush(now=0.0)
+        self.assertEqual(refreshes, {'mosaic': ('out.tif', None)})
+
+    def test_event_log_writes_json_lines(self):
+        """Every event is kept in the structured log."""
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'events.jsonl')
+            log = EventLog(path)
+            log.write('merged', files=['a.tif', 'b.tif'])
+            log.close()
+            log.write('ignored after close')
+            with open(path, encoding='utf-8') as handle:
+                records = [json.loads(line) for line in handle]
+            self.assertEqual(len(records), 1)
+            self.assertEqual((records[0]['event'], records[0]['files']), ('merged', ['a.tif', 'b.tif']))
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(NotificationsTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Output profiles test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from output_profiles import (
+    DEFLATE, PLAIN, creation_options, downsample, finalize_output, overview_levels, update_overviews)
+
+
+class OutputProfilesTest(unittest.TestCase):
+    """Test creation options and overview maintenance."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def test_creation_options(self):
+        """Compressed profiles are tiled and get a matching predictor."""
+        options = creation_options(DEFLATE, gdal.GDT_Float32, 1000, 1000, 1)
+        self.assertIn('TILED=YES', options)
+        self.assertIn('PREDICTOR=3', options)
+        self.assertEqual(creation_options(PLAIN, gdal.GDT_Byte, 10, 10, 1), ['BIGTIFF=IF_SAFER'])
+        self.assertIn('BIGTIFF=YES', creation_options(DEFLATE, gdal.GDT_Float64, 40000, 40000, 1))
+
+    def test_overview_levels(self):
+        self.assertEqual(overview_levels(2048, 1000), [2, 4, 8])
+        self.assertEqual(overview_levels(100, 100), [])
+
+    def test_downsample_skips_nodata(self):
+        data = np.array([[0, 4], [8, 0]], dtype=np.uint8)
+        self.assertEqual(downsample(data, 1, 1, 2, 2, 0, np.uint8).tolist(), [[6]])
+
+    def test_update_overviews_matches_rebuild(self):
+        """Updating a window gives the same overviews as rebuilding them."""
+        path = os.path.join(self.folder, 'mosaic.tif')
+        ds = gdal.GetDriverByName('GTiff').Create(path, 1024, 1024, 1, gdal.GDT_Byte,
+                                                  options=creation_options(DEFLATE, gdal.GDT_Byte, 1024, 1024, 1))
+        ds.GetRasterBand(1).Fill(10)
+        ds = None
+        self.assertTrue(finalize_output(path, DEFLATE))
+
+        ds = gdal.Open(path, gdal.GA_Update)
+        ds.GetRasterBand(1).WriteArray(np.full((100, 300), 250, dtype=np.uint8), 200, 600)
+        self.assertEqual(update_overviews(ds, (200, 600, 300, 100)), 2)
+        updated = ds.GetRasterBand(1).GetOverview(0).ReadAsArray()
+        ds.BuildOverviews('AVERAGE', [2, 4])
+        rebuilt = ds.GetRasterBand(1).GetOverview(0).ReadAsArray()
+        ds = None
+        np.testing.assert_array_equal(updated, rebuilt)
+
+    def test_finalize_leaves_global_config_alone(self):
+        """Overview compression is set for this thread only, not for every merge in the process."""
+        path = os.path.join(self.folder, 'mosaic.tif')
+        ds = gdal.GetDriverByName('GTiff').Create(path, 1024, 1024, 1, gdal.GDT_Byte,
+                                                  options=creation_options(DEFLATE, gdal.GDT_Byte, 1024, 1024, 1))
+        ds.GetRasterBand(1).Fill(10)
+        ds = None
+        gdal.SetConfigOption('COMPRESS_OVERVIEW', 'LZW')
+        try:
+            self.assertTrue(finalize_output(path, DEFLATE))
+            self.assertEqual(gdal.GetConfigOption('COMPRESS_OVERVIEW'), 'LZW')
+        finally:
+            gdal.SetConfigOption('COMPRESS_OVERVIEW', None)
+        self.assertEqual(gdal.Open(path).GetRasterBand(1).GetOverviewCount(), 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(OutputProfilesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,97 @@
+# coding=utf-8
+"""Parallel merge engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from compositing import LAST_VALID, MAXIMUM
+from parallel_merge import parallel_merge
+
+
+def write_scene(path, xsize, ysize, seed):
+    ds = gdal.GetDriverByName('GTiff').Create(path, xsize, ysize, 1, gdal.GDT_Byte)
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(0)
+    band.WriteArray(np.random.default_rng(seed).integers(0, 255, (ysize, xsize), dtype=np.uint8))
+    ds = None
+    return gdal.Open(path)
+
+
+def empty_output(xsize=96, ysize=80):
+    out_ds = gdal.GetDriverByName('MEM').Create('', xsize, ysize, 1, gdal.GDT_Byte)
+    out_ds.GetRasterBand(1).SetNoDataValue(0)
+    return out_ds
+
+
+class ParallelMergeTest(unittest.TestCase):
+    """Test the process-pool merge engine against the serial one."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        # Workers reopen the sources by path, so they live on disk
+        self.placements = [(write_scene(os.path.join(self.folder, 'a.tif'), 64, 64, 1), 0, 0),
+                           (write_scene(os.path.join(self.folder, 'b.tif'), 64, 48, 2), 32, 24)]
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.placements = None
+        shutil.rmtree(self.folder)
+
+    def merge(self, mode, **kwargs):
+        out_ds = empty_output()
+        result = parallel_merge(out_ds, self.placements, mode, tile_size=16, **kwargs)
+        return result, out_ds.GetRasterBand(1).ReadAsArray()
+
+    def test_pooled_merge_matches_serial(self):
+        """Tiles composited on worker processes give the serial result, pixel for pixel."""
+        for mode in (LAST_VALID, MAXIMUM):
+            serial_ok, serial = self.merge(mode, workers=1)
+            pooled_ok, pooled = self.merge(mode, workers=2, min_pixels=0)
+            self.assertTrue(serial_ok and pooled_ok)
+            np.testing.assert_array_equal(pooled, serial)
+            self.assertTrue(np.any(serial))
+
+    def test_small_merge_runs_serially(self):
+        """Below min_pixels the merge stays in this process, so in-memory sources work too."""
+        mem = gdal.GetDriverByName('MEM').Create('', 8, 8, 1, gdal.GDT_Byte)
+        mem.GetRasterBand(1).Fill(7)
+        out_ds = empty_output()
+        self.assertTrue(parallel_merge(out_ds, [(mem, 4, 4)], LAST_VALID, workers=4, tile_size=4))
+        data = out_ds.GetRasterBand(1).ReadAsArray()
+        self.assertTrue(np.all(data[4:12, 4:12] == 7))
+        self.assertEqual(int(data.sum()), 7 * 64)
+
+    def test_pooled_merge_can_be_cancelled(self):
+        """When progress returns False, the pooled merge stops and reports it."""
+        calls = []
+
+        def progress(done, total):
+            calls.append(done)
+            return False
+
+        ok, _ = self.merge(LAST_VALID, workers=2, min_pixels=0, progress=progress)
+        self.assertFalse(ok)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ParallelMergeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""Pipeline metrics test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pipeline_metrics import Histogram, PipelineMetrics
+
+
+class PipelineMetricsTest(unittest.TestCase):
+    """Test the stage histograms and their export."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.metrics = PipelineMetrics()
+
+    def test_histogram_quantiles(self):
+        """Quantiles are interpolated inside the bucket that holds them."""
+        histogram = Histogram(buckets=(1.0, 2.0, float('inf')))
+        for seconds in (0.5, 0.5, 1.5, 1.5):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [2, 2, 0])
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.0)
+        self.assertAlmostEqual(histogram.quantile(0.75), 1.25)
+        self.assertAlmostEqual(histogram.quantile(1.0), 1.5)
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+
+    def test_detect_to_display(self):
+        """A file's latency runs from its first event to the repaint after its merge."""
+        self.metrics.received('a.tif', now=10.0)
+        self.metrics.received('a.tif', now=11.0)
+        self.metrics.received('b.tif', now=12.0)
+        self.metrics.stable('a.tif', now=13.0)
+        self.metrics.done(['a.tif'])
+        self.metrics.done(['b.tif'], merged=False)
+        self.metrics.displayed(now=20.0)
+        rows = {row[0]: row for row in self.metrics.snapshot()}
+        self.assertEqual(rows['stable'][1:3], (1, 3.0))
+        self.assertEqual(rows['detect_to_display'][1:3], (1, 10.0))
+        self.assertEqual(self.metrics.arrivals, {})
+
+    def test_timings_and_timer(self):
+        self.metrics.observe_many({'read': 0.5, 'write': 0.25})
+        with self.metrics.timer('overviews'):
+            pass
+        rows = {row[0]: row for row in self.metrics.snapshot()}
+        self.assertEqual((rows['read'][1], rows['write'][2], rows['overviews'][1]), (1, 0.25, 1))
+
+    def test_prometheus_histogram(self):
+        """Buckets are cumulative and end with +Inf, as the text format requires."""
+        self.metrics.observe('write', 0.002)
+        self.metrics.observe('write', 7.0)
+        text = self.metrics.to_prometheus('example')
+        self.assertIn('# TYPE example_stage_seconds histogram', text)
+        self.assertIn('example_stage_seconds_bucket{stage="write",le="0.005"} 1', text)
+        self.assertIn('example_stage_seconds_bucket{stage="write",le="+Inf"} 2', text)
+        self.assertIn('example_stage_seconds_count{stage="write"} 2', text)
+
+    def test_gauges_are_exported(self):
+        """Gauges such as the queue depth are exported next to the histograms."""
+        self.metrics.set_gauges({'queue_depth': 12, 'queue_oldest_age': 2.5})
+        self.assertEqual(self.metrics.gauges(), [('queue_depth', 12), ('queue_oldest_age', 2.5)])
+        text = self.metrics.to_prometheus('example')
+        self.assertIn('# TYPE example_queue_depth gauge\nexample_queue_depth 12\n', text)
+        self.assertIn('example_queue_oldest_age 2.5', text)
+        self.assertIn('\nqueue_depth,12,,,,,\n', self.metrics.to_csv())
+
+    def test_archive_members_inherit_arrival(self):
+        """Scenes unpacked from an archive count from the archive's first event."""
+        self.metrics.received('delivery.zip', now=10.0)
+        self.metrics.expand('delivery.zip', ['a.tif', 'b.tif'])
+        self.metrics.done(['a.tif', 'b.tif'])
+        self.metrics.displayed(now=14.0)
+        rows = {row[0]: row for row in self.metrics.snapshot()}
+        self.assertEqual(rows['detect_to_display'][1], 2)
+        self.assertEqual(rows['detect_to_display'][6], 4.0)
+
+    def test_export_by_extension(self):
+        """A .csv path gets CSV, any other path the Prometheus text format."""
+        folder = tempfile.mkdtemp()
+        try:
+            self.metrics.observe('read', 1.0)
+            csv_path = os.path.join(folder, 'metrics.csv')
+            prom_path = os.path.join(folder, 'metrics.prom')
+            self.metrics.export(csv_path, 'example')
+            self.metrics.export(prom_path, 'example')
+            with open(csv_path, encoding='utf-8') as handle:
+                lines = handle.read().splitlines()
+            self.assertEqual(lines[0], 'stage,count,sum,mean,p50,p95,max')
+            self.assertIn('read,1,1.000000,1.000000,', '\n'.join(lines))
+            with open(prom_path, encoding='utf-8') as handle:
+                self.assertTrue(handle.read().startswith('# HELP example_stage_seconds'))
+            self.assertEqual(sorted(os.listdir(folder)), ['metrics.csv', 'metrics.prom'])
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PipelineMetricsTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,127 @@
+# coding=utf-8
+"""VRT mosaic test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'swapnil'
+__date__ = '2024-08-11'
+__copyright__ = 'Copyright 2024, swapnil'
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+from osgeo import gdal, osr
+
+from vrt_mosaic import VrtMosaic
+
+
+def write_scene(path, origin_x, origin_y, xsize, ysize, value, pixel_size=1.0, projection=None):
+    ds = gdal.GetDriverByName('GTiff').Create(path, xsize, ysize, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform((origin_x, pixel_size, 0, origin_y, 0, -pixel_size))
+    if projection:
+        ds.SetProjection(projection)
+    ds.GetRasterBand(1).Fill(value)
+    ds = None
+    return path
+
+
+class VrtMosaicTest(unittest.TestCase):
+    """Test the lazy VRT mosaic."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.mosaic = VrtMosaic(os.path.join(self.folder, 'mosaic.vrt'))
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def scene(self, name, *args, **kwargs):
+        return write_scene(os.path.join(self.folder, name), *args, **kwargs)
+
+    def read(self):
+        ds = gdal.Open(self.mosaic.vrt_path)
+        return ds.GetGeoTransform(), ds.GetRasterBand(1).ReadAsArray()
+
+    def test_grow_right_and_down(self):
+        """A scene past the bottom-right corner widens the VRT without moving existing sources."""
+        self.assertTrue(self.mosaic.add(self.scene('first.tif', 0, 100, 50, 50, 1)))
+        self.assertTrue(self.mosaic.add(self.scene('second.tif', 40, 60, 20, 20, 3)))
+
+        gt, data = self.read()
+        self.assertEqual((gt[0], gt[3]), (0, 100))
+        self.assertEqual(data.shape, (60, 60))
+        self.assertTrue(np.all(data[40:60, 40:60] == 3))
+        self.assertTrue(np.all(data[0:40, 0:50] == 1))
+        self.assertTrue(np.all(data[50:60, 0:40] == 0))
+
+    def test_grow_left_and_up_shifts_sources(self):
+        """A scene before the top-left corner moves the origin and shifts earlier DstRects."""
+        self.assertTrue(self.mosaic.add(self.scene('first.tif', 0, 100, 50, 50, 1)))
+        self.assertTrue(self.mosaic.add(self.scene('second.tif', -20, 120, 10, 10, 5)))
+
+        gt, data = self.read()
+        self.assertEqual((gt[0], gt[3]), (-20, 120))
+        self.assertEqual(data.shape, (70, 70))
+        self.assertTrue(np.all(data[0:10, 0:10] == 5))
+        self.assertTrue(np.all(data[20:70, 20:70] == 1))
+        self.assertTrue(np.all(data[10:20, :] == 0))
+
+    def test_scene_in_other_crs_is_warped(self):
+        """A scene in another UTM zone is warped into the mosaic CRS and lands where it belongs."""
+        utm33, utm34 = osr.SpatialReference(), osr.SpatialReference()
+        utm33.ImportFromEPSG(32633)
+        utm34.ImportFromEPSG(32634)
+        for srs in (utm33, utm34):
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        self.assertTrue(self.mosaic.add(
+            self.scene('first.tif', 500000, 5001000, 100, 100, 1, pixel_size=10, projection=utm33.ExportToWkt())))
+        centre_x, centre_y = 500500, 5000500
+        x, y, _ = osr.CoordinateTransformation(utm33, utm34).TransformPoint(centre_x, centre_y)
+        self.assertTrue(self.mosaic.add(
+            self.scene('other.tif', x - 100, y + 100, 20, 20, 9, pixel_size=10, projection=utm34.ExportToWkt())))
+
+        root = ET.parse(self.mosaic.vrt_path).getroot()
+        sources = [element.text for element in root.iter('SourceFilename')]
+        self.assertTrue(sources[-1].startswith(self.mosaic.warped_dir))
+        gt, data = self.read()
+        self.assertEqual((gt[0], gt[3]), (500000, 5001000))
+        self.assertEqual(data.shape, (100, 100))
+        self.assertEqual(data[int((centre_y - gt[3]) / gt[5]), int((centre_x - gt[0]) / gt[1])], 9)
+        self.assertEqual(data[0, 0], 1)
+        self.assertEqual(data[99, 99], 1)
+
+    def test_archive_member_source(self):
+        """A scene inside a ZIP is referenced by its /vsizip/ path, which GDAL can open."""
+        self.assertTrue(self.mosaic.add(self.scene('first.tif', 0, 100, 50, 50, 1)))
+        scene = self.scene('scene.tif', 50, 100, 10, 10, 7)
+        zip_path = os.path.join(self.folder, 'delivery.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.write(scene, 'scene/scene.tif')
+        os.remove(scene)
+        member = '/vsizip/' + zip_path + '/scene/scene.tif'
+
+        self.assertTrue(self.mosaic.add(member))
+        root = ET.parse(self.mosaic.vrt_path).getroot()
+        self.assertIn(member, [element.text for element in root.iter('SourceFilename')])
+        gt, data = self.read()
+        self.assertEqual(data.shape, (50, 60))
+        self.assertTrue(np.all(data[0:10, 50:60] == 7))
+        self.assertTrue(np.all(data[:, 0:50] == 1))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VrtMosaicTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
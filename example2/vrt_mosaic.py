@@ -0,0 +1,132 @@
+"""Lazy mosaic kept as a GDAL VRT that references the ingested scenes.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Adding a scene appends one source per band to the VRT XML and rewrites the
+small XML file, so no pixels are copied until the mosaic is materialized.
+"""
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+
+from osgeo import gdal
+
+try:
+    from .raster_merge import dataset_bounds, to_projection
+except ImportError:  # imported as a top-level module, e.g. by the tests
+    from raster_merge import dataset_bounds, to_projection
+
+
+class VrtMosaic:
+    """Mosaic VRT whose first scene sets the CRS, resolution and bands."""
+
+    def __init__(self, vrt_path):
+        self.vrt_path = vrt_path
+        # Scenes in another CRS are referenced through warped VRTs kept here
+        self.warped_dir = vrt_path + '.d'
+
+    def exists(self):
+        return os.path.exists(self.vrt_path)
+
+    def add(self, scene_path):
+        """Append a scene to the mosaic; later scenes are drawn over earlier ones."""
+        scene_ds = gdal.Open(scene_path)
+        if scene_ds is None:
+            return False
+        if not self.exists():
+            vrt_ds = gdal.BuildVRT(self.vrt_path, [scene_path])
+            ok = vrt_ds is not None
+            vrt_ds = None
+            return ok
+
+        tree = ET.parse(self.vrt_path)
+        root = tree.getroot()
+        projection = root.findtext('SRS') or ''
+        if projection and scene_ds.GetProjection() and to_projection(scene_ds, projection) is not scene_ds:
+            scene_path = self.warped_scene(scene_path, scene_ds, projection)
+            scene_ds = gdal.Open(scene_path)
+            if scene_ds is None:
+                return False
+
+        gt = [float(v) for v in root.findtext('GeoTransform').split(',')]
+        self.grow(root, gt, dataset_bounds(scene_ds))
+
+        min_x, min_y, max_x, max_y = dataset_bounds(scene_ds)
+        dst_rect = {
+            'xOff': repr((min_x - gt[0]) / gt[1]),
+            'yOff': repr((max_y - gt[3]) / gt[5]),
+            'xSize': repr((max_x - min_x) / gt[1]),
+            'ySize': repr((min_y - max_y) / gt[5]),
+        }
+        for band_element in root.findall('VRTRasterBand'):
+            band_index = int(band_element.get('band'))
+            if band_index > scene_ds.RasterCount:
+                continue
+            nodata = scene_ds.GetRasterBand(band_index).GetNoDataValue()
+            source = ET.SubElement(band_element, 'SimpleSource' if nodata is None else 'ComplexSource')
+            ET.SubElement(source, 'SourceFilename', relativeToVRT='0').text = source_filename(scene_path)
+            ET.SubElement(source, 'SourceBand').text = str(band_index)
+            ET.SubElement(source, 'SrcRect', xOff='0', yOff='0', xSize=str(scene_ds.RasterXSize),
+                          ySize=str(scene_ds.RasterYSize))
+            ET.SubElement(source, 'DstRect', **dst_rect)
+            if nodata is not None:
+                ET.SubElement(source, 'NODATA').text = repr(nodata)
+
+        self.write(tree, gt)
+        return True
+
+    def grow(self, root, gt, bounds):
+        """Extend the VRT extent to cover bounds, shifting existing sources if the origin moves."""
+        width, height = int(root.get('rasterXSize')), int(root.get('rasterYSize'))
+        min_x, min_y, max_x, max_y = bounds
+        shift_x = max(0, int(-((min_x - gt[0]) // gt[1])))
+        shift_y = max(0, int(-((max_y - gt[3]) // gt[5])))
+        new_width = max(width + shift_x, int(-(-(max_x - gt[0]) // gt[1])) + shift_x)
+        new_height = max(height + shift_y, int(-(-(min_y - gt[3]) // gt[5])) + shift_y)
+
+        if shift_x or shift_y:
+            for rect in root.iter('DstRect'):
+                rect.set('xOff', repr(float(rect.get('xOff')) + shift_x))
+                rect.set('yOff', repr(float(rect.get('yOff')) + shift_y))
+            gt[0] -= shift_x * gt[1]
+            gt[3] -= shift_y * gt[5]
+        root.set('rasterXSize', str(new_width))
+        root.set('rasterYSize', str(new_height))
+
+    def write(self, tree, gt):
+        tree.getroot().find('GeoTransform').text = ', '.join(repr(v) for v in gt)
+        staging_path = self.vrt_path + '.tmp'
+        tree.write(staging_path)
+        os.replace(staging_path, self.vrt_path)
+
+    def warped_scene(self, scene_path, scene_ds, projection):
+        os.makedirs(self.warped_dir, exist_ok=True)
+        # Scenes of different folders or archives often share a name (e.g. B04.tif)
+        key = hashlib.blake2b(scene_path.encode('utf-8'), digest_size=6).hexdigest()
+        warped_path = os.path.join(self.warped_dir, f'{key}_{os.path.basename(scene_path)}.vrt')
+        warped = gdal.Warp(warped_path, scene_ds, format='VRT', dstSRS=projection)
+        warped = None
+        return warped_path
+
+    def materialize(self, output_path, creation_options=None):
+        """Write the mosaic out as a physical GeoTIFF at output_path."""
+        if not self.exists():
+            return False
+        staging_path = output_path + '.part'
+        out_ds = gdal.Translate(staging_path, self.vrt_path, format='GTiff',
+                                creationOptions=creation_options or [])
+        if out_ds is None:
+            return False
+        out_ds = None
+        os.replace(staging_path, output_path)
+        return True
+
+
+def source_filename(path):
+    """Return the absolute SourceFilename of a scene.
+
+    GDAL virtual paths such as /vsizip//data/a.zip/x.tif are kept as they
+    are: abspath would collapse the double slash into a relative archive path.
+    """
+    return path if path.startswith('/vsi') else os.path.abspath(path)
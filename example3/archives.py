@@ -0,0 +1,69 @@
+"""Raster scenes inside ZIP and TAR deliveries, read in place through GDAL's /vsizip/ and /vsitar/.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+A scene inside an archive is named by its GDAL virtual path, e.g.
+/vsizip//data/drop/delivery.zip/scene/B04.tif, and GDAL streams it out of
+the archive when it is read, so nothing is extracted to disk. Members are
+listed with zipfile and tarfile, which only read the ZIP central directory
+or the TAR headers. Wherever the plugins need a file on disk, e.g. for the
+journal's size and mtime, the archive stands in for its members.
+"""
+import os
+import tarfile
+import zipfile
+
+# Compressed TARs work too, but GDAL has to decompress them from the start to seek
+ARCHIVE_PREFIXES = {'.zip': '/vsizip/', '.tar': '/vsitar/', '.tar.gz': '/vsitar/', '.tgz': '/vsitar/'}
+ARCHIVE_EXTENSIONS = tuple(ARCHIVE_PREFIXES)
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_members(path, extensions):
+    """Return the GDAL virtual paths of the members of the archive at path ending with one of extensions.
+
+    Members come sorted by name; hidden files and folders (including macOS
+    __MACOSX forks) are skipped. An archive that cannot be read, e.g. one
+    still being written, has no members.
+    """
+    lower = path.lower()
+    prefix = next(prefix for extension, prefix in ARCHIVE_PREFIXES.items() if lower.endswith(extension))
+    try:
+        if prefix == '/vsizip/':
+            with zipfile.ZipFile(path) as archive:
+                names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        else:
+            with tarfile.open(path) as archive:
+                names = [member.name for member in archive.getmembers() if member.isfile()]
+    except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError):
+        return []
+    return [prefix + os.path.abspath(path) + '/' + name for name in sorted(names)
+            if name.lower().endswith(extensions) and not is_hidden(name)]
+
+
+def is_hidden(member_name):
+    return any(part.startswith('.') or part == '__MACOSX' for part in member_name.split('/'))
+
+
+def expand_archives(paths, extensions):
+    """Replace every archive in paths by its members ending with one of extensions."""
+    expanded = []
+    for path in paths:
+        expanded += archive_members(path, extensions) if is_archive(path) else [path]
+    return expanded
+
+
+def source_file(path):
+    """Return the archive behind a /vsizip/ or /vsitar/ member path, or path itself for a plain file."""
+    for prefix in set(ARCHIVE_PREFIXES.values()):
+        if path.startswith(prefix):
+            inner = path[len(prefix):]
+            ends = [inner.lower().find(extension + '/') + len(extension) for extension in ARCHIVE_EXTENSIONS
+                    if extension + '/' in inner.lower()]
+            if ends:
+                return inner[:min(ends)]
+    return path
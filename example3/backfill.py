@@ -0,0 +1,151 @@
+"""Catch up on scenes that were already in the watched folder at start-up.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+The folder is listed once with os.scandir, scene headers are read on a
+thread pool (GDAL releases the GIL while it reads), and the scenes are
+ordered by acquisition time or by a Z-order key of their centre so that
+each batch the merge engine gets covers a compact area. BackfillProgress
+turns completed batches into a rate and an ETA.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# A scene to backfill: acquisition time as a Unix timestamp, its centre in a common CRS
+# and, if known, its footprint in that CRS for the ingest queue
+BackfillScene = namedtuple('BackfillScene', 'path acquired x y bounds', defaults=(None,))
+
+BY_TIME = 'time'
+BY_LOCALITY = 'locality'
+ORDERS = (BY_TIME, BY_LOCALITY)
+
+# Bits per axis of the Z-order key
+MORTON_BITS = 16
+
+
+def scan_folder(folder, extensions, exclude=()):
+    """Return the paths of the files in folder ending with one of extensions, sorted by name.
+
+    Hidden files and the names in exclude (e.g. the mosaic output) are skipped.
+    """
+    paths = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if (entry.name.startswith('.') or entry.name in exclude
+                    or not entry.name.lower().endswith(extensions) or not entry.is_file()):
+                continue
+            paths.append(entry.path)
+    return sorted(paths)
+
+
+def read_parallel(paths, read, workers=None, progress=None):
+    """Call read(path) for every path on a thread pool and return the results that are not None.
+
+    Results keep the order of paths. `progress`, if given, is called as
+    progress(done, total) from the worker threads.
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    lock = threading.Lock()
+    done = [0]
+
+    def read_one(path):
+        try:
+            return read(path)
+        finally:
+            if progress is not None:
+                with lock:
+                    done[0] += 1
+                    count = done[0]
+                progress(count, len(paths))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [result for result in pool.map(read_one, paths) if result is not None]
+
+
+def morton_key(x, y, bounds, bits=MORTON_BITS):
+    """Interleave the bits of (x, y) quantised to bits per axis over bounds (min_x, min_y, max_x, max_y)."""
+    min_x, min_y, max_x, max_y = bounds
+    top = (1 << bits) - 1
+    qx = int(top * (x - min_x) / (max_x - min_x)) if max_x > min_x else 0
+    qy = int(top * (y - min_y) / (max_y - min_y)) if max_y > min_y else 0
+    key = 0
+    for bit in range(bits):
+        key |= ((qx >> bit) & 1) << (2 * bit) | ((qy >> bit) & 1) << (2 * bit + 1)
+    return key
+
+
+def order_scenes(scenes, order=BY_TIME):
+    """Return BackfillScenes oldest first (BY_TIME) or along a Z-order curve of their centres (BY_LOCALITY)."""
+    if order == BY_LOCALITY and scenes:
+        bounds = (min(s.x for s in scenes), min(s.y for s in scenes),
+                  max(s.x for s in scenes), max(s.y for s in scenes))
+        return sorted(scenes, key=lambda s: (morton_key(s.x, s.y, bounds), s.acquired, s.path))
+    return sorted(scenes, key=lambda s: (s.acquired, s.path))
+
+
+def batched(items, size):
+    """Split items into consecutive lists of at most size items."""
+    return [items[i:i + size] for i in range(0, len(items), max(1, size))]
+
+
+class BackfillProgress:
+    """Count backfilled scenes and estimate the remaining time from the rate so far.
+
+    Merges may mix backfilled and newly arrived scenes; only the paths given
+    at construction are counted.
+    """
+
+    def __init__(self, paths, now=None):
+        self.pending = set(paths)
+        self.total = len(self.pending)
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic() if now is None else now
+        self.lock = threading.Lock()
+
+    def update(self, paths, failed=False, now=None):
+        """Record the outcome of a merge of paths; returns (done, total, rate, eta_seconds)."""
+        with self.lock:
+            count = len(self.pending.intersection(paths))
+            self.pending.difference_update(paths)
+            self.done += count
+            if failed:
+                self.failed += count
+        return self.status(now)
+
+    def status(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            done, total = self.done, self.total
+        elapsed = max(1e-9, now - self.started)
+        rate = done / elapsed
+        eta = (total - done) / rate if rate else None
+        return done, total, rate, eta
+
+    @property
+    def finished(self):
+        with self.lock:
+            return self.done >= self.total
+
+    def message(self, now=None):
+        """E.g. '1,200 of 10,000 scenes backfilled (8.4/s), about 17 min left'."""
+        done, total, rate, eta = self.status(now)
+        text = f'{done:,} of {total:,} scenes backfilled ({rate:.1f}/s)'
+        if self.failed:
+            text += f', {self.failed:,} failed'
+        if eta is not None and done < total:
+            text += f', about {format_duration(eta)} left'
+        return text
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds} s'
+    if seconds < 3600:
+        return f'{seconds // 60} min {seconds % 60} s'
+    return f'{seconds // 3600} h {seconds % 3600 // 60} min'
@@ -1,4 +1,5 @@
 from qgis.core import (
+    QgsMessageLog,
     QgsProject,
     QgsRasterLayer
 )
@@ -6,18 +7,45 @@ from qgis.PyQt.QtCore import (
     QSettings,
     QTranslator,
     QCoreApplication,
-    QTimer
+    QTimer,
+    Qt
 )
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction
 from .resources import *
 from .example3_dialog import Example3Dialog
+from .write_coalescer import OwnWrites, WriteCoalescer
+from .output_staging import OutputStaging
+from .merge_batcher import MergeBatcher
+from .ingest_queue import BLOCK, DEFAULT_MAX_DEPTH, POLICIES, IngestQueue
+from .ingest_sources import PER_SOURCE_MOSAIC, FairShare, MosaicTarget, WatchedSource, parse_source
+from .archives import ARCHIVE_EXTENSIONS, expand_archives, is_archive, source_file
+from .ingest_journal import IngestJournal, SEEN, MERGED, FAILED, SHED
+from .footprint_index import FootprintIndex, acquisition_time, same_crs, transform_bounds, union_bounds
+from .backfill import BY_TIME, BackfillProgress, BackfillScene, order_scenes, read_parallel, scan_folder
+from .dataset_cache import DatasetCache, header_bounds
+from .layer_refresh import show_raster
+from .notifications import DEFAULT_INTERVAL, EventLog, UiThrottle
+from .pipeline_metrics import PipelineMetrics
+from .metrics_dock import MetricsDock
+from .merge_task import GuiDispatcher, MergeTask, submit
+from .raster_merge import (
+    common_data_type, dataset_packing, fits_data_type, merge_windows, output_nodata, place_on_grid, stream_merge,
+    to_projection, union_grid, union_window, value_packing, window_bounds)
+from .parallel_merge import parallel_merge
+from .compositing import COUNTED_MODES, KERNELS, LAST_VALID
+from .vrt_mosaic import VrtMosaic
+from .output_profiles import COG, DEFAULT_PROFILE, DEFLATE, creation_options, finalize_output, update_overviews
 import os
+import threading
 import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from osgeo import gdal, gdalconst
 
+MOSAIC_NAME = 'merged_output.tif'
+SCENE_EXTENSIONS = ('.tif', '.tiff')
+
 class Example3:
     """QGIS Plugin Implementation."""
 
@@ -35,8 +63,33 @@ class Example3:
         self.actions = []
         self.menu = self.tr(u'&Example3')
         self.first_start = None
-        self.observer = None
+        # Watched folders, each with its own watcher, queue and journal, and the mosaics
+        # they feed; merge slots are shared between them in proportion to their priority
+        self.sources = []
+        self.targets = []
+        self.scheduler = FairShare()
+        # Read-only handles of the mosaic and recent scenes, reused across merges
+        self.datasets = DatasetCache(max_handles=QSettings().value('example3/max_open_datasets', 16, type=int))
+        # Merges run as QgsTasks; the dispatcher brings watcher-thread calls to the GUI thread
+        self.gui = GuiDispatcher()
+        self.active_tasks = set()
+        self.materialize_task = None
+        # Mosaics are written in a hidden staging folder and renamed into the watched folder;
+        # events for files the plugin wrote itself are ignored instead of merged again
+        self.own_writes = OwnWrites()
+        self.staging = OutputStaging(self.own_writes, '.example3_staging')
         self.directory_path = None
+        self.composite_mode = LAST_VALID
+        # Notifications and layer refreshes are coalesced and shown at most once per interval
+        self.ui = None
+        self.events = None
+        self.ui_timer = QTimer()
+        self.ui_timer.timeout.connect(self.flush_ui)
+        # Stage timings from file event to repaint, exported and shown on the same timer
+        self.metrics = PipelineMetrics()
+        self.metrics_path = None
+        self.metrics_dock = None
+        self.ui_timer.timeout.connect(self.flush_metrics)
         self.last_image_time = time.time()
         self.timer = QTimer()
         self.timer.timeout.connect(self.stop_if_no_new_images)
@@ -68,16 +121,20 @@ class Example3:
     def initGui(self):
         icon_path = ':/plugins/example3/icon.png'
         self.add_action(icon_path, text=self.tr(u'Start Monitoring'), callback=self.start_monitoring, parent=self.iface.mainWindow())
+        self.add_action(icon_path, text=self.tr(u'Materialize Mosaic'), callback=self.materialize_mosaic, add_to_toolbar=False, parent=self.iface.mainWindow())
+        self.add_action(icon_path, text=self.tr(u'Re-merge Visible Area'), callback=self.remerge_view, add_to_toolbar=False, parent=self.iface.mainWindow())
+        self.add_action(icon_path, text=self.tr(u'Pipeline Metrics'), callback=self.show_metrics, add_to_toolbar=False, parent=self.iface.mainWindow())
         self.first_start = True
 
     def unload(self):
-        if self.observer:
-            self.observer.stop()
-            self.observer.join()
-        self.timer.stop()
+        self.stop_monitoring()
         for action in self.actions:
             self.iface.removePluginMenu(self.tr(u'&Example3'), action)
             self.iface.removeToolBarIcon(action)
+        if self.metrics_dock is not None:
+            self.iface.removeDockWidget(self.metrics_dock)
+            self.metrics_dock.deleteLater()
+            self.metrics_dock = None
 
     def start_monitoring(self):
         if self.first_start:
@@ -86,103 +143,784 @@ class Example3:
 
         result = self.dlg.exec_()
         if result:
-            # Get the directory path from the dialog
-            self.directory_path = self.dlg.directoryLineEdit_1.text()
-            if os.path.isdir(self.directory_path):
+            # Every folder in the dialog, plus any 'folder' or 'folder=priority' entries of the
+            # extra_sources setting, is watched as a source of its own
+            sources = self.dlg.sources()
+            extra_sources = QSettings().value('example3/extra_sources', [], type=list)
+            sources += [parse_source(entry) for entry in extra_sources if entry.strip()]
+            # A folder entered twice is watched once, with its first priority
+            unique = {}
+            for folder, priority in sources:
+                unique.setdefault(os.path.normpath(folder), (folder, priority))
+            sources = list(unique.values())
+            self.directory_path = sources[0][0] if sources else self.dlg.directoryLineEdit_1.text()
+            self.composite_mode = self.dlg.compositeComboBox.currentData()
+            invalid = [folder for folder, _ in sources if not os.path.isdir(folder)]
+            if sources and not invalid:
+                self.stop_monitoring()
                 self.timer.start(120000)  # Check every 2 minutes
-                self.observer = Observer()
-                event_handler = self.RasterFileEventHandler(self.process_new_image)
-                self.observer.schedule(event_handler, self.directory_path, recursive=False)
-                self.observer.start()
+                notify_interval = QSettings().value('example3/notify_interval', DEFAULT_INTERVAL, type=float)
+                self.ui = UiThrottle(notify_interval)
+                self.events = EventLog(os.path.join(self.directory_path, '.example3_events.jsonl'))
+                self.ui_timer.start(int(notify_interval * 1000))
+                # A .csv path is written as CSV, anything else in the Prometheus text format
+                self.metrics = PipelineMetrics()
+                self.metrics_path = QSettings().value(
+                    'example3/metrics_path', os.path.join(self.directory_path, '.example3_metrics.prom'))
+                # Merges of all sources share merge_slots concurrent merges (one when they share a
+                # mosaic) and the merge workers, handed out in proportion to each source's priority
+                mosaic_mode = self.dlg.mosaicComboBox.currentData()
+                slots = QSettings().value('example3/merge_slots', 2, type=int)
+                self.scheduler = FairShare(slots if mosaic_mode == PER_SOURCE_MOSAIC else 1)
+                if mosaic_mode == PER_SOURCE_MOSAIC:
+                    self.targets = [self.mosaic_target(folder, len(sources) > 1) for folder, _ in sources]
+                else:
+                    self.targets = [self.mosaic_target(self.directory_path)] * len(sources)
+                self.sources = [WatchedSource(folder, priority, target)
+                                for (folder, priority), target in zip(sources, self.targets)]
+                self.targets = list(dict.fromkeys(self.targets))
+                for target in self.targets:
+                    self.staging.clean(target.folder)
+                for source in self.sources:
+                    self.start_source(source)
+                    self.events.write('source', source=source.name, folder=source.folder,
+                                      priority=source.priority, mosaic=source.target.folder)
             else:
                 self.iface.messageBar().pushCritical("Error", "The specified path is not a valid directory.")
 
-    def process_new_image(self, file_path):
+    def mosaic_target(self, folder, named=False):
+        """Return a MosaicTarget in folder; named targets carry the folder name in their layer name."""
+        # Lazy mode keeps a VRT referencing the scenes instead of rewriting a GeoTIFF
+        lazy_mosaic = None
+        if QSettings().value('example3/lazy_vrt', False, type=bool):
+            lazy_mosaic = VrtMosaic(os.path.join(folder, 'merged_output.vrt'))
+        return MosaicTarget(folder, lazy_mosaic, os.path.basename(os.path.normpath(folder)) if named else None)
+
+    def start_source(self, source):
+        """Open the journal and index of a source and start its watcher, batcher and backfill."""
+        # Scenes inside a ZIP or TAR delivery are versioned by the archive
+        source.journal = IngestJournal(os.path.join(source.folder, '.example3_journal.sqlite'), source_file=source_file)
+        # Footprints of merged scenes, for "which scenes cover this window" queries
+        source.footprints = FootprintIndex(os.path.join(source.folder, '.example3_footprints.sqlite'))
+        # Seconds a file's size and mtime must stay unchanged before it is merged
+        quiet_period = QSettings().value('example3/quiet_period', 2.0, type=float)
+        # Completed files wait in a bounded queue; when they arrive faster than they are
+        # merged, the policy blocks the watcher, coalesces scenes of one region or sheds
+        # scenes a newer one covers
+        policy = QSettings().value('example3/queue_policy', BLOCK)
+        if policy not in POLICIES:
+            self.iface.messageBar().pushWarning(
+                "Queue", f"Unknown queue policy '{policy}', using '{BLOCK}'.")
+            policy = BLOCK
+        queue = IngestQueue(
+            max_depth=QSettings().value('example3/max_queue_depth', DEFAULT_MAX_DEPTH, type=int),
+            policy=policy, on_shed=lambda paths, reason: self.shed_scenes(source, paths, reason))
+        # Completed files are merged in batches: a batch goes out after batch_wait seconds
+        # or once it is full, and its size then follows the measured merge rate
+        source.batcher = MergeBatcher(
+            lambda file_paths: self.process_new_images(source, file_paths), queue,
+            max_wait=QSettings().value('example3/batch_wait', 5.0, type=float),
+            batch_size=QSettings().value('example3/batch_size', 8, type=int),
+            max_batch=QSettings().value('example3/max_batch_size', 256, type=int), log=self.log_error)
+        source.batcher.start()
+        batcher, metrics, own_writes = source.batcher, self.metrics, self.own_writes
+
+        def file_ready(path):
+            # Our own write may have been the last event while the file settled
+            if own_writes.is_own(path):
+                return
+            metrics.stable(path)
+            scene_paths = [path]
+            if is_archive(path):
+                # A delivery archive is merged scene by scene, read in place through /vsizip/ or /vsitar/
+                scene_paths = expand_archives([path], SCENE_EXTENSIONS)
+                metrics.expand(path, scene_paths)
+            for scene_path in scene_paths:
+                # Footprints are only needed to coalesce or supersede scenes
+                batcher.add(scene_path, bounds=self.scene_bounds(source, scene_path) if policy != BLOCK else None)
+
+        source.coalescer = WriteCoalescer(file_ready, quiet_period=quiet_period, log=self.log_error)
+        source.coalescer.start()
+        source.observer = Observer()
+        event_handler = self.RasterFileEventHandler(source.coalescer, self.metrics, self.own_writes)
+        source.observer.schedule(event_handler, source.folder, recursive=False)
+        source.observer.start()
+        # Started after the observer so nothing written during the scan is missed
+        if QSettings().value('example3/backfill', True, type=bool):
+            self.start_backfill(source)
+
+    def stop_monitoring(self):
+        for source in self.sources:
+            if source.observer:
+                source.observer.stop()
+        for task in list(self.active_tasks):
+            task.cancel()
+        self.scheduler.close()
+        for source in self.sources:
+            if source.backfill_task is not None:
+                source.backfill_task.cancel()
+            source.backfill = None
+            # Before the coalescer: stopping the batcher closes its queue, which releases
+            # a file_ready blocked on the coalescer thread while the queue is full
+            if source.batcher:
+                source.batcher.stop()
+                source.batcher = None
+            if source.coalescer:
+                source.coalescer.stop()
+                source.coalescer = None
+            # The observer thread only records events, so it can always be joined
+            if source.observer:
+                source.observer.join()
+                source.observer = None
+            if source.journal:
+                source.journal.close()
+                source.journal = None
+            if source.footprints:
+                source.footprints.close()
+                source.footprints = None
+        self.sources = []
+        self.datasets.close()
+        self.timer.stop()
+        self.flush_ui(force=True)
+        self.ui_timer.stop()
+        self.flush_metrics()
+        self.metrics_path = None
+        if self.events:
+            self.events.close()
+            self.events = None
+
+    def process_new_images(self, source, file_paths):
+        """Merge one batch of completed files of a source in a single pass.
+
+        Called on the source's batcher thread. The batch first waits for a
+        merge slot from the fair share. The merge then runs as a QgsTask
+        started from the GUI thread; this thread waits for it so the batcher
+        sees the real merge rate and the slot is held until the merge ends.
+        """
         self.last_image_time = time.time()
-        self.load_and_merge_raster_layers(file_path)
+        journal = source.journal
+        done_paths = [path for path in file_paths if journal.is_done(path)]
+        backfill = source.backfill
+        if done_paths and backfill is not None:
+            # Merged after an event while the backfill was queued
+            backfill.update(done_paths)
+        file_paths = [path for path in file_paths if path not in done_paths]
+        if not file_paths:
+            return
+        journal.mark_many(file_paths, SEEN)
+        batcher, scheduler, done = source.batcher, self.scheduler, threading.Event()
+        # Returns False once monitoring stops
+        if not scheduler.acquire(source, source.target):
+            return
+        started = time.monotonic()
+        try:
+            self.gui.post(self.start_merge_task, source, file_paths, done)
+            while not done.wait(0.5):
+                if not batcher.running:
+                    return
+        finally:
+            scheduler.release(source, time.monotonic() - started, source.target)
+
+    def start_merge_task(self, source, file_paths, done):
+        """Start the merge of a batch as a cancellable background task (GUI thread)."""
+        if source.journal is None:
+            # Monitoring stopped while the batch was queued
+            done.set()
+            return
+        target = source.target
+        replaced_id = target.layer_id
+        existing_path = None
+        if target.lazy_mosaic is None:
+            # A single mosaic merges into the existing layer (assumed to be the last raster
+            # layer); its refresh may still be pending, so the last mosaic written wins
+            layers = QgsProject.instance().mapLayersByType(QgsRasterLayer)
+            on_disk = os.path.join(target.folder, MOSAIC_NAME)
+            if len(self.targets) > 1:
+                # Per-source mosaics only take over a layer showing their own output, never
+                # another folder's mosaic
+                layers = [layer for layer in layers
+                          if os.path.normpath(layer.dataProvider().dataSourceUri()) == os.path.normpath(on_disk)]
+            replaced_id = replaced_id or (layers[-1].id() if layers else None)
+            existing_path = layers[-1].dataProvider().dataSourceUri() if layers else None
+            # A mosaic left by an earlier session is merged into rather than overwritten
+            existing_path = target.path or existing_path or (on_disk if os.path.exists(on_disk) else None)
+
+        journal, footprints, events, ui, metrics = source.journal, source.footprints, self.events, self.ui, self.metrics
+
+        def work(task):
+            mosaic_path = self.merge_batch(target, existing_path, file_paths, task)
+            if mosaic_path is None:
+                return None
+            for path in file_paths:
+                footprints.add(path, self.datasets.open(path))
+            return mosaic_path, self.changed_bounds(file_paths, mosaic_path)
+
+        def on_finished(result):
+            try:
+                merged = result is not None
+                if source.journal is journal:
+                    journal.mark_many(file_paths, MERGED if merged else FAILED)
+                metrics.done(file_paths, merged)
+                if source.backfill is not None:
+                    source.backfill.update(file_paths, failed=not merged)
+                if merged:
+                    target.path = result[0]
+                    target.layer_id = target.layer_id or replaced_id
+                    events.write('merged', source=source.name, files=file_paths, mosaic=result[0], bounds=result[1])
+                    ui.refresh(target, result[0], result[1])
+                    due = ui.notify("scenes merged", len(file_paths))
+                else:
+                    events.write('failed', source=source.name, files=file_paths)
+                    due = ui.notify("scenes failed to merge", len(file_paths))
+                if due and ui is self.ui:
+                    self.flush_ui()
+            finally:
+                self.active_tasks.discard(task)
+                done.set()
+
+        task = submit(MergeTask(f"Merging {len(file_paths)} rasters from {source.name}", work, on_finished))
+        self.active_tasks.add(task)
+
+    def merge_batch(self, target, existing_path, new_raster_paths, task):
+        """Merge new rasters into the target's mosaic (task thread); returns the path to show, or None."""
+        if target.lazy_mosaic is not None:
+            with self.metrics.timer('write'):
+                ok = all([target.lazy_mosaic.add(path) for path in new_raster_paths])
+            return target.lazy_mosaic.vrt_path if ok else None
+        if existing_path is None:
+            # The first raster of the batch starts the mosaic
+            existing_path, new_raster_paths = new_raster_paths[0], new_raster_paths[1:]
+        output_path = os.path.join(target.folder, MOSAIC_NAME)
+        if not new_raster_paths:
+            return existing_path
+        if not self.merge_rasters(existing_path, new_raster_paths, task.progress, output_path):
+            return None
+        # Show the merged result, not just the new rasters
+        return output_path
+
+    def changed_bounds(self, file_paths, mosaic_path):
+        """Return the footprint of file_paths in the mosaic's CRS: the part of its layer to repaint."""
+        mosaic = self.datasets.header(mosaic_path)
+        headers = [self.datasets.header(path) for path in file_paths]
+        if mosaic is None or None in headers:
+            return None
+        return union_bounds([(header_bounds(header), header.projection) for header in headers], mosaic.projection)
+
+    def show_mosaic(self, target, mosaic_path, dirty_bounds=None):
+        """Show mosaic_path in the target's layer, reloading it in place (GUI thread).
+
+        The layer keeps its style and place in the layer tree; it is only
+        created when there is none yet, and only repainted when the changed
+        bounds are in view.
+        """
+        name = "Mosaic" if target.lazy_mosaic is not None else "New Layer"
+        if target.name:
+            name = f"{name} ({target.name})"
+        layer = show_raster(mosaic_path, name, target.layer_id, dirty_bounds, self.iface.mapCanvas())
+        if layer is None:
+            self.iface.messageBar().pushCritical("Layer Error", "Failed to load the new raster layer.")
+            return False
+        target.layer_id = layer.id()
+        return True
 
-    def stop_if_no_new_images(self):
-        if time.time() - self.last_image_time > 120:
-            self.iface.messageBar().pushInfo("Stop", "No new images detected for more than 2 minutes. Stopping the monitoring process.")
-            self.unload()
-
-    def load_and_merge_raster_layers(self, new_raster_path):
-        """Load the new raster, merge with existing rasters, and update QGIS project."""
-
-        # Check if there's already a raster layer
-        layers = QgsProject.instance().mapLayersByType(QgsRasterLayer)
-        if layers:
-            # Get the existing layer (assumed to be the last one in the list)
-            existing_layer = layers[-1]
-            existing_path = existing_layer.dataProvider().dataSourceUri()
-            if not self.merge_rasters(existing_path, new_raster_path):
-                self.iface.messageBar().pushCritical("Merge Error", "Failed to merge the rasters.")
+    def flush_ui(self, force=False):
+        """Apply pending layer refreshes and show one summary message (GUI thread, at most once per interval)."""
+        if self.ui is None:
+            return
+        summary, counts, refreshes = self.ui.flush(force=force)
+        for target, (mosaic_path, dirty_bounds) in refreshes.items():
+            with self.metrics.timer('layer_swap'):
+                self.show_mosaic(target, mosaic_path, dirty_bounds)
+        if refreshes:
+            self.metrics.displayed()
+        if summary and any('failed' in event for event in counts):
+            self.iface.messageBar().pushWarning("Mosaic", summary)
+        elif summary:
+            self.iface.messageBar().pushInfo("Mosaic", summary)
+        for source in self.sources:
+            backfill = source.backfill
+            if summary and backfill is not None:
+                prefix = f"{source.name}: " if len(self.sources) > 1 else ""
+                self.iface.messageBar().pushInfo("Backfill", prefix + backfill.message())
+                if backfill.finished:
+                    self.events.write('backfill_done', source=source.name, scenes=backfill.total,
+                                      failed=backfill.failed)
+                    source.backfill = None
+
+    def start_backfill(self, source):
+        """Queue the scenes already in a source's folder for merging, oldest first (or by location).
+
+        Listing the folder and reading every header runs as a background task
+        on a thread pool; the ordered scenes then go through the batcher like
+        new ones, so they are merged in adaptive batches on all cores.
+        """
+        folder, journal, footprints = source.folder, source.journal, source.footprints
+        order = QSettings().value('example3/backfill_order', BY_TIME)
+
+        def work(task):
+            delivered = scan_folder(folder, SCENE_EXTENSIONS + ARCHIVE_EXTENSIONS, exclude=(MOSAIC_NAME,))
+            paths = [path for path in expand_archives(delivered, SCENE_EXTENSIONS)
+                     if not journal.is_done(path)]
+            if not paths:
+                return []
+            # Scene centres are compared in the CRS of the index, else of the first scene
+            header = self.datasets.header(paths[0])
+            projection = footprints.projection or (header.projection if header else None)
+
+            def read(path):
+                return None if task.isCanceled() else self.backfill_scene(path, projection)
+
+            scenes = read_parallel(paths, read, progress=task.progress)
+            return order_scenes(scenes, order)
+
+        def on_finished(scenes):
+            source.backfill_task = None
+            if scenes is None or source.batcher is None or source.journal is not journal:
+                return
+            if not scenes:
+                return
+            source.backfill = BackfillProgress([scene.path for scene in scenes])
+            self.events.write('backfill', source=source.name, scenes=len(scenes), order=order)
+            self.iface.messageBar().pushInfo(
+                "Backfill", f"Merging {len(scenes)} scenes that were already in {folder}.")
+            # Queued from a thread of its own, as adding may block while the queue is full
+            threading.Thread(target=self.queue_backfill, args=(source.batcher, scenes), daemon=True).start()
+
+        source.backfill_task = submit(MergeTask(f"Scanning scenes already in {source.name}", work, on_finished))
+
+    def queue_backfill(self, batcher, scenes):
+        """Add ordered backfill scenes to the batcher until it stops (backfill thread)."""
+        for scene in scenes:
+            if not batcher.add(scene.path, bounds=scene.bounds):
                 return
 
-            # Remove the old raster layer from QGIS
-            QgsProject.instance().removeMapLayer(existing_layer.id())
-
-        # Load the new raster layer
-        new_layer = QgsRasterLayer(new_raster_path, "New Layer")
-        if new_layer.isValid():
-            QgsProject.instance().addMapLayer(new_layer)
-            self.iface.messageBar().pushInfo("Layer Added", "New raster layer added to the project.")
-        else:
-            self.iface.messageBar().pushCritical("Layer Error", "Failed to load the new raster layer.")
+    def backfill_scene(self, path, projection):
+        """Read the acquisition time, centre and footprint of a scene for backfill ordering (any thread)."""
+        ds = gdal.Open(path)
+        if ds is None:
+            return None
+        gt = ds.GetGeoTransform()
+        bounds = (gt[0], gt[3] + ds.RasterYSize * gt[5], gt[0] + ds.RasterXSize * gt[1], gt[3])
+        min_x, min_y, max_x, max_y = transform_bounds(bounds, ds.GetProjection(), projection)
+        return BackfillScene(path, acquisition_time(ds, path), (min_x + max_x) / 2, (min_y + max_y) / 2,
+                             (min_x, min_y, max_x, max_y))
+
+    def log_error(self, message):
+        """Report an error of a watcher or batcher thread in the message log (any thread)."""
+        QgsMessageLog.logMessage(message, 'Example3')
+
+    def scene_bounds(self, source, path):
+        """Return the footprint of a scene in the CRS of its source's footprint index, or None (coalescer thread)."""
+        header = self.datasets.header(path)
+        footprints = source.footprints
+        if header is None or not header.projection or footprints is None:
+            return None
+        return transform_bounds(header_bounds(header), header.projection,
+                                footprints.projection or header.projection)
+
+    def shed_scenes(self, source, paths, reason):
+        """Journal scenes the ingest queue dropped, so they are neither merged nor backfilled (any thread)."""
+        journal, events, ui, backfill = source.journal, self.events, self.ui, source.backfill
+        if journal is not None:
+            journal.mark_many(paths, SHED)
+        self.metrics.done(paths, merged=False)
+        if backfill is not None:
+            backfill.update(paths)
+        if events is not None:
+            events.write('shed', source=source.name, files=paths, reason=reason)
+        if ui is not None:
+            ui.notify(f"scenes shed ({reason})", len(paths))
+
+    def queue_gauges(self):
+        """Return the ingest queue gauges summed over the sources, plus the merge slot gauges."""
+        stats = [source.batcher.queue.stats() for source in self.sources if source.batcher is not None]
+        gauges = {name: sum(stat[name] for stat in stats) for name in ('queue_depth', 'queue_entries', 'queue_shed')}
+        gauges['queue_oldest_age'] = max((stat['queue_oldest_age'] for stat in stats), default=0.0)
+        gauges.update(self.scheduler.stats())
+        return gauges
+
+    def flush_metrics(self):
+        """Refresh the metrics dock and rewrite the metrics file (GUI thread, on the notification timer)."""
+        if self.sources:
+            self.metrics.set_gauges(self.queue_gauges())
+        if self.metrics_dock is not None:
+            self.metrics_dock.update_rows(self.metrics.snapshot(), self.metrics.gauges())
+        if self.metrics_path:
+            try:
+                self.metrics.export(self.metrics_path, 'example3')
+            except OSError as error:
+                self.iface.messageBar().pushWarning("Metrics", f"Cannot write {self.metrics_path}: {error}")
+                self.metrics_path = None
+
+    def show_metrics(self):
+        """Show the dock with the per-stage timings of the current monitoring session."""
+        if self.metrics_dock is None:
+            self.metrics_dock = MetricsDock(self.tr(u'Example3 Pipeline Metrics'), self.iface.mainWindow())
+            self.iface.addDockWidget(Qt.BottomDockWidgetArea, self.metrics_dock)
+        self.metrics_dock.show()
+        self.metrics_dock.update_rows(self.metrics.snapshot(), self.metrics.gauges())
 
-    def merge_rasters(self, existing_raster_path, new_raster_path):
-        """Merge existing and new rasters with overlap handling."""
+    def stop_if_no_new_images(self):
+        if time.time() - self.last_image_time > 120:
+            self.iface.messageBar().pushInfo("Stop", "No new images detected for more than 2 minutes. Stopping the monitoring process.")
+            self.stop_monitoring()
+
+    def materialize_mosaic(self):
+        """Write every lazy VRT mosaic out as a physical GeoTIFF next to it, in a background task."""
+        mosaics = [target.lazy_mosaic for target in self.targets
+                   if target.lazy_mosaic is not None and target.lazy_mosaic.exists()]
+        if not mosaics:
+            self.iface.messageBar().pushWarning("Materialize", "There is no VRT mosaic to materialize.")
+            return
+        profile = QSettings().value('example3/output_profile', DEFAULT_PROFILE)
+
+        def work(task):
+            written = []
+            for mosaic in mosaics:
+                output_path = os.path.splitext(mosaic.vrt_path)[0] + '.tif'
+                vrt_ds = gdal.Open(mosaic.vrt_path)
+                options = creation_options(profile, vrt_ds.GetRasterBand(1).DataType, vrt_ds.RasterXSize,
+                                           vrt_ds.RasterYSize, vrt_ds.RasterCount)
+                vrt_ds = None
+                # The GeoTIFF lands in the watched folder, so it is staged and registered as our own
+                staging_path = self.staging.stage(output_path)
+                if not (mosaic.materialize(staging_path, options) and finalize_output(staging_path, profile)):
+                    self.staging.discard(staging_path)
+                    return None
+                self.datasets.invalidate(output_path)
+                self.staging.commit(staging_path, output_path)
+                written.append(output_path)
+            return written
+
+        def on_finished(paths):
+            if paths is not None:
+                self.iface.messageBar().pushInfo("Materialize", f"Mosaic written to {', '.join(paths)}.")
+            else:
+                self.iface.messageBar().pushCritical("Materialize", "Failed to materialize the VRT mosaic.")
+            self.materialize_task = None
+
+        self.materialize_task = submit(MergeTask("Materializing mosaic", work, on_finished))
+
+    def remerge_view(self):
+        """Recomposite the mosaic tiles under the map view from the indexed scenes there (GUI thread).
+
+        The footprint index tells which scenes lie in the view and which mosaic
+        windows they cover; only the tiles of those windows are rewritten, with
+        the session's compositing mode and the scenes in acquisition order, e.g.
+        after changing the mode or replacing scenes.
+        """
+        targets = [target for target in self.targets if target.lazy_mosaic is None and target.path]
+        if not self.sources or not targets:
+            self.iface.messageBar().pushWarning("Re-merge", "There is no monitored mosaic to re-merge.")
+            return
+        canvas = self.iface.mapCanvas()
+        extent = canvas.extent()
+        view = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+        view_crs = canvas.mapSettings().destinationCrs().toWkt()
+        jobs = [(target, [source.footprints for source in self.sources if source.target is target])
+                for target in targets]
+        scheduler, ui = self.scheduler, self.ui
+
+        def work(task):
+            remerged = []
+            for target, indexes in jobs:
+                # Takes a merge slot like any merge, and waits while the mosaic is being written
+                slot = WatchedSource(target.folder, target=target)
+                if not scheduler.acquire(slot, target):
+                    return None
+                started = time.monotonic()
+                try:
+                    with self.own_writes.writing(target.path, target.path + '.count'):
+                        count = self.remerge_region(target.path, indexes, view, view_crs, task.progress)
+                finally:
+                    scheduler.release(slot, time.monotonic() - started, target)
+                if count is None:
+                    return None
+                remerged.append((target, count))
+            return remerged
+
+        def on_finished(remerged):
+            try:
+                if remerged is None:
+                    self.iface.messageBar().pushCritical("Re-merge", "Failed to re-merge the visible area.")
+                    return
+                for target, count in remerged:
+                    if count and ui is self.ui:
+                        ui.refresh(target, target.path)
+                scenes = sum(count for _, count in remerged)
+                self.iface.messageBar().pushInfo("Re-merge", f"Re-merged the visible area from {scenes} scenes.")
+            finally:
+                self.active_tasks.discard(task)
+
+        task = submit(MergeTask("Re-merging the visible area", work, on_finished))
+        self.active_tasks.add(task)
+
+    def remerge_region(self, mosaic_path, indexes, bounds, crs, progress=None):
+        """Recomposite the tiles of a mosaic holding the indexed scenes that meet bounds (task thread).
+
+        bounds are in crs. Returns the number of scenes composited, or None
+        on failure or cancellation.
+        """
+        self.datasets.invalidate(mosaic_path)
+        self.datasets.invalidate(mosaic_path + '.count')
+        with self.metrics.timer('open'):
+            out_ds = gdal.Open(mosaic_path, gdal.GA_Update)
+        if out_ds is None:
+            return None
+        gt, projection = out_ds.GetGeoTransform(), out_ds.GetProjection()
+        # Index windows are mapped straight onto the grid, so only indexes in the mosaic's CRS are used
+        indexes = [index for index in indexes
+                   if index is not None and index.projection and same_crs(index.projection, projection)]
+        bounds = transform_bounds(bounds, crs, projection)
+        region = []
+        for index in indexes:
+            region += index.windows(gt, out_ds.RasterXSize, out_ds.RasterYSize, bounds)
+        if not region:
+            return 0
+
+        # Whole tiles are rewritten, so every scene touching them takes part, not only those in view
+        tile_size = QSettings().value('example3/merge_tile_size', 0, type=int) or None
+        memory_budget = QSettings().value('example3/merge_memory_mb', 64, type=int) * 1024 * 1024
+        # The tiles are sized for the scenes under the region
+        region_bounds = window_bounds(out_ds, union_window(region))
+        nearby = sum(len(index.query(region_bounds)) for index in indexes)
+        tiles = merge_windows(out_ds, tile_size, memory_budget, region, nearby)
+        tiles_bounds = window_bounds(out_ds, union_window(tiles))
+        scenes = sorted((scene for index in indexes for scene in index.query(tiles_bounds)),
+                        key=lambda scene: scene.acquired)
+        with self.metrics.timer('open'):
+            datasets = [self.datasets.open(scene.path) for scene in scenes]
+        if any(ds is None for ds in datasets):
+            return None
+        placements = [place_on_grid(gt, ds, projection) for ds in datasets]
+        packing = dataset_packing(out_ds)
+        packings = [packing] * len(placements) if packing is not None else None
+        count_ds = None
+        if self.composite_mode in COUNTED_MODES:
+            count_ds = gdal.Open(mosaic_path + '.count', gdal.GA_Update)
+
+        timings = {}
+        completed = stream_merge(out_ds, placements, KERNELS[self.composite_mode], tile_size=tile_size,
+                                 memory_budget=memory_budget, count_ds=count_ds, packings=packings,
+                                 progress=progress, timings=timings, windows=tiles)
+        self.metrics.observe_many(timings)
+        with self.metrics.timer('overviews'):
+            for tile in tiles:
+                update_overviews(out_ds, tile)
+        out_ds = count_ds = placements = datasets = None
+        return len(scenes) if completed else None
+
+    def merge_rasters(self, existing_raster_path, new_raster_paths, progress=None, output_path=None):
+        """Merge a batch of new rasters into the existing raster in one pass, with overlap handling.
+
+        The mosaic is written to output_path, by default the mosaic next to the
+        first new raster. `progress` is passed on to the merge engine; returns
+        False on failure or cancellation.
+        """
         # Open existing raster
-        existing_ds = gdal.Open(existing_raster_path)
-        new_ds = gdal.Open(new_raster_path)
-        if existing_ds is None or new_ds is None:
+        with self.metrics.timer('open'):
+            existing_ds = self.datasets.open(existing_raster_path)
+            new_datasets = [self.datasets.open(path) for path in new_raster_paths]
+        if existing_ds is None or any(ds is None for ds in new_datasets):
             return False
 
         # Create a virtual raster file to store the merged result
         driver = gdal.GetDriverByName('GTiff')
-        output_path = os.path.join(os.path.dirname(new_raster_path), 'merged_output.tif')
+        output_path = output_path or self.mosaic_output_path(new_raster_paths[0])
         if driver is None:
             return False
         
-        # Set up geotransform and projection based on the existing raster
-        geotransform = existing_ds.GetGeoTransform()
+        # Cover the union of all footprints on the existing raster's grid
         projection = existing_ds.GetProjection()
-        
-        # Define the output raster size (take into account the extent of both rasters)
-        x_size = max(existing_ds.RasterXSize, new_ds.RasterXSize)
-        y_size = max(existing_ds.RasterYSize, new_ds.RasterYSize)
-
-        # Create the output raster dataset
-        out_ds = driver.Create(output_path, x_size, y_size, existing_ds.RasterCount, gdalconst.GDT_Float32)
+        geotransform, x_size, y_size = union_grid(
+            [existing_ds] + [to_projection(ds, projection) for ds in new_datasets])
+        profile = QSettings().value('example3/output_profile', DEFAULT_PROFILE)
+
+        # A mosaic that already covers the new rasters and whose data type holds them is
+        # updated in place (not for COG, whose layout would not survive); only the new
+        # footprints and their overviews change
+        in_place = (os.path.abspath(existing_raster_path) == os.path.abspath(output_path)
+                    and tuple(geotransform) == tuple(existing_ds.GetGeoTransform())
+                    and (x_size, y_size) == (existing_ds.RasterXSize, existing_ds.RasterYSize)
+                    and fits_data_type(existing_ds, new_datasets))
+        if in_place and profile != COG:
+            existing_ds = new_datasets = None
+            with self.own_writes.writing(output_path, output_path + '.count'):
+                return self.update_mosaic_in_place(output_path, new_raster_paths, progress)
+
+        # Keep the narrowest type that holds every input; float inputs can optionally be
+        # packed into UInt16 with a scale/offset (an already packed mosaic keeps its own)
+        data_type = common_data_type([existing_ds] + new_datasets)
+        packing = dataset_packing(existing_ds)
+        packings = None
+        if packing is not None:
+            data_type = existing_ds.GetRasterBand(1).DataType
+            packings = [None] + [packing] * len(new_datasets)
+        elif (gdal.GetDataTypeName(data_type).startswith('Float')
+              and QSettings().value('example3/pack_float_output', False, type=bool)):
+            packing = value_packing([existing_ds] + new_datasets)
+            data_type = gdalconst.GDT_UInt16
+            packings = [packing] * (len(new_datasets) + 1)
+
+        # Create the output raster dataset with the configured tiling/compression profile in
+        # the staging folder: the existing mosaic may be one of the inputs, and it stays whole
+        # and viewable until the finished mosaic is renamed over it
+        staging_path = self.staging.stage(output_path)
+        options = creation_options(profile, data_type, x_size, y_size, existing_ds.RasterCount)
+        out_ds = driver.Create(staging_path, x_size, y_size, existing_ds.RasterCount, data_type,
+                               options=options)
         if out_ds is None:
+            self.staging.discard(staging_path)
             return False
 
         out_ds.SetGeoTransform(geotransform)
         out_ds.SetProjection(projection)
+        for i in range(1, out_ds.RasterCount + 1):
+            band = out_ds.GetRasterBand(i)
+            # Always set, so the pixels of the union no input covers are not read as data later
+            nodata = output_nodata([existing_ds] + new_datasets, i, data_type)
+            if packing is not None:
+                # The top UInt16 value is reserved for nodata by pack_values
+                band.SetScale(packing[0])
+                band.SetOffset(packing[1])
+                nodata = 65535
+            band.SetNoDataValue(nodata)
+        placements = [place_on_grid(geotransform, existing_ds)]
+        placements += [place_on_grid(geotransform, ds, projection) for ds in new_datasets]
+
+        # The running mean keeps a per-pixel scene count next to the mosaic
+        weights = count_ds = existing_count = None
+        if self.composite_mode in COUNTED_MODES:
+            existing_count = self.datasets.open(existing_raster_path + '.count')
+            if existing_count is not None and (existing_count.RasterXSize, existing_count.RasterYSize) != (
+                    existing_ds.RasterXSize, existing_ds.RasterYSize):
+                existing_count = None
+            weights = [existing_count] + [None] * len(new_datasets)
+            count_ds = driver.Create(staging_path + '.count', x_size, y_size, 1, gdalconst.GDT_UInt32,
+                                     options=creation_options(DEFLATE, gdalconst.GDT_UInt32, x_size, y_size, 1))
+            count_ds.SetGeoTransform(geotransform)
+            count_ds.SetProjection(projection)
+
+        # Merge rasters window by window, compositing overlaps with the session's mode,
+        # on a pool of worker processes (merge_workers 0 means one per CPU); merges of
+        # several sources running at once split the workers between them
+        tile_size = QSettings().value('example3/merge_tile_size', 0, type=int)
+        memory_budget = QSettings().value('example3/merge_memory_mb', 64, type=int) * 1024 * 1024
+        workers = QSettings().value('example3/merge_workers', 0, type=int) or os.cpu_count() or 1
+        workers = max(1, workers // self.scheduler.slots)
+        timings = {}
+        completed = parallel_merge(out_ds, placements, self.composite_mode, workers=workers,
+                                   tile_size=tile_size or None, memory_budget=memory_budget,
+                                   weights=weights, count_ds=count_ds, packings=packings, progress=progress,
+                                   timings=timings)
+        self.metrics.observe_many(timings)
+        out_ds = existing_ds = new_datasets = placements = weights = count_ds = existing_count = None
+        if completed:
+            with self.metrics.timer('overviews'):
+                completed = finalize_output(staging_path, profile)
+        if not completed:
+            self.staging.discard(staging_path, sidecars=('.count',))
+            return False
+        # Pooled read-only handles of the replaced mosaic must not outlive it
+        self.datasets.invalidate(output_path)
+        self.datasets.invalidate(output_path + '.count')
+        self.staging.commit(staging_path, output_path, sidecars=('.count',))
+        return True
 
-        # Merge rasters
-        for i in range(1, existing_ds.RasterCount + 1):
-            existing_band = existing_ds.GetRasterBand(i)
-            new_band = new_ds.GetRasterBand(i)
-            out_band = out_ds.GetRasterBand(i)
-
-            # Read data from both rasters
-            existing_data = existing_band.ReadAsArray()
-            new_data = new_band.ReadAsArray()
-
-            merged_data = new_data  
-            out_band.WriteArray(merged_data)
-            out_band.FlushCache()
+    def mosaic_output_path(self, new_raster_path):
+        # A scene read from an archive goes into the mosaic next to the archive
+        return os.path.join(os.path.dirname(source_file(new_raster_path)), MOSAIC_NAME)
+
+    def update_mosaic_in_place(self, output_path, new_raster_paths, progress=None):
+        """Composite new rasters into the mosaic's footprint windows and refresh the overviews above them."""
+        # Pooled read-only handles must not outlive the write
+        self.datasets.invalidate(output_path)
+        self.datasets.invalidate(output_path + '.count')
+        with self.metrics.timer('open'):
+            out_ds = gdal.Open(output_path, gdal.GA_Update)
+            new_datasets = [self.datasets.open(path) for path in new_raster_paths]
+        if out_ds is None or any(ds is None for ds in new_datasets):
+            return False
 
-        out_ds.FlushCache()
-        return True
+        placements, dirty_windows = [], []
+        for new_ds in new_datasets:
+            placement = place_on_grid(out_ds.GetGeoTransform(), new_ds, out_ds.GetProjection())
+            placed_ds, xoff, yoff = placement
+            x0, y0 = max(0, xoff), max(0, yoff)
+            x1 = min(out_ds.RasterXSize, xoff + placed_ds.RasterXSize)
+            y1 = min(out_ds.RasterYSize, yoff + placed_ds.RasterYSize)
+            if x1 > x0 and y1 > y0:
+                placements.append(placement)
+                dirty_windows.append((x0, y0, x1 - x0, y1 - y0))
+        if not placements:
+            return True
+
+        packing = dataset_packing(out_ds)
+        packings = [None] + [packing] * len(placements) if packing is not None else None
+
+        weights = count_ds = None
+        if self.composite_mode in COUNTED_MODES:
+            count_ds = gdal.Open(output_path + '.count', gdal.GA_Update)
+            weights = [count_ds] + [None] * len(placements)
+
+        # Serial on purpose: pool workers would read blocks this process is rewriting.
+        # One pass covers every tile touched by the batch; untouched tiles are skipped.
+        tile_size = QSettings().value('example3/merge_tile_size', 0, type=int)
+        memory_budget = QSettings().value('example3/merge_memory_mb', 64, type=int) * 1024 * 1024
+        timings = {}
+        completed = stream_merge(out_ds, [(out_ds, 0, 0)] + placements, KERNELS[self.composite_mode],
+                                 tile_size=tile_size or None, memory_budget=memory_budget,
+                                 weights=weights, count_ds=count_ds, region=dirty_windows,
+                                 packings=packings, progress=progress, timings=timings)
+        self.metrics.observe_many(timings)
+        with self.metrics.timer('overviews'):
+            for dirty_window in dirty_windows:
+                update_overviews(out_ds, dirty_window)
+        out_ds = new_datasets = placements = weights = count_ds = None
+        return completed
 
     class RasterFileEventHandler(FileSystemEventHandler):
-        def __init__(self, process_new_image_callback):
-            self.process_new_image_callback = process_new_image_callback
+        """Forward raster events to a WriteCoalescer so each file is merged once it is complete.
+
+        Runs on the watchdog observer thread and only records events; the
+        coalescer's own thread releases completed files to the batcher.
+
+        The first event for a file starts its detect-to-display clock in `metrics`.
+        Events for files the plugin is writing itself (the mosaic) are dropped,
+        so each external file is merged exactly once.
+        """
+
+        def __init__(self, coalescer, metrics, own_writes):
+            self.coalescer = coalescer
+            self.metrics = metrics
+            self.own_writes = own_writes
+
+        def is_raster(self, event, path):
+            return (not event.is_directory and path.lower().endswith(SCENE_EXTENSIONS + ARCHIVE_EXTENSIONS)
+                    and not self.own_writes.is_own(path))
+
+        def arrived(self, path):
+            """A new or moved-in file: also record how long the event took to arrive."""
+            try:
+                written = os.path.getmtime(path)
+            except OSError:
+                written = None
+            self.metrics.received(path, written=written)
+            self.coalescer.touch(path)
+
+        def on_created(self, event):
+            if self.is_raster(event, event.src_path):
+                self.arrived(event.src_path)
 
         def on_modified(self, event):
-            if not event.is_directory and event.src_path.lower().endswith(('.tif', '.tiff')):
-                self.process_new_image_callback(event.src_path)
+            if self.is_raster(event, event.src_path):
+                self.metrics.received(event.src_path)
+                self.coalescer.touch(event.src_path)
 
+        def on_moved(self, event):
+            if self.is_raster(event, event.dest_path):
+                self.arrived(event.dest_path)
 
+        def on_closed(self, event):
+            if self.is_raster(event, event.src_path):
+                self.coalescer.closed(event.src_path)
@@ -1,7 +1,10 @@
 from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtWidgets import QLineEdit, QPushButton, QFileDialog
+from PyQt5.QtWidgets import QLineEdit, QPushButton, QFileDialog, QComboBox, QSpinBox
 import os
 
+from .compositing import MODE_LABELS, LAST_VALID
+from .ingest_sources import COMMON_MOSAIC, PER_SOURCE_MOSAIC
+
 class Example3Dialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
         """Constructor."""
@@ -20,8 +23,14 @@ class Example3Dialog(QtWidgets.QDialog):
         
         # Directory Line Edit 1
         self.directoryLineEdit_1 = QLineEdit(Dialog)
-        self.directoryLineEdit_1.setGeometry(QtCore.QRect(20, 20, 260, 24))
+        self.directoryLineEdit_1.setGeometry(QtCore.QRect(20, 20, 200, 24))
         self.directoryLineEdit_1.setPlaceholderText("Enter directory path")
+
+        # Priority 1: the folder's share of merge time relative to the other folders
+        self.prioritySpinBox_1 = QSpinBox(Dialog)
+        self.prioritySpinBox_1.setGeometry(QtCore.QRect(225, 20, 55, 24))
+        self.prioritySpinBox_1.setRange(1, 10)
+        self.prioritySpinBox_1.setToolTip("Priority: share of merge time relative to the other folder")
         
         # Browse Button 1
         self.browseButton_1 = QPushButton(Dialog)
@@ -30,14 +39,33 @@ class Example3Dialog(QtWidgets.QDialog):
         
         # Directory Line Edit 2
         self.directoryLineEdit_2 = QLineEdit(Dialog)
-        self.directoryLineEdit_2.setGeometry(QtCore.QRect(20, 60, 260, 24))
-        self.directoryLineEdit_2.setPlaceholderText("Enter directory path")
+        self.directoryLineEdit_2.setGeometry(QtCore.QRect(20, 60, 200, 24))
+        self.directoryLineEdit_2.setPlaceholderText("Second directory path (optional)")
+
+        # Priority 2
+        self.prioritySpinBox_2 = QSpinBox(Dialog)
+        self.prioritySpinBox_2.setGeometry(QtCore.QRect(225, 60, 55, 24))
+        self.prioritySpinBox_2.setRange(1, 10)
+        self.prioritySpinBox_2.setToolTip("Priority: share of merge time relative to the other folder")
         
         # Browse Button 2
         self.browseButton_2 = QPushButton(Dialog)
         self.browseButton_2.setGeometry(QtCore.QRect(290, 60, 80, 24))
         self.browseButton_2.setText("Browse")
         
+        # Compositing mode for overlapping scenes
+        self.compositeComboBox = QComboBox(Dialog)
+        self.compositeComboBox.setGeometry(QtCore.QRect(20, 100, 260, 24))
+        for mode, label in MODE_LABELS.items():
+            self.compositeComboBox.addItem(label, mode)
+        self.compositeComboBox.setCurrentIndex(self.compositeComboBox.findData(LAST_VALID))
+
+        # One mosaic fed by every folder, or one mosaic in each folder
+        self.mosaicComboBox = QComboBox(Dialog)
+        self.mosaicComboBox.setGeometry(QtCore.QRect(20, 140, 260, 24))
+        self.mosaicComboBox.addItem("One mosaic for all folders", COMMON_MOSAIC)
+        self.mosaicComboBox.addItem("One mosaic per folder", PER_SOURCE_MOSAIC)
+
         # Submit Button
         self.submitButton = QPushButton(Dialog)
         self.submitButton.setGeometry(QtCore.QRect(290, 100, 80, 24))
@@ -61,7 +89,8 @@ class Example3Dialog(QtWidgets.QDialog):
         directory_path_2 = self.directoryLineEdit_2.text()
 
         valid_1 = os.path.isdir(directory_path_1)
-        valid_2 = os.path.isdir(directory_path_2)
+        # The second folder is optional
+        valid_2 = not directory_path_2.strip() or os.path.isdir(directory_path_2)
 
         if valid_1 and valid_2:
             self.accept()  # Close the dialog and indicate success
@@ -81,3 +110,8 @@ class Example3Dialog(QtWidgets.QDialog):
                 self.directoryLineEdit_1.setText(directory)
             elif edit_number == 2:
                 self.directoryLineEdit_2.setText(directory)
+
+    def sources(self):
+        """Return (folder, priority) for every folder entered, the first one first."""
+        rows = [(self.directoryLineEdit_1, self.prioritySpinBox_1), (self.directoryLineEdit_2, self.prioritySpinBox_2)]
+        return [(edit.text(), spin_box.value()) for edit, spin_box in rows if edit.text().strip()]
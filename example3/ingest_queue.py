@@ -0,0 +1,160 @@
+"""Bounded queue between change detection and merging, with backpressure policies.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+When scenes arrive faster than they are merged, an unbounded queue only
+turns the surplus into latency. IngestQueue holds at most max_depth entries
+and applies one of three policies:
+
+BLOCK        put() waits for room, pushing back on the watcher.
+COALESCE     a scene overlapping a queued entry joins that entry, so one
+             region is merged in one pass and takes one slot; when no entry
+             overlaps and the queue is full, put() waits.
+LATEST_WINS  a scene whose footprint covers a queued scene replaces it, and
+             when the queue is full the oldest entry is shed, so fresh
+             imagery is merged first during a surge.
+
+Entries leave in arrival order, which is also the compositing order. Shed
+scenes are reported to on_shed(paths, reason) with reason 'superseded' or
+'overflow'. Footprints are (min_x, min_y, max_x, max_y) in one CRS; scenes
+without one are only deduplicated.
+"""
+import threading
+import time
+
+BLOCK = 'block'
+COALESCE = 'coalesce'
+LATEST_WINS = 'latest_wins'
+POLICIES = (BLOCK, COALESCE, LATEST_WINS)
+
+SUPERSEDED = 'superseded'
+OVERFLOW = 'overflow'
+
+DEFAULT_MAX_DEPTH = 1024
+
+
+class QueueEntry:
+    """Scenes that leave the queue together, with their combined footprint."""
+
+    def __init__(self, path, bounds, now):
+        self.paths = [path]
+        self.bounds = bounds
+        self.queued = now
+
+
+class IngestQueue:
+    """Thread-safe bounded FIFO of scene paths; see the module docstring for the policies."""
+
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH, policy=BLOCK, on_shed=None):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown queue policy {policy!r}; expected one of {", ".join(POLICIES)}')
+        self.max_depth = max(1, max_depth)
+        self.policy = policy
+        self.on_shed = on_shed
+        self.entries = []
+        self.queued = set()
+        self.shed = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, path, bounds=None, now=None, timeout=None):
+        """Queue path; returns False if it was not queued because the queue closed or timed out.
+
+        A path that is already queued is not queued twice. Under BLOCK and
+        COALESCE this waits for room, at most timeout seconds if given.
+        """
+        now = time.monotonic() if now is None else now
+        shed = []
+        with self.condition:
+            if path in self.queued:
+                return True
+            if self.policy == LATEST_WINS and bounds is not None:
+                for entry in [e for e in self.entries if e.bounds is not None and covers(bounds, e.bounds)]:
+                    shed.append((self.remove(entry), SUPERSEDED))
+            if self.policy == COALESCE and bounds is not None:
+                entry = next((e for e in self.entries if e.bounds is not None and overlaps(bounds, e.bounds)), None)
+                if entry is not None:
+                    entry.paths.append(path)
+                    entry.bounds = union(entry.bounds, bounds)
+                    self.queued.add(path)
+                    self.condition.notify_all()
+                    return True
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while len(self.entries) >= self.max_depth and not self.closed:
+                if self.policy == LATEST_WINS:
+                    shed.append((self.remove(self.entries[0]), OVERFLOW))
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            queued = not self.closed and len(self.entries) < self.max_depth
+            if queued:
+                self.entries.append(QueueEntry(path, bounds, now))
+                self.queued.add(path)
+                self.condition.notify_all()
+        for paths, reason in shed:
+            if self.on_shed is not None:
+                self.on_shed(paths, reason)
+        return queued
+
+    def remove(self, entry):
+        self.entries.remove(entry)
+        self.queued.difference_update(entry.paths)
+        self.shed += len(entry.paths)
+        return entry.paths
+
+    def take(self, max_paths):
+        """Remove and return the paths of the oldest entries, up to max_paths (but at least one entry)."""
+        paths = []
+        with self.condition:
+            while self.entries and (not paths or len(paths) + len(self.entries[0].paths) <= max_paths):
+                entry = self.entries.pop(0)
+                paths.extend(entry.paths)
+                self.queued.difference_update(entry.paths)
+            if paths:
+                self.condition.notify_all()
+        return paths
+
+    def wait(self, timeout):
+        """Block until the queue holds a path or timeout seconds pass; True if it holds one."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.entries or self.closed, timeout) and bool(self.entries)
+
+    def close(self):
+        """Release every waiting put() and wait(); later puts are refused."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def depth(self):
+        """Number of queued paths."""
+        with self.condition:
+            return len(self.queued)
+
+    def oldest_age(self, now=None):
+        """Seconds the oldest entry has been waiting, or None when the queue is empty."""
+        now = time.monotonic() if now is None else now
+        with self.condition:
+            return now - self.entries[0].queued if self.entries else None
+
+    def stats(self, now=None):
+        """Return the gauges operators watch: depth, entries, oldest age in seconds and scenes shed so far."""
+        age = self.oldest_age(now)
+        with self.condition:
+            return {'queue_depth': len(self.queued), 'queue_entries': len(self.entries),
+                    'queue_oldest_age': age or 0.0, 'queue_shed': self.shed}
+
+
+def covers(a, b):
+    """True if box a contains box b."""
+    return a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]
+
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def union(a, b):
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
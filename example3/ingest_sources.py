@@ -0,0 +1,129 @@
+"""Watched folders and the fair sharing of merge slots between them.
+
+Every WatchedSource is one folder with its own watcher, ingest queue,
+journal and priority, and writes to a MosaicTarget: one mosaic shared by all
+sources or one per source. Merges of all sources go through one FairShare.
+A source waits for a free slot, and when several sources wait, the slot goes
+to the one that has used the least merge time for its priority, so a busy
+feed cannot starve a quieter one. Merges into one mosaic never overlap.
+"""
+import os
+import threading
+
+COMMON_MOSAIC = 'common'
+PER_SOURCE_MOSAIC = 'per_source'
+MOSAIC_MODES = (COMMON_MOSAIC, PER_SOURCE_MOSAIC)
+
+
+class MosaicTarget:
+    """A mosaic folder, the last mosaic written there and the layer showing it.
+
+    `name`, if set, tells the layers of several per-source mosaics apart.
+    """
+
+    def __init__(self, folder, lazy_mosaic=None, name=None):
+        self.folder = folder
+        self.lazy_mosaic = lazy_mosaic
+        self.name = name
+        self.path = None
+        self.layer_id = None
+
+
+class WatchedSource:
+    """A watched folder with its priority and target; the plugin attaches the ingest machinery."""
+
+    def __init__(self, folder, priority=1, target=None):
+        self.folder = folder
+        self.name = os.path.basename(os.path.normpath(folder)) or folder
+        self.priority = max(1, priority)
+        self.target = target
+        self.observer = None
+        self.coalescer = None
+        self.batcher = None
+        self.journal = None
+        self.footprints = None
+        self.backfill_task = None
+        self.backfill = None
+
+
+class FairShare:
+    """Grant `slots` concurrent merges to sources by weighted fair queuing.
+
+    Each source accrues merge seconds divided by its priority; the waiting
+    source with the least gets the next free slot. A source that was idle
+    rejoins no lower than the usage at which the latest slot was granted, so
+    it cannot claim every slot to catch up on the time it did not use. A
+    source waiting for a busy `resource` (its mosaic) is passed over until
+    that merge is done. Sources neither waiting nor merging whose usage the
+    latest grant has caught up with are forgotten, as they would rejoin at
+    that usage anyway.
+    """
+
+    def __init__(self, slots=1):
+        self.slots = max(1, slots)
+        self.condition = threading.Condition()
+        self.used = {}  # source -> merge seconds / priority
+        self.waiting = {}  # source -> resource, in arrival order
+        self.busy = []  # resources of the running merges
+        self.running = []  # sources of the running merges
+        self.active = 0
+        self.virtual_time = 0.0  # usage of the source granted last
+        self.closed = False
+
+    def acquire(self, source, resource=None, timeout=None):
+        """Wait for a slot; returns False if the share was closed or timeout seconds passed."""
+        with self.condition:
+            if self.closed:
+                return False
+            self.used[source] = max(self.used.get(source, 0.0), self.virtual_time)
+            self.waiting[source] = resource
+            try:
+                granted = self.condition.wait_for(lambda: self.closed or self.next_source() is source, timeout)
+                if not granted or self.closed:
+                    return False
+                self.active += 1
+                self.busy.append(resource)
+                self.running.append(source)
+                self.virtual_time = self.used[source]
+                return True
+            finally:
+                del self.waiting[source]
+                self.condition.notify_all()
+
+    def release(self, source, seconds, resource=None):
+        """Return the slot of a merge of source that took seconds."""
+        with self.condition:
+            self.used[source] = self.used.get(source, 0.0) + seconds / max(1, source.priority)
+            self.active -= 1
+            self.busy.remove(resource)
+            self.running.remove(source)
+            for idle in [idle for idle, used in self.used.items() if used <= self.virtual_time
+                         and idle not in self.waiting and idle not in self.running]:
+                del self.used[idle]
+            self.condition.notify_all()
+
+    def next_source(self):
+        if self.active >= self.slots:
+            return None
+        eligible = [source for source, resource in self.waiting.items()
+                    if resource is None or resource not in self.busy]
+        # min() keeps the first of equals, i.e. the source that has waited longest
+        return min(eligible, key=lambda source: self.used[source], default=None)
+
+    def close(self):
+        """Release every waiting acquire(); later ones fail."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {'merge_slots_busy': self.active, 'sources_waiting': len(self.waiting)}
+
+
+def parse_source(text):
+    """Split 'folder' or 'folder=priority' (an extra_sources setting entry) into (folder, priority)."""
+    folder, separator, priority = text.rpartition('=')
+    if separator and priority.strip().isdigit():
+        return folder.strip(), int(priority)
+    return text.strip(), 1
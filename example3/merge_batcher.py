@@ -0,0 +1,99 @@
+"""Group completed files into batches that are merged in a single pass."""
+import threading
+import time
+
+
+class MergeBatcher:
+    """Collect ready files and hand them to `callback` as one list per merge pass.
+
+    A batch is dispatched once its oldest file has waited `max_wait` seconds
+    or `batch_size` files are queued (or the queue is full). After each pass the batch size is set
+    from the measured seconds per file so a pass takes about `target_seconds`;
+    when more files arrived during a pass than it merged, the size at least
+    doubles so a backlog is drained instead of growing.
+
+    Files wait in `queue`, an IngestQueue whose bound and policy decide what
+    happens when they arrive faster than they are merged. A pass whose
+    callback raises is reported through log(message) and not used to size
+    the next batch.
+    """
+
+    def __init__(self, callback, queue, max_wait=5.0, batch_size=8, min_batch=1, max_batch=256,
+                 target_seconds=30.0, log=print):
+        self.callback = callback
+        self.log = log
+        self.queue = queue
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_seconds = target_seconds
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        # Releases an add() blocked on a full queue
+        self.queue.close()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def add(self, path, now=None, bounds=None):
+        """Queue a completed file with its footprint, if known; a file already waiting is not queued twice.
+
+        May block while the queue is full, depending on its policy; returns
+        False if the file was not queued because the batcher stopped.
+        """
+        queued = self.queue.put(path, bounds, now)
+        if self.queue.depth() >= self.full_size():
+            self.wakeup.set()
+        return queued
+
+    def backlog(self):
+        return self.queue.depth()
+
+    def next_batch(self, now=None):
+        """Return the files of the next batch if one is due, else an empty list."""
+        age = self.queue.oldest_age(now)
+        if age is None:
+            return []
+        if self.queue.depth() < self.full_size() and age < self.max_wait:
+            return []
+        return self.queue.take(self.batch_size)
+
+    def full_size(self):
+        """Files that make a batch due at once; a queue bounded below batch_size is due when full."""
+        return min(self.batch_size, self.queue.max_depth)
+
+    def record(self, count, seconds):
+        """Adapt the batch size to a pass that merged `count` files in `seconds`."""
+        size = self.batch_size
+        if count and seconds > 0:
+            size = int(self.target_seconds * count / seconds)
+        if self.backlog() > count:
+            size = max(size, 2 * count)
+        self.batch_size = max(self.min_batch, min(self.max_batch, size))
+
+    def run(self):
+        while self.running:
+            self.wakeup.wait(min(1.0, self.max_wait))
+            self.wakeup.clear()
+            batch = self.next_batch()
+            while batch and self.running:
+                started = time.monotonic()
+                try:
+                    self.callback(batch)
+                except Exception as e:
+                    # A failed pass must not stop the thread merging later batches
+                    self.log(f"Error merging a batch of {len(batch)} files: {e}")
+                else:
+                    self.record(len(batch), time.monotonic() - started)
+                batch = self.next_batch()
@@ -0,0 +1,37 @@
+"""Dockable panel showing the pipeline stage timings.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+"""
+from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtWidgets import QDockWidget, QTableWidget, QTableWidgetItem
+
+from .pipeline_metrics import COLUMNS
+
+
+class MetricsDock(QDockWidget):
+    """Table of count, total, mean, p50, p95 and max seconds per pipeline stage."""
+
+    def __init__(self, title, parent=None):
+        super().__init__(title, parent)
+        self.setObjectName(title.replace(' ', ''))
+        self.table = QTableWidget(0, len(COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(
+            [column if column in ('stage', 'count') else f'{column} (s)' for column in COLUMNS])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.setWidget(self.table)
+
+    def update_rows(self, rows, gauges=()):
+        """Show a PipelineMetrics.snapshot() and gauges(); does nothing while the dock is hidden."""
+        if not self.isVisible():
+            return
+        cells_per_row = [[stage, str(count)] + [f'{value:.3f}' for value in values] for stage, count, *values in rows]
+        cells_per_row += [[name, f'{value:g}'] + [''] * (len(COLUMNS) - 2) for name, value in gauges]
+        self.table.setRowCount(len(cells_per_row))
+        for row, cells in enumerate(cells_per_row):
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
@@ -0,0 +1,104 @@
+"""Rate-limited user notifications and layer refreshes, plus a structured event log.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+Under burst ingest, a message and a canvas repaint per merged batch would
+flood the Qt event loop. UiThrottle counts events and keeps the latest
+refresh per layer, and the plugin's GUI timer turns them into at most one
+summary ("37 scenes merged in the last 5 s") and one repaint per interval.
+Full detail goes to an EventLog of JSON lines instead.
+"""
+import json
+import threading
+import time
+
+DEFAULT_INTERVAL = 5.0
+
+
+class UiThrottle:
+    """Collect notifications and layer refreshes and release them at most once per interval.
+
+    notify() and refresh() may be called from any thread; flush() is meant
+    for the GUI thread.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counts = {}  # event -> occurrences since the last flush, in first-seen order
+        self.refreshes = {}  # layer key -> (path, changed bounds or None for everything)
+        self.started = None
+        self.last_flush = None
+
+    def notify(self, event, count=1, now=None):
+        """Count occurrences of an event such as 'scenes merged'; returns True if a flush is due."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.started is None:
+                self.started = now
+            self.counts[event] = self.counts.get(event, 0) + count
+            return self.is_due(now)
+
+    def refresh(self, key, path, bounds=None, now=None):
+        """Ask for the layer `key` to show path; repeated requests merge their bounds."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            previous = self.refreshes.get(key)
+            if previous is not None and previous[0] == path:
+                bounds = merge_bounds(previous[1], bounds)
+            self.refreshes[key] = (path, bounds)
+            return self.is_due(now)
+
+    def is_due(self, now):
+        return self.last_flush is None or now - self.last_flush >= self.interval
+
+    def flush(self, now=None, force=False):
+        """Return (summary, counts, refreshes) gathered since the last flush.
+
+        Returns (None, {}, {}) when nothing is pending or, unless force is
+        set, when the last flush was less than an interval ago.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if not (self.counts or self.refreshes) or not (force or self.is_due(now)):
+                return None, {}, {}
+            counts, refreshes = self.counts, self.refreshes
+            seconds = max(1, int(round(now - (self.started if self.started is not None else now))))
+            self.counts, self.refreshes = {}, {}
+            self.started = None
+            self.last_flush = now
+        summary = None
+        if counts:
+            summary = ', '.join(f'{count} {event}' for event, count in counts.items())
+            summary += f' in the last {seconds} s'
+        return summary, counts, refreshes
+
+
+def merge_bounds(a, b):
+    """Union of two (min_x, min_y, max_x, max_y) boxes; None (unknown extent) absorbs everything."""
+    if a is None or b is None:
+        return None
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+class EventLog:
+    """Append-only JSON-lines log with one record per event."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.handle = open(path, 'a', encoding='utf-8')
+
+    def write(self, event, **fields):
+        record = json.dumps(dict(time=time.time(), event=event, **fields), default=str)
+        with self.lock:
+            if self.handle is not None:
+                self.handle.write(record + '\n')
+                self.handle.flush()
+
+    def close(self):
+        with self.lock:
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
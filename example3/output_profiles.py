@@ -0,0 +1,177 @@
+"""GeoTIFF creation profiles for the merged mosaic outputs.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical.
+
+A profile is a set of GTiff creation options plus whether internal overviews
+are built and whether the file is rewritten in Cloud-Optimized GeoTIFF
+layout. Predictors and BIGTIFF are picked from the data type and size.
+After an in-place update only the overview pixels under the changed window
+are recomputed (update_overviews).
+"""
+import os
+
+import numpy as np
+from osgeo import gdal, gdal_array
+
+PLAIN = 'plain'
+DEFLATE = 'deflate'
+ZSTD = 'zstd'
+LERC = 'lerc'
+COG = 'cog'
+
+DEFAULT_PROFILE = DEFLATE
+BLOCK_SIZE = 512
+# Overviews stop once the smallest level fits in one block
+OVERVIEW_MIN_SIZE = 256
+OVERVIEW_RESAMPLING = 'AVERAGE'
+# Overview rows recomputed per read in update_overviews, in source pixels
+OVERVIEW_CHUNK_PIXELS = 16 * 1024 * 1024
+# Classic TIFF offsets are 32-bit; leave headroom for overviews and metadata
+BIGTIFF_THRESHOLD = 3 * 1024 ** 3
+
+PROFILES = {
+    # Striped and uncompressed, as the plugins wrote before profiles existed
+    PLAIN: {'options': [], 'overviews': False, 'cog': False},
+    DEFLATE: {'options': ['COMPRESS=DEFLATE', 'ZLEVEL=6'], 'overviews': True, 'cog': False},
+    ZSTD: {'options': ['COMPRESS=ZSTD', 'ZSTD_LEVEL=9'], 'overviews': True, 'cog': False},
+    # MAX_Z_ERROR=0 keeps LERC lossless
+    LERC: {'options': ['COMPRESS=LERC_ZSTD', 'MAX_Z_ERROR=0'], 'overviews': True, 'cog': False},
+    COG: {'options': ['COMPRESS=DEFLATE', 'ZLEVEL=6'], 'overviews': True, 'cog': True},
+}
+
+
+def predictor(data_type):
+    """Horizontal differencing for integers, floating point predictor for floats."""
+    if data_type in (gdal.GDT_Float32, gdal.GDT_Float64):
+        return '3'
+    return '2'
+
+
+def creation_options(profile, data_type, x_size, y_size, band_count):
+    """Return the GTiff creation options of a profile for a raster of the given shape."""
+    settings = PROFILES.get(profile, PROFILES[DEFAULT_PROFILE])
+    options = list(settings['options'])
+    if profile != PLAIN:
+        options += ['TILED=YES', f'BLOCKXSIZE={BLOCK_SIZE}', f'BLOCKYSIZE={BLOCK_SIZE}']
+        if any(option.startswith(('COMPRESS=DEFLATE', 'COMPRESS=ZSTD')) for option in options):
+            options.append(f'PREDICTOR={predictor(data_type)}')
+    if band_count > 1:
+        options.append('INTERLEAVE=PIXEL')
+
+    estimated_bytes = x_size * y_size * band_count * gdal.GetDataTypeSize(data_type) // 8
+    options.append('BIGTIFF=YES' if estimated_bytes > BIGTIFF_THRESHOLD else 'BIGTIFF=IF_SAFER')
+    return options
+
+
+def overview_levels(x_size, y_size):
+    """Return the power-of-two overview factors down to OVERVIEW_MIN_SIZE."""
+    levels = []
+    factor = 2
+    while max(x_size, y_size) // factor >= OVERVIEW_MIN_SIZE:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+def finalize_output(path, profile):
+    """Build internal overviews and, for the COG profile, rewrite in COG layout.
+
+    Called once the merge has closed its handle on path.
+    """
+    settings = PROFILES.get(profile, PROFILES[DEFAULT_PROFILE])
+    if not settings['overviews']:
+        return True
+
+    ds = gdal.Open(path, gdal.GA_Update)
+    if ds is None:
+        return False
+    compress = [option.split('=', 1)[1] for option in settings['options'] if option.startswith('COMPRESS=')]
+    # Thread-local, so merges finalizing in parallel don't see each other's setting
+    if compress:
+        gdal.SetThreadLocalConfigOption('COMPRESS_OVERVIEW', compress[0])
+    try:
+        levels = overview_levels(ds.RasterXSize, ds.RasterYSize)
+        if levels:
+            ds.BuildOverviews(OVERVIEW_RESAMPLING, levels)
+        ds = None
+    finally:
+        gdal.SetThreadLocalConfigOption('COMPRESS_OVERVIEW', None)
+
+    if settings['cog']:
+        return to_cog(path, compress[0] if compress else 'DEFLATE')
+    return True
+
+
+def to_cog(path, compress):
+    """Rewrite a GeoTIFF with embedded overviews in Cloud-Optimized layout."""
+    staging_path = path + '.cog.part'
+    cog_options = [f'COMPRESS={compress}', 'PREDICTOR=YES', f'BLOCKSIZE={BLOCK_SIZE}',
+                   'OVERVIEWS=FORCE_USE_EXISTING', 'BIGTIFF=IF_SAFER']
+    out_ds = gdal.Translate(staging_path, path, format='COG', creationOptions=cog_options)
+    if out_ds is None:
+        return False
+    out_ds = None
+    os.replace(staging_path, path)
+    return True
+
+
+def update_overviews(ds, window):
+    """Recompute the overview pixels under a changed full-resolution window.
+
+    Each level is rebuilt from the level above it with a nodata-aware mean
+    (matching OVERVIEW_RESAMPLING), so the work at every level is proportional
+    to the window rather than to the whole mosaic. Returns the number of
+    overview levels touched.
+    """
+    levels = 0
+    for i in range(1, ds.RasterCount + 1):
+        band = ds.GetRasterBand(i)
+        nodata = band.GetNoDataValue()
+        parent, parent_window = band, window
+        for level in range(band.GetOverviewCount()):
+            overview = band.GetOverview(level)
+            parent_window = update_overview_window(parent, overview, parent_window, nodata)
+            parent = overview
+            levels = max(levels, level + 1)
+    ds.FlushCache()
+    return levels
+
+
+def update_overview_window(parent, overview, window, nodata):
+    """Recompute `overview` under `window` of `parent`; return the overview window."""
+    x_factor = max(1, int(round(parent.XSize / overview.XSize)))
+    y_factor = max(1, int(round(parent.YSize / overview.YSize)))
+    xoff, yoff, xsize, ysize = window
+    x0, y0 = xoff // x_factor, yoff // y_factor
+    x1 = min(overview.XSize, -(-(xoff + xsize) // x_factor))
+    y1 = min(overview.YSize, -(-(yoff + ysize) // y_factor))
+    dtype = gdal_array.GDALTypeCodeToNumericTypeCode(overview.DataType)
+
+    rows_per_chunk = max(1, OVERVIEW_CHUNK_PIXELS // max(1, (x1 - x0) * x_factor * y_factor))
+    for row in range(y0, y1, rows_per_chunk):
+        rows = min(rows_per_chunk, y1 - row)
+        src_x0, src_y0 = x0 * x_factor, row * y_factor
+        src_w = min(parent.XSize, x1 * x_factor) - src_x0
+        src_h = min(parent.YSize, (row + rows) * y_factor) - src_y0
+        data = parent.ReadAsArray(src_x0, src_y0, src_w, src_h)
+        overview.WriteArray(downsample(data, rows, x1 - x0, y_factor, x_factor, nodata, dtype), x0, row)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def downsample(data, height, width, y_factor, x_factor, nodata, dtype):
+    """Average y_factor by x_factor cells of data into a height by width array, skipping nodata."""
+    valid = np.ones(data.shape, dtype=bool) if nodata is None else data != nodata
+    if np.issubdtype(data.dtype, np.floating):
+        valid &= ~np.isnan(data)
+    values = np.zeros((height * y_factor, width * x_factor), dtype=np.float64)
+    mask = np.zeros(values.shape, dtype=bool)
+    values[:data.shape[0], :data.shape[1]] = np.where(valid, data, 0)
+    mask[:data.shape[0], :data.shape[1]] = valid
+
+    sums = values.reshape(height, y_factor, width, x_factor).sum(axis=(1, 3))
+    counts = mask.reshape(height, y_factor, width, x_factor).sum(axis=(1, 3))
+    result = np.where(counts > 0, sums / np.maximum(counts, 1), 0 if nodata is None else nodata)
+    if np.issubdtype(dtype, np.integer):
+        result = np.rint(result)
+    return result.astype(dtype)
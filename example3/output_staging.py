@@ -0,0 +1,52 @@
+"""Write outputs in a staging folder and rename them into place once complete.
+
+The staging folder is a hidden subfolder of the output's folder: it is on
+the same file system, so the final os.replace is atomic, and the
+non-recursive folder observer never sees the partial files. The rename
+itself is registered with an OwnWrites registry so the event it raises in
+the watched folder is not ingested as a new scene.
+"""
+import os
+import shutil
+import tempfile
+
+
+class OutputStaging:
+    """Hand out staging paths for outputs and commit them over the final path."""
+
+    def __init__(self, own_writes, folder_name='.staging'):
+        self.own_writes = own_writes
+        self.folder_name = folder_name
+
+    def stage(self, final_path):
+        """Return a fresh staging path for final_path, with the same extension."""
+        folder = os.path.join(os.path.dirname(os.path.abspath(final_path)), self.folder_name)
+        os.makedirs(folder, exist_ok=True)
+        handle, staging_path = tempfile.mkstemp(suffix='-' + os.path.basename(final_path), dir=folder)
+        os.close(handle)
+        return staging_path
+
+    def commit(self, staging_path, final_path, sidecars=()):
+        """Rename staging_path (and staging_path + suffix for each sidecar suffix) over final_path.
+
+        The main file goes last, so whoever sees the new output also finds
+        its sidecars.
+        """
+        pairs = [(staging_path + suffix, final_path + suffix) for suffix in sidecars
+                 if os.path.exists(staging_path + suffix)]
+        pairs.append((staging_path, final_path))
+        with self.own_writes.writing(*[final for _, final in pairs]):
+            for staged, final in pairs:
+                os.replace(staged, final)
+
+    def discard(self, staging_path, sidecars=()):
+        """Remove a staged output that will not be committed."""
+        for path in [staging_path] + [staging_path + suffix for suffix in sidecars]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clean(self, output_folder):
+        """Remove whatever an interrupted session left in the staging folder of output_folder."""
+        shutil.rmtree(os.path.join(output_folder, self.folder_name), ignore_errors=True)
@@ -0,0 +1,464 @@
+"""Pixel-window arithmetic and windowed compositing for mosaic outputs.
+
+This module is shared by the example2 and example3 plugins; keep both
+copies identical. All helpers assume north-up geotransforms (no rotation
+terms).
+"""
+import time
+
+import numpy as np
+from osgeo import gdal, gdal_array
+
+# Upper bound on the NumPy working set of one streaming merge window, in bytes
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+# Float64 arrays of one window the mean kernels and value packing create besides the source reads
+KERNEL_TEMPORARIES = 6
+# Bytes per pixel of the validity masks and scene counts of one window
+MASK_BYTES = 10
+# Fraction of a pixel below which two grids are considered aligned
+ALIGN_TOLERANCE = 1e-6
+
+
+def dataset_bounds(ds):
+    """Return (min_x, min_y, max_x, max_y) of a dataset in georeferenced units."""
+    gt = ds.GetGeoTransform()
+    x0, x1 = gt[0], gt[0] + ds.RasterXSize * gt[1]
+    y0, y1 = gt[3], gt[3] + ds.RasterYSize * gt[5]
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def projected_bounds(ds, projection):
+    """Return the bounds of ds in projection: those of the grid GDAL would warp it onto."""
+    return dataset_bounds(to_projection(ds, projection))
+
+
+def footprint_window(out_ds, src_ds):
+    """Return the (xoff, yoff, xsize, ysize) window of out_ds covered by src_ds.
+
+    A src_ds in another CRS is windowed by its footprint in the CRS of out_ds.
+    The window is clipped to out_ds; None is returned when they do not overlap.
+    """
+    gt = out_ds.GetGeoTransform()
+    min_x, min_y, max_x, max_y = projected_bounds(src_ds, out_ds.GetProjection())
+    cols = sorted(((min_x - gt[0]) / gt[1], (max_x - gt[0]) / gt[1]))
+    rows = sorted(((min_y - gt[3]) / gt[5], (max_y - gt[3]) / gt[5]))
+
+    xoff = max(0, int(np.floor(cols[0])))
+    yoff = max(0, int(np.floor(rows[0])))
+    xend = min(out_ds.RasterXSize, int(np.ceil(cols[1])))
+    yend = min(out_ds.RasterYSize, int(np.ceil(rows[1])))
+    if xend <= xoff or yend <= yoff:
+        return None
+    return xoff, yoff, xend - xoff, yend - yoff
+
+
+def contains(out_ds, src_ds):
+    """True if the footprint of src_ds, in the CRS of out_ds, lies entirely inside out_ds."""
+    out_bounds = dataset_bounds(out_ds)
+    src_bounds = projected_bounds(src_ds, out_ds.GetProjection())
+    return (out_bounds[0] <= src_bounds[0] and out_bounds[1] <= src_bounds[1]
+            and src_bounds[2] <= out_bounds[2] and src_bounds[3] <= out_bounds[3])
+
+
+def window_bounds(out_ds, window):
+    """Return the georeferenced (min_x, min_y, max_x, max_y) of a pixel window."""
+    gt = out_ds.GetGeoTransform()
+    xoff, yoff, xsize, ysize = window
+    x0, x1 = gt[0] + xoff * gt[1], gt[0] + (xoff + xsize) * gt[1]
+    y0, y1 = gt[3] + yoff * gt[5], gt[3] + (yoff + ysize) * gt[5]
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def update_window(out_ds, src_ds, window, resample_alg='near', timings=None):
+    """Resample src_ds onto `window` of out_ds and paste its valid pixels in place.
+
+    Only the blocks intersecting the window are read and rewritten; pixels the
+    source does not cover (outside its footprint or nodata) keep their value.
+    `timings`, if given, accumulates seconds per stage as in stream_merge;
+    the warp counts as reading.
+    """
+    timings = {} if timings is None else timings
+    xoff, yoff, xsize, ysize = window
+    started = time.perf_counter()
+    warped = gdal.Warp('', src_ds, format='MEM',
+                       outputBounds=window_bounds(out_ds, window),
+                       width=xsize, height=ysize,
+                       dstSRS=out_ds.GetProjection() or None,
+                       resampleAlg=resample_alg, dstAlpha=True)
+    if warped is None:
+        return False
+
+    alpha_index = warped.RasterCount
+    valid = warped.GetRasterBand(alpha_index).ReadAsArray() > 0
+    for i in range(1, min(out_ds.RasterCount, alpha_index - 1) + 1):
+        out_band = out_ds.GetRasterBand(i)
+        existing = out_band.ReadAsArray(xoff, yoff, xsize, ysize)
+        new = warped.GetRasterBand(i).ReadAsArray()
+        read = time.perf_counter()
+        merged = np.where(valid, new, existing).astype(existing.dtype, copy=False)
+        composited = time.perf_counter()
+        out_band.WriteArray(merged, xoff, yoff)
+        add_timing(timings, 'read', read - started)
+        add_timing(timings, 'composite', composited - read)
+        started = time.perf_counter()
+        add_timing(timings, 'write', started - composited)
+
+    warped = None
+    return True
+
+
+def common_data_type(datasets):
+    """Return the narrowest GDAL data type holding every band and nodata value of datasets.
+
+    Equal input types are kept as they are; mixed inputs are promoted with
+    NumPy's rules (e.g. Byte + UInt16 -> UInt16, UInt16 + Int16 -> Int32).
+    """
+    dtype = None
+    for ds in datasets:
+        for i in range(1, ds.RasterCount + 1):
+            band = ds.GetRasterBand(i)
+            band_dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType))
+            nodata = band.GetNoDataValue()
+            if nodata is not None and not np.isnan(nodata) and not can_hold(band_dtype, nodata):
+                nodata = int(nodata) if float(nodata).is_integer() else nodata
+                band_dtype = np.promote_types(band_dtype, np.min_scalar_type(nodata))
+            dtype = band_dtype if dtype is None else np.promote_types(dtype, band_dtype)
+    if dtype is None:
+        return gdal.GDT_Float32
+    if dtype.kind == 'f' and dtype.itemsize < 4:
+        dtype = np.dtype(np.float32)
+    return gdal_array.NumericTypeCodeToGDALTypeCode(dtype.type) or gdal.GDT_Float64
+
+
+def fits_data_type(out_ds, datasets):
+    """True if every band and nodata value of datasets fits the data type of out_ds unchanged.
+
+    Writing a wider type in place would wrap or truncate values, so a mosaic
+    that does not fit must be rebuilt with common_data_type. A packed mosaic
+    always fits: new values are quantized into it by pack_values.
+    """
+    if dataset_packing(out_ds) is not None:
+        return True
+    return common_data_type([out_ds] + list(datasets)) == out_ds.GetRasterBand(1).DataType
+
+
+def output_nodata(datasets, band_index, data_type):
+    """Return the nodata value for band band_index of a mosaic of datasets in the GDAL data_type.
+
+    This is the first nodata value the inputs declare for that band, else a
+    value reserved to mark the pixels no input covers: the top value of an
+    integer type (which pack_values also leaves free) or NaN. Without one,
+    later merges would read the fill of those pixels as valid zeros.
+    """
+    for ds in datasets:
+        if band_index <= ds.RasterCount:
+            nodata = ds.GetRasterBand(band_index).GetNoDataValue()
+            if nodata is not None:
+                return nodata
+    dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(data_type))
+    if dtype.kind == 'f':
+        return float('nan')
+    return float(np.iinfo(dtype).max)
+
+
+def can_hold(dtype, value):
+    """True if value is exactly representable in the NumPy dtype."""
+    if dtype.kind == 'f':
+        return True
+    info = np.iinfo(dtype)
+    return float(value).is_integer() and info.min <= value <= info.max
+
+
+def value_packing(datasets, dtype=np.uint16):
+    """Return the (scale, offset) packing the value range of datasets into dtype.
+
+    The range comes from approximate band statistics; the top value of dtype
+    is kept for nodata, and later values outside the range are clipped.
+    """
+    low, high = np.inf, -np.inf
+    for ds in datasets:
+        for i in range(1, ds.RasterCount + 1):
+            band_min, band_max = ds.GetRasterBand(i).ComputeRasterMinMax(True)
+            low, high = min(low, band_min), max(high, band_max)
+    steps = np.iinfo(dtype).max - 1
+    scale = (high - low) / steps if high > low else 1.0
+    return scale, low
+
+
+def dataset_packing(ds):
+    """Return the (scale, offset) of a packed integer dataset, or None if it is not packed."""
+    band = ds.GetRasterBand(1)
+    scale, offset = band.GetScale(), band.GetOffset()
+    if np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)).kind == 'f':
+        return None
+    if scale in (None, 1.0) and offset in (None, 0.0):
+        return None
+    return scale, offset
+
+
+def to_projection(ds, projection):
+    """Return ds, or a lazily reprojected VRT of it when it uses another CRS."""
+    source = ds.GetProjection()
+    if not projection or not source or source == projection:
+        return ds
+    return gdal.Warp('', ds, format='VRT', dstSRS=projection)
+
+
+def union_grid(datasets):
+    """Return (geotransform, xsize, ysize) of the grid covering every dataset.
+
+    The grid keeps the resolution and pixel alignment of the first dataset, so
+    that dataset (usually the existing mosaic) can be copied without resampling.
+    """
+    gt = datasets[0].GetGeoTransform()
+    bounds = [dataset_bounds(ds) for ds in datasets]
+    min_x = min(b[0] for b in bounds)
+    min_y = min(b[1] for b in bounds)
+    max_x = max(b[2] for b in bounds)
+    max_y = max(b[3] for b in bounds)
+
+    col = int(np.floor((min_x - gt[0]) / gt[1] + ALIGN_TOLERANCE))
+    row = int(np.floor((max_y - gt[3]) / gt[5] + ALIGN_TOLERANCE))
+    origin_x, origin_y = gt[0] + col * gt[1], gt[3] + row * gt[5]
+    xsize = int(np.ceil((max_x - origin_x) / gt[1] - ALIGN_TOLERANCE))
+    ysize = int(np.ceil((min_y - origin_y) / gt[5] - ALIGN_TOLERANCE))
+    return (origin_x, gt[1], 0.0, origin_y, 0.0, gt[5]), xsize, ysize
+
+
+def is_aligned(gt, ds):
+    """True if ds has the pixel size of grid gt and its origin is on a whole pixel of it."""
+    src = ds.GetGeoTransform()
+    if src[2] or src[4] or not np.isclose(src[1], gt[1]) or not np.isclose(src[5], gt[5]):
+        return False
+    col = (src[0] - gt[0]) / gt[1]
+    row = (src[3] - gt[3]) / gt[5]
+    return abs(col - round(col)) < ALIGN_TOLERANCE and abs(row - round(row)) < ALIGN_TOLERANCE
+
+
+def place_on_grid(gt, ds, projection=None, resample_alg='near'):
+    """Return a (dataset, xoff, yoff) placement of ds on the grid gt for stream_merge.
+
+    Aligned datasets are placed as they are and copied block for block; any
+    other dataset, including one in a CRS other than `projection`, is wrapped
+    in a lazily warped VRT snapped to the grid.
+    """
+    reprojected = to_projection(ds, projection)
+    src = ds.GetGeoTransform()
+    if reprojected is ds and is_aligned(gt, ds):
+        return ds, int(round((src[0] - gt[0]) / gt[1])), int(round((src[3] - gt[3]) / gt[5]))
+
+    min_x, min_y, max_x, max_y = dataset_bounds(reprojected)
+    col0 = int(np.floor((min_x - gt[0]) / gt[1] + ALIGN_TOLERANCE))
+    col1 = int(np.ceil((max_x - gt[0]) / gt[1] - ALIGN_TOLERANCE))
+    row0 = int(np.floor((max_y - gt[3]) / gt[5] + ALIGN_TOLERANCE))
+    row1 = int(np.ceil((min_y - gt[3]) / gt[5] - ALIGN_TOLERANCE))
+    bounds = (gt[0] + col0 * gt[1], gt[3] + row1 * gt[5], gt[0] + col1 * gt[1], gt[3] + row0 * gt[5])
+    # Warp from the original dataset so the VRT only references files on disk
+    warped = gdal.Warp('', ds, format='VRT', outputBounds=bounds, width=col1 - col0, height=row1 - row0,
+                       dstSRS=projection if reprojected is not ds else None, resampleAlg=resample_alg)
+    return warped, col0, row0
+
+
+def block_windows(xsize, ysize, block_x, block_y):
+    """Yield (xoff, yoff, xsize, ysize) windows tiling an xsize by ysize grid."""
+    for yoff in range(0, ysize, block_y):
+        for xoff in range(0, xsize, block_x):
+            yield xoff, yoff, min(block_x, xsize - xoff), min(block_y, ysize - yoff)
+
+
+def window_shape(ds, tile_size=None, memory_budget=DEFAULT_MEMORY_BUDGET, sources=1):
+    """Return the (width, height) of the windows a streaming merge of `sources` inputs uses on ds.
+
+    Defaults to the natural block size of the first band, stacking whole block
+    rows (useful for one-line strips) while the window stays in memory_budget.
+    An explicit tile_size is used as given, only shrunk to fit the budget.
+
+    The budget covers the band tiles of ds, one float64 window per source
+    read and per kernel temporary, and the masks and scene counts.
+    """
+    band = ds.GetRasterBand(1)
+    tile_bytes = ds.RasterCount * max(1, gdal.GetDataTypeSize(band.DataType) // 8)
+    bytes_per_pixel = tile_bytes + (sources + KERNEL_TEMPORARIES) * 8 + MASK_BYTES
+    max_pixels = max(1, memory_budget // bytes_per_pixel)
+
+    if tile_size:
+        width, height = tile_size, tile_size
+    else:
+        width, height = band.GetBlockSize()
+        rows = (max_pixels // max(1, width)) // height * height
+        height = max(height, min(rows, ds.RasterYSize))
+
+    width = min(width, ds.RasterXSize, max_pixels)
+    height = max(1, min(height, ds.RasterYSize, max_pixels // width))
+    return width, height
+
+
+def read_valid(band, xoff, yoff, xsize, ysize):
+    """Return the validity mask of a band window from its nodata/mask/alpha band."""
+    if band.GetMaskFlags() & gdal.GMF_ALL_VALID:
+        return np.ones((ysize, xsize), dtype=bool)
+    return band.GetMaskBand().ReadAsArray(xoff, yoff, xsize, ysize) > 0
+
+
+def band_specs(out_ds):
+    """Return the (NumPy dtype, nodata) of every band of out_ds."""
+    specs = []
+    for i in range(1, out_ds.RasterCount + 1):
+        band = out_ds.GetRasterBand(i)
+        specs.append((gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType), band.GetNoDataValue()))
+    return specs
+
+
+def pack_values(data, packing, dtype):
+    """Quantize source values to a packed integer type: round((value - offset) / scale).
+
+    The top value of the type is left free for nodata.
+    """
+    scale, offset = packing
+    info = np.iinfo(dtype)
+    return np.clip(np.rint((data - offset) / scale), info.min, info.max - 1).astype(dtype)
+
+
+def composite_window(placements, weights, specs, window, kernel, packings=None, timings=None):
+    """Composite every band of one output window.
+
+    `packings` optionally gives, per placement, the (scale, offset) used to
+    pack that source's values into the integer output type (None leaves the
+    values as they are, e.g. for an already packed mosaic). `timings`, if
+    given, is a dict to which the seconds spent reading sources and running
+    the kernel are added under 'read' and 'composite'.
+
+    Returns (tiles, count): one array per band and the per-pixel scene count
+    of the first band.
+    """
+    xoff, yoff, xsize, ysize = window
+    packings = packings or [None] * len(placements)
+    tiles, first_count = [], None
+    for i, (dtype, nodata) in enumerate(specs, start=1):
+        tile = np.full((ysize, xsize), 0 if nodata is None else nodata, dtype=dtype)
+        valid = np.zeros((ysize, xsize), dtype=bool)
+        count = np.zeros((ysize, xsize), dtype=np.uint32)
+
+        for (src_ds, src_x, src_y), weight_ds, packing in zip(placements, weights, packings):
+            if i > src_ds.RasterCount:
+                continue
+            x0, y0 = max(xoff, src_x), max(yoff, src_y)
+            x1 = min(xoff + xsize, src_x + src_ds.RasterXSize)
+            y1 = min(yoff + ysize, src_y + src_ds.RasterYSize)
+            if x1 <= x0 or y1 <= y0:
+                continue
+
+            src_window = (x0 - src_x, y0 - src_y, x1 - x0, y1 - y0)
+            started = time.perf_counter()
+            src_band = src_ds.GetRasterBand(i)
+            data = src_band.ReadAsArray(*src_window)
+            data_valid = read_valid(src_band, *src_window)
+            weight = 1 if weight_ds is None else weight_ds.GetRasterBand(1).ReadAsArray(*src_window)
+            read = time.perf_counter()
+
+            if packing is not None:
+                data = pack_values(data, packing, dtype)
+            region = (slice(y0 - yoff, y1 - yoff), slice(x0 - xoff, x1 - xoff))
+            kernel(tile[region], valid[region], count[region], data, data_valid, weight)
+            valid[region] |= data_valid
+            if timings is not None:
+                add_timing(timings, 'read', read - started)
+                add_timing(timings, 'composite', time.perf_counter() - read)
+
+        tiles.append(tile)
+        if first_count is None:
+            first_count = count
+    return tiles, first_count
+
+
+def add_timing(timings, stage, seconds):
+    timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def write_window(out_ds, window, tiles, count=None, count_ds=None):
+    """Write composited band tiles (and optionally the scene count) at window."""
+    xoff, yoff = window[0], window[1]
+    for i, tile in enumerate(tiles, start=1):
+        out_ds.GetRasterBand(i).WriteArray(tile, xoff, yoff)
+    if count_ds is not None and count is not None:
+        count_ds.GetRasterBand(1).WriteArray(count, xoff, yoff)
+
+
+def merge_windows(out_ds, tile_size=None, memory_budget=DEFAULT_MEMORY_BUDGET, region=None, sources=1):
+    """Return the list of windows a merge of `sources` inputs into out_ds works through.
+
+    `region` optionally restricts the merge to an (xoff, yoff, xsize, ysize)
+    window of out_ds, e.g. the footprint of a scene being pasted in place, or
+    to a list of such windows, e.g. the footprints of a batch of scenes: then
+    only the windows touching at least one of them are returned.
+    """
+    width, height = window_shape(out_ds, tile_size, memory_budget, sources)
+    regions = region if isinstance(region, list) else [region] if region else []
+    if not regions:
+        return list(block_windows(out_ds.RasterXSize, out_ds.RasterYSize, width, height))
+    xoff, yoff, xsize, ysize = union_window(regions)
+    windows = [(xoff + x, yoff + y, w, h) for x, y, w, h in block_windows(xsize, ysize, width, height)]
+    return [window for window in windows if any(windows_overlap(window, r) for r in regions)]
+
+
+def union_window(windows):
+    """Return the (xoff, yoff, xsize, ysize) window covering every window of a list."""
+    x0, y0 = min(w[0] for w in windows), min(w[1] for w in windows)
+    x1, y1 = max(w[0] + w[2] for w in windows), max(w[1] + w[3] for w in windows)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def windows_overlap(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def stream_merge(out_ds, placements, kernel, tile_size=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                 weights=None, count_ds=None, region=None, packings=None, progress=None, timings=None,
+                 windows=None):
+    """Composite placed sources into out_ds one window at a time.
+
+    `placements` is a list of (dataset, xoff, yoff) giving the out_ds pixel
+    that each source's pixel (0, 0) lands on, in compositing order. `kernel` is
+    one of the compositing kernels and is applied per band with that band's
+    validity mask. Only one window is held in memory, so peak memory depends
+    on memory_budget and not on the raster dimensions. Use place_on_grid to
+    build placements for georeferenced sources.
+
+    `weights` optionally gives, per placement, a count dataset on the same grid
+    as that source telling how many scenes each pixel stands for (None means
+    one). When count_ds is given the per-pixel scene count of the first band
+    is written to it.
+
+    out_ds may itself be the first placement to update a mosaic in place:
+    every window is read before it is written, so pass the changed `region`
+    (or regions) to leave the rest of the mosaic untouched. `packings` is passed on to
+    composite_window. A caller that must know the rewritten windows up front
+    (e.g. to pick the sources touching them) passes the merge_windows result
+    as `windows` instead; it is merged as it is.
+
+    `progress`, if given, is called as progress(windows_done, windows_total)
+    after every window; returning False cancels the merge. Returns False if
+    the merge was cancelled, True otherwise.
+
+    `timings`, if given, is a dict that accumulates the seconds spent in the
+    'read', 'composite' and 'write' stages of the merge.
+    """
+    weights = weights or [None] * len(placements)
+    specs = band_specs(out_ds)
+    if windows is None:
+        windows = merge_windows(out_ds, tile_size, memory_budget, region, len(placements))
+    completed = True
+    for done, window in enumerate(windows, start=1):
+        tiles, count = composite_window(placements, weights, specs, window, kernel, packings, timings)
+        started = time.perf_counter()
+        write_window(out_ds, window, tiles, count, count_ds)
+        if timings is not None:
+            add_timing(timings, 'write', time.perf_counter() - started)
+        if progress is not None and not progress(done, len(windows)):
+            completed = False
+            break
+    started = time.perf_counter()
+    out_ds.FlushCache()
+    if timings is not None:
+        add_timing(timings, 'write', time.perf_counter() - started)
+    return completed
@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Archive delivery test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from archives import archive_members, expand_archives, is_archive, source_file
+from ingest_journal import IngestJournal, MERGED
+
+
+class ArchivesTest(unittest.TestCase):
+    """Test listing and addressing scenes inside ZIP and TAR deliveries."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.folder, 'delivery.zip')
+        with zipfile.ZipFile(self.zip_path, 'w') as archive:
+            archive.writestr('scene/B04.tif', b'red')
+            archive.writestr('scene/B03.TIF', b'green')
+            archive.writestr('scene/metadata.xml', b'<xml/>')
+            archive.writestr('__MACOSX/scene/._B04.tif', b'fork')
+            archive.writestr('.hidden.tif', b'hidden')
+        self.tar_path = os.path.join(self.folder, 'delivery.tar.gz')
+        with tarfile.open(self.tar_path, 'w:gz') as archive:
+            info = tarfile.TarInfo('B02.tif')
+            info.size = 4
+            archive.addfile(info, io.BytesIO(b'blue'))
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def test_members_are_virtual_paths(self):
+        """Matching members are named by their GDAL virtual path; hidden files are skipped."""
+        self.assertEqual(archive_members(self.zip_path, ('.tif', '.tiff')), [
+            '/vsizip/' + self.zip_path + '/scene/B03.TIF',
+            '/vsizip/' + self.zip_path + '/scene/B04.tif'])
+        self.assertEqual(archive_members(self.tar_path, ('.tif',)), ['/vsitar/' + self.tar_path + '/B02.tif'])
+
+    def test_unreadable_archive_has_no_members(self):
+        """An archive still being written is skipped until it can be read."""
+        partial = os.path.join(self.folder, 'partial.zip')
+        with open(partial, 'wb') as handle:
+            handle.write(b'PK\x03\x04')
+        self.assertEqual(archive_members(partial, ('.tif',)), [])
+
+    def test_expand_and_source_file(self):
+        """Archives are replaced by their members, which map back to the archive."""
+        plain = os.path.join(self.folder, 'scene.tif')
+        paths = expand_archives([plain, self.tar_path], ('.tif',))
+        self.assertEqual(paths, [plain, '/vsitar/' + self.tar_path + '/B02.tif'])
+        self.assertTrue(is_archive(self.tar_path))
+        self.assertFalse(is_archive(plain))
+        self.assertEqual(source_file(paths[1]), self.tar_path)
+        self.assertEqual(source_file(plain), plain)
+
+    def test_journal_versions_members_by_archive(self):
+        """A member stays done until its archive is replaced."""
+        journal = IngestJournal(os.path.join(self.folder, 'journal.sqlite'), source_file=source_file)
+        member = archive_members(self.zip_path, ('.tif',))[0]
+        journal.mark(member, MERGED)
+        self.assertTrue(journal.is_done(member))
+        os.utime(self.zip_path, ns=(10 ** 18, 10 ** 18))
+        self.assertFalse(journal.is_done(member))
+        journal.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ArchivesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
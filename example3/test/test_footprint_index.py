@@ -0,0 +1,175 @@
+# coding=utf-8
+"""Footprint index test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal, osr
+
+from compositing import KERNELS, LAST_VALID
+from footprint_index import FootprintIndex, grid_window, same_crs, union_bounds
+from raster_merge import footprint_window, place_on_grid, stream_merge, update_window
+
+
+def make_scene(origin_x, origin_y, size, epsg=32633):
+    ds = gdal.GetDriverByName('MEM').Create('', size, size, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform((origin_x, 10.0, 0, origin_y, 0, -10.0))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    ds.SetProjection(srs.ExportToWkt())
+    ds.SetMetadataItem('TIFFTAG_DATETIME', '2024:08:01 10:00:00')
+    return ds
+
+
+def filled_scene(origin_x, origin_y, size, value, acquired):
+    ds = make_scene(origin_x, origin_y, size)
+    ds.SetMetadataItem('TIFFTAG_DATETIME', acquired)
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(0)
+    band.Fill(value)
+    return ds
+
+
+class FootprintIndexTest(unittest.TestCase):
+    """Test the spatial index of scene footprints."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.index = FootprintIndex(os.path.join(self.folder, 'footprints.sqlite'))
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.index.close()
+        shutil.rmtree(self.folder)
+
+    def test_query_returns_intersecting_scenes(self):
+        """Only scenes whose footprint meets the window are returned."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        self.index.add('b.tif', make_scene(502000, 5000000, 100))
+        hits = self.index.query((500500, 4999500, 500600, 4999600))
+        self.assertEqual([scene.path for scene in hits], ['a.tif'])
+        self.assertEqual(len(self.index.query((499000, 4998000, 503000, 5001000))), 2)
+
+    def test_touching_edges_do_not_intersect(self):
+        """Exact bounds are re-checked after the R-tree's rounded boxes."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        self.assertEqual(self.index.query((501000, 4999000, 501500, 5000000)), [])
+
+    def test_reindexing_replaces_the_footprint(self):
+        """Adding a path again moves its footprint instead of duplicating it."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        self.index.add('a.tif', make_scene(600000, 5000000, 100))
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.get('a.tif').min_x, 600000)
+        self.assertEqual(self.index.query((500000, 4999000, 501000, 5000000)), [])
+
+    def test_other_crs_is_reprojected(self):
+        """Scenes in another CRS are indexed in the CRS of the first scene."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        self.index.add('b.tif', make_scene(200000, 5000000, 100, epsg=32634))
+        scene = self.index.query((-1e9, -1e9, 1e9, 1e9))[-1]
+        self.assertEqual(scene.crs, make_scene(0, 0, 1, epsg=32634).GetProjection())
+        self.assertGreater(scene.min_x, 550000)
+
+    def test_windows_on_grid(self):
+        """Scene footprints map to clipped pixel windows of a grid."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        gt = (499500.0, 10.0, 0, 5000500.0, 0, -10.0)
+        self.assertEqual(self.index.windows(gt, 120, 120), [(50, 50, 70, 70)])
+
+    def test_windows_of_scenes_in_bounds(self):
+        """Only the scenes meeting the bounds give a window, and windows are clipped to the grid."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        self.index.add('b.tif', make_scene(502000, 5000000, 100))
+        gt = (499500.0, 10.0, 0, 5000500.0, 0, -10.0)
+        self.assertEqual(self.index.windows(gt, 300, 120, (502100, 4999500, 502200, 4999600)), [(250, 50, 50, 70)])
+        self.assertIsNone(grid_window(gt, 300, 120, (400000, 4000000, 400100, 4000100)))
+
+    def test_query_by_arrival(self):
+        """With by_arrival, a re-indexed scene comes last whatever its acquisition time."""
+        self.index.add('a.tif', make_scene(500000, 5000000, 100))
+        self.index.add('b.tif', make_scene(500000, 5000000, 100))
+        old = make_scene(500000, 5000000, 100)
+        old.SetMetadataItem('TIFFTAG_DATETIME', '2020:01:01 00:00:00')
+        self.index.add('a.tif', old)
+        bounds = (500000, 4999000, 501000, 5000000)
+        self.assertEqual([scene.path for scene in self.index.query(bounds)], ['a.tif', 'b.tif'])
+        self.assertEqual([scene.path for scene in self.index.query(bounds, by_arrival=True)], ['b.tif', 'a.tif'])
+
+    def test_remerge_redelivered_scene_over_same_batch_scene(self):
+        """Re-merging a re-delivered scene's old area keeps the scenes of its own batch, in arrival order."""
+        scenes = {
+            'base.tif': filled_scene(500000, 5000000, 100, 1, '2024:08:01 10:00:00'),
+            'b.tif': filled_scene(500000, 5000000, 60, 2, '2024:08:01 10:00:00'),
+        }
+        out_ds = gdal.GetDriverByName('MEM').Create('', 100, 100, 1, gdal.GDT_Byte)
+        out_ds.SetGeoTransform(scenes['base.tif'].GetGeoTransform())
+        out_ds.SetProjection(scenes['base.tif'].GetProjection())
+        out_ds.GetRasterBand(1).SetNoDataValue(0)
+        gt, projection = out_ds.GetGeoTransform(), out_ds.GetProjection()
+        stream_merge(out_ds, [place_on_grid(gt, ds, projection) for ds in scenes.values()], KERNELS[LAST_VALID])
+        for path, ds in scenes.items():
+            self.index.add(path, ds)
+
+        # One batch: a newer scene, then a smaller, older re-delivery of b.tif overlapping it
+        batch = [('a.tif', filled_scene(500300, 4999700, 50, 3, '2024:08:05 10:00:00')),
+                 ('b.tif', filled_scene(500000, 5000000, 40, 4, '2024:07:01 10:00:00'))]
+        redelivered = []
+        for path, ds in batch:
+            self.assertTrue(update_window(out_ds, ds, footprint_window(out_ds, ds)))
+            previous = self.index.get(path)
+            if previous is not None:
+                redelivered.append(previous)
+            scenes[path] = ds
+            self.index.add(path, ds)
+
+        old = redelivered[0]
+        region = [grid_window(gt, 100, 100, (old.min_x, old.min_y, old.max_x, old.max_y))]
+        indexed = self.index.query((old.min_x, old.min_y, old.max_x, old.max_y), by_arrival=True)
+        self.assertEqual([scene.path for scene in indexed], ['base.tif', 'a.tif', 'b.tif'])
+        placements = [place_on_grid(gt, scenes[scene.path], projection) for scene in indexed]
+        stream_merge(out_ds, placements, KERNELS[LAST_VALID], region=region)
+
+        data = out_ds.GetRasterBand(1).ReadAsArray()
+        self.assertEqual(data[5, 50], 1)  # only the old b.tif covered it
+        self.assertEqual(data[50, 50], 3)  # a.tif, from the same batch, survives
+        self.assertEqual(data[35, 35], 4)  # the re-delivery was drawn after a.tif
+        self.assertEqual(data[5, 5], 4)
+        self.assertFalse(np.any(data == 2))
+
+    def test_same_crs(self):
+        """Equivalent WKT strings and unknown CRSs count as the same CRS."""
+        utm33 = make_scene(0, 0, 1).GetProjection()
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(utm33)
+        self.assertTrue(same_crs(utm33, srs.ExportToPrettyWkt()))
+        self.assertTrue(same_crs(utm33, ''))
+        self.assertFalse(same_crs(utm33, make_scene(0, 0, 1, epsg=32634).GetProjection()))
+
+    def test_union_bounds(self):
+        """Footprints are merged after reprojection into the target CRS."""
+        crs = make_scene(0, 0, 1).GetProjection()
+        footprints = [((0, 0, 10, 10), crs), ((5, -5, 20, 8), crs)]
+        self.assertEqual(union_bounds(footprints, crs), (0, -5, 20, 10))
+        self.assertIsNone(union_bounds([], crs))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FootprintIndexTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Ingest journal test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ingest_journal import IngestJournal, SEEN, MERGED, FAILED
+
+
+class IngestJournalTest(unittest.TestCase):
+    """Test the on-disk ingestion journal."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.folder, 'journal.sqlite')
+        self.scene = os.path.join(self.folder, 'scene.tif')
+        self.write(b'scene')
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def write(self, data, mtime_ns=None):
+        with open(self.scene, 'wb') as handle:
+            handle.write(data)
+        if mtime_ns is not None:
+            os.utime(self.scene, ns=(mtime_ns, mtime_ns))
+
+    def test_state_survives_reopen(self):
+        """States written by one journal are visible after reopening it."""
+        journal = IngestJournal(self.db_path)
+        self.assertIsNone(journal.state(self.scene))
+        journal.mark(self.scene, SEEN)
+        self.assertFalse(journal.is_done(self.scene))
+        journal.mark(self.scene, MERGED)
+        journal.close()
+
+        journal = IngestJournal(self.db_path)
+        self.assertEqual(journal.state(self.scene), MERGED)
+        self.assertTrue(journal.is_done(self.scene))
+        journal.close()
+
+    def test_changed_file_is_unknown(self):
+        """A file rewritten after it was recorded must be ingested again."""
+        journal = IngestJournal(self.db_path)
+        journal.mark(self.scene, FAILED)
+        self.write(b'new scene', mtime_ns=10 ** 18)
+        self.assertIsNone(journal.state(self.scene))
+        journal.close()
+
+    def test_content_hash_matches_touched_file(self):
+        """With hashing enabled, identical contents keep their state."""
+        journal = IngestJournal(self.db_path, hash_contents=True)
+        journal.mark(self.scene, MERGED)
+        self.write(b'scene', mtime_ns=10 ** 18)
+        self.assertEqual(journal.state(self.scene), MERGED)
+        journal.close()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(IngestJournalTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
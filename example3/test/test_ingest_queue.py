@@ -0,0 +1,92 @@
+# coding=utf-8
+"""Ingest queue test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import threading
+import unittest
+
+from ingest_queue import BLOCK, COALESCE, LATEST_WINS, OVERFLOW, SUPERSEDED, IngestQueue
+
+
+class IngestQueueTest(unittest.TestCase):
+    """Test the bound and the backpressure policies of the ingest queue."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.shed = []
+
+    def make_queue(self, policy, max_depth=3):
+        return IngestQueue(max_depth, policy, on_shed=lambda paths, reason: self.shed.append((paths, reason)))
+
+    def test_fifo_and_depth_metrics(self):
+        """Paths leave in arrival order; depth and age describe what is waiting."""
+        queue = self.make_queue(BLOCK)
+        self.assertIsNone(queue.oldest_age(now=0.0))
+        queue.put('a.tif', now=1.0)
+        queue.put('b.tif', now=2.0)
+        queue.put('a.tif', now=3.0)
+        self.assertEqual(queue.depth(), 2)
+        self.assertEqual(queue.oldest_age(now=5.0), 4.0)
+        self.assertEqual(queue.stats(now=5.0)['queue_oldest_age'], 4.0)
+        self.assertEqual(queue.take(8), ['a.tif', 'b.tif'])
+        self.assertEqual(queue.depth(), 0)
+
+    def test_block_waits_for_room(self):
+        """A put on a full queue waits until a take makes room, or gives up on close."""
+        queue = self.make_queue(BLOCK, max_depth=1)
+        queue.put('a.tif')
+        self.assertFalse(queue.put('b.tif', timeout=0.01))
+        putter = threading.Thread(target=queue.put, args=('b.tif',))
+        putter.start()
+        self.assertEqual(queue.take(1), ['a.tif'])
+        putter.join(1.0)
+        self.assertEqual(queue.take(1), ['b.tif'])
+        queue.put('c.tif')
+        queue.close()
+        self.assertFalse(queue.put('d.tif'))
+        self.assertEqual(self.shed, [])
+
+    def test_coalesce_groups_overlapping_scenes(self):
+        """Overlapping scenes share one entry and leave together; disjoint ones queue on their own."""
+        queue = self.make_queue(COALESCE, max_depth=2)
+        queue.put('a.tif', (0, 0, 10, 10))
+        queue.put('b.tif', (100, 0, 110, 10))
+        queue.put('c.tif', (5, 5, 15, 15))
+        queue.put('d.tif', (14, 14, 20, 20))
+        self.assertEqual(queue.depth(), 4)
+        self.assertFalse(queue.put('e.tif', (500, 500, 510, 510), timeout=0.01))
+        self.assertEqual(queue.take(1), ['a.tif', 'c.tif', 'd.tif'])
+        self.assertEqual(queue.take(8), ['b.tif'])
+
+    def test_latest_wins_sheds_superseded_scenes(self):
+        """A scene covering queued scenes replaces them and a full queue sheds its oldest entry."""
+        queue = self.make_queue(LATEST_WINS, max_depth=2)
+        queue.put('a.tif', (0, 0, 10, 10))
+        queue.put('b.tif', (20, 0, 30, 10))
+        queue.put('c.tif', (-1, -1, 11, 11))
+        self.assertEqual(self.shed, [(['a.tif'], SUPERSEDED)])
+        queue.put('d.tif', (50, 0, 60, 10))
+        self.assertEqual(self.shed[-1], (['b.tif'], OVERFLOW))
+        self.assertEqual(queue.take(8), ['c.tif', 'd.tif'])
+        self.assertEqual(queue.stats()['queue_shed'], 2)
+
+    def test_unknown_policy(self):
+        """A misspelt policy is refused."""
+        with self.assertRaises(ValueError):
+            IngestQueue(policy='newest')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(IngestQueueTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
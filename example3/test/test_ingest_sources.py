@@ -0,0 +1,118 @@
+# coding=utf-8
+"""Ingest sources test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import threading
+import time
+import unittest
+
+from ingest_sources import FairShare, WatchedSource, parse_source
+
+
+class FairShareTest(unittest.TestCase):
+    """Test that merge slots are shared between sources by priority."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.share = FairShare(slots=1)
+        self.granted = []
+
+    def wait_for_waiting(self, count):
+        deadline = time.monotonic() + 2.0
+        while self.share.stats()['sources_waiting'] < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def acquire_in_thread(self, source, resource=None):
+        def acquire():
+            if self.share.acquire(source, resource):
+                self.granted.append(source.name)
+                self.share.release(source, 0.0, resource)
+            else:
+                self.granted.append(f'{source.name} refused')
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        return thread
+
+    def test_least_used_for_priority_goes_first(self):
+        """A source with three times the priority gets the slot after the same merge time."""
+        low, high, holder = WatchedSource('/data/low', 1), WatchedSource('/data/high', 3), WatchedSource('/data/c')
+        for source in (low, high):
+            self.assertTrue(self.share.acquire(source))
+            self.share.release(source, 3.0)
+        self.assertTrue(self.share.acquire(holder))
+        threads = [self.acquire_in_thread(low)]
+        self.wait_for_waiting(1)
+        threads.append(self.acquire_in_thread(high))
+        self.wait_for_waiting(2)
+        self.share.release(holder, 0.0)
+        for thread in threads:
+            thread.join(2.0)
+        self.assertEqual(self.granted, ['high', 'low'])
+
+    def test_idle_source_rejoins_at_current_usage(self):
+        """A source that has not merged yet starts at the usage of the latest grant, not at zero."""
+        busy, new = WatchedSource('/data/busy'), WatchedSource('/data/new')
+        for _ in range(2):
+            self.assertTrue(self.share.acquire(busy))
+            self.share.release(busy, 5.0)
+        self.assertTrue(self.share.acquire(new))
+        self.assertEqual(self.share.used[new], 5.0)
+        self.share.release(new, 5.0)
+        self.assertEqual(self.share.used, {busy: 10.0, new: 10.0})
+
+    def test_caught_up_sources_are_forgotten(self):
+        """A finished source whose usage the latest grant reached is dropped; it would rejoin there anyway."""
+        first, second = WatchedSource('/data/a'), WatchedSource('/data/b')
+        self.assertTrue(self.share.acquire(first))
+        self.share.release(first, 1.0)
+        self.assertTrue(self.share.acquire(second))
+        self.share.release(second, 2.0)
+        self.assertTrue(self.share.acquire(first))
+        self.share.release(first, 0.0)
+        self.assertEqual(self.share.used, {second: 2.0})
+
+    def test_merges_into_one_mosaic_never_overlap(self):
+        """With free slots, a source still waits while another merges into its mosaic."""
+        share = FairShare(slots=2)
+        first, second, other = WatchedSource('/data/a'), WatchedSource('/data/b'), WatchedSource('/data/c')
+        self.assertTrue(share.acquire(first, 'mosaic'))
+        self.assertFalse(share.acquire(second, 'mosaic', timeout=0.05))
+        self.assertTrue(share.acquire(other, 'other mosaic', timeout=0.05))
+        self.assertEqual(share.stats(), {'merge_slots_busy': 2, 'sources_waiting': 0})
+        share.release(first, 1.0, 'mosaic')
+        share.release(other, 1.0, 'other mosaic')
+        self.assertTrue(share.acquire(second, 'mosaic', timeout=0.05))
+
+    def test_close_releases_waiting_sources(self):
+        """Closing refuses the waiting and later acquires."""
+        holder, waiting = WatchedSource('/data/a'), WatchedSource('/data/b')
+        self.assertTrue(self.share.acquire(holder))
+        thread = self.acquire_in_thread(waiting)
+        self.wait_for_waiting(1)
+        self.share.close()
+        thread.join(2.0)
+        self.assertEqual(self.granted, ['b refused'])
+        self.assertFalse(self.share.acquire(holder))
+
+    def test_parse_source(self):
+        """Extra sources are 'folder' or 'folder=priority'."""
+        self.assertEqual(parse_source('/data/drones = 3'), ('/data/drones', 3))
+        self.assertEqual(parse_source('/data/a=b'), ('/data/a=b', 1))
+        self.assertEqual(WatchedSource('/data/satellite/').name, 'satellite')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FairShareTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,93 @@
+# coding=utf-8
+"""Merge batcher test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import time
+import unittest
+
+from ingest_queue import IngestQueue
+from merge_batcher import MergeBatcher
+
+
+class MergeBatcherTest(unittest.TestCase):
+    """Test that ready files are grouped into adaptive batches."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.batches = []
+        self.batcher = MergeBatcher(self.batches.append, IngestQueue(), max_wait=5.0, batch_size=4, max_batch=64,
+                                    target_seconds=10.0)
+
+    def test_batch_waits_for_window(self):
+        """A partial batch is held until its oldest file has waited max_wait."""
+        self.batcher.add('a.tif', now=0.0)
+        self.batcher.add('b.tif', now=1.0)
+        self.assertEqual(self.batcher.next_batch(now=4.0), [])
+        self.assertEqual(self.batcher.next_batch(now=5.0), ['a.tif', 'b.tif'])
+
+    def test_full_batch_goes_out_at_once(self):
+        """A batch is dispatched as soon as batch_size files are queued."""
+        for i in range(6):
+            self.batcher.add(f'{i}.tif', now=0.0)
+        self.assertEqual(self.batcher.next_batch(now=0.0), ['0.tif', '1.tif', '2.tif', '3.tif'])
+        self.assertEqual(self.batcher.backlog(), 2)
+
+    def test_duplicates_are_queued_once(self):
+        """A file released twice while waiting is merged once."""
+        self.batcher.add('a.tif', now=0.0)
+        self.batcher.add('a.tif', now=1.0)
+        self.assertEqual(self.batcher.next_batch(now=10.0), ['a.tif'])
+
+    def test_batch_size_follows_merge_rate(self):
+        """The next batch is sized so one pass takes about target_seconds."""
+        self.batcher.record(4, 2.0)
+        self.assertEqual(self.batcher.batch_size, 20)
+        self.batcher.record(20, 100.0)
+        self.assertEqual(self.batcher.batch_size, 2)
+
+    def test_backlog_grows_batch_size(self):
+        """A backlog larger than the last batch at least doubles the batch size."""
+        for i in range(30):
+            self.batcher.add(f'{i}.tif', now=0.0)
+        self.batcher.record(4, 40.0)
+        self.assertEqual(self.batcher.batch_size, 8)
+
+
+    def test_failing_callback_does_not_stop_thread(self):
+        """A pass that raises is logged and the next batch is still merged."""
+        def callback(batch):
+            if 'bad.tif' in batch:
+                raise RuntimeError('merge failed')
+            self.batches.append(batch)
+
+        errors = []
+        batcher = MergeBatcher(callback, IngestQueue(), max_wait=0.05, batch_size=1, log=errors.append)
+        batcher.start()
+        try:
+            batcher.add('bad.tif')
+            batcher.add('good.tif')
+            deadline = time.monotonic() + 5.0
+            while not self.batches and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(batcher.thread.is_alive())
+        finally:
+            batcher.stop()
+        self.assertEqual(self.batches, [['good.tif']])
+        self.assertEqual(len(errors), 1)
+        self.assertIn('merge failed', errors[0])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(MergeBatcherTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
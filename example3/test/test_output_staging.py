@@ -0,0 +1,74 @@
+# coding=utf-8
+"""Output staging test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from output_staging import OutputStaging
+from write_coalescer import OwnWrites
+
+
+class OutputStagingTest(unittest.TestCase):
+    """Test that outputs only appear in the watched folder once complete."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.final_path = os.path.join(self.folder, 'merged_output.tif')
+        self.own_writes = OwnWrites()
+        self.staging = OutputStaging(self.own_writes, '.staging')
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def write(self, path, text):
+        with open(path, 'w') as handle:
+            handle.write(text)
+
+    def test_commit_replaces_output_with_sidecars(self):
+        """The staged file and its sidecars replace the output in one rename each."""
+        self.write(self.final_path, 'old')
+        staging_path = self.staging.stage(self.final_path)
+        self.assertEqual(os.path.dirname(staging_path), os.path.join(self.folder, '.staging'))
+        self.assertTrue(staging_path.endswith('merged_output.tif'))
+        self.write(staging_path, 'new')
+        self.write(staging_path + '.count', 'counts')
+        self.staging.commit(staging_path, self.final_path, sidecars=('.count', '.missing'))
+
+        with open(self.final_path) as handle:
+            self.assertEqual(handle.read(), 'new')
+        self.assertTrue(os.path.exists(self.final_path + '.count'))
+        self.assertFalse(os.path.exists(staging_path))
+        # The rename's file system events must not look like a new scene
+        self.assertTrue(self.own_writes.is_own(self.final_path))
+
+    def test_discard_and_clean(self):
+        """Failed outputs and leftovers of an interrupted session are removed."""
+        first = self.staging.stage(self.final_path)
+        second = self.staging.stage(self.final_path)
+        self.assertNotEqual(first, second)
+        self.staging.discard(first, sidecars=('.count',))
+        self.assertFalse(os.path.exists(first))
+        self.staging.clean(self.folder)
+        self.assertEqual(os.listdir(self.folder), [])
+        self.assertFalse(os.path.exists(self.final_path))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(OutputStagingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
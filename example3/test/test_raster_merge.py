@@ -0,0 +1,230 @@
+# coding=utf-8
+"""Raster merge helpers test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import tracemalloc
+import unittest
+
+import numpy as np
+from osgeo import gdal, osr
+
+from compositing import first_valid, last_valid, mean
+from raster_merge import (
+    contains, footprint_window, update_window, window_shape, stream_merge,
+    union_grid, place_on_grid, common_data_type, fits_data_type, value_packing, merge_windows, output_nodata)
+
+
+def make_raster(origin_x, origin_y, xsize, ysize, value, pixel_size=1.0, data_type=gdal.GDT_Byte):
+    ds = gdal.GetDriverByName('MEM').Create('', xsize, ysize, 1, data_type)
+    ds.SetGeoTransform((origin_x, pixel_size, 0, origin_y, 0, -pixel_size))
+    ds.GetRasterBand(1).Fill(value)
+    return ds
+
+
+class RasterMergeTest(unittest.TestCase):
+    """Test incremental mosaic updates."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.mosaic = make_raster(0, 100, 100, 100, 1)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.mosaic = None
+
+    def test_footprint_window(self):
+        """The window of a scene is its pixel footprint in the mosaic."""
+        scene = make_raster(10, 80, 20, 30, 9)
+        self.assertTrue(contains(self.mosaic, scene))
+        self.assertEqual(footprint_window(self.mosaic, scene), (10, 20, 20, 30))
+
+    def test_footprint_window_outside(self):
+        """Scenes that miss the mosaic have no window."""
+        scene = make_raster(500, 500, 10, 10, 9)
+        self.assertFalse(contains(self.mosaic, scene))
+        self.assertIsNone(footprint_window(self.mosaic, scene))
+
+    def test_footprint_window_in_mosaic_crs(self):
+        """A scene in a neighbouring UTM zone is windowed by its footprint in the mosaic's zone."""
+        utm33, utm34 = osr.SpatialReference(), osr.SpatialReference()
+        for srs, epsg in ((utm33, 32633), (utm34, 32634)):
+            srs.ImportFromEPSG(epsg)
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        mosaic = make_raster(200000, 5200000, 700, 400, 1, pixel_size=1000.0)
+        mosaic.SetProjection(utm33.ExportToWkt())
+        # Near 18 degrees east: x 250 km in zone 34 is about 740 km in zone 33
+        scene = make_raster(250000, 5000000, 20, 20, 9, pixel_size=1000.0)
+        scene.SetProjection(utm34.ExportToWkt())
+        x, y, _ = osr.CoordinateTransformation(utm34, utm33).TransformPoint(250000, 5000000)
+
+        self.assertTrue(contains(mosaic, scene))
+        xoff, yoff, xsize, ysize = footprint_window(mosaic, scene)
+        self.assertAlmostEqual(xoff, (x - 200000) / 1000, delta=2)
+        self.assertAlmostEqual(yoff, (5200000 - y) / 1000, delta=2)
+        self.assertTrue(update_window(mosaic, scene, (xoff, yoff, xsize, ysize)))
+        data = mosaic.GetRasterBand(1).ReadAsArray(xoff, yoff, xsize, ysize)
+        self.assertGreater(int((data == 9).sum()), 0.8 * 20 * 20)
+
+    def test_update_window_only_touches_footprint(self):
+        """Pixels outside the new scene keep their previous value."""
+        scene = make_raster(10, 80, 20, 30, 9)
+        window = footprint_window(self.mosaic, scene)
+        self.assertTrue(update_window(self.mosaic, scene, window))
+
+        data = self.mosaic.GetRasterBand(1).ReadAsArray()
+        self.assertTrue(np.all(data[20:50, 10:30] == 9))
+        self.assertEqual(int(data.sum()), 100 * 100 + 8 * 20 * 30)
+
+    def test_window_shape_respects_budget(self):
+        """Windows are shrunk to fit the memory budget."""
+        ds = gdal.GetDriverByName('MEM').Create('', 1000, 1000, 1, gdal.GDT_Float32)
+        width, height = window_shape(ds, tile_size=512, memory_budget=4 * 2 * 256 * 256)
+        self.assertEqual(width, 512)
+        self.assertLessEqual(width * height, 256 * 256)
+
+    def test_mean_merge_peak_stays_in_budget(self):
+        """The window budget counts every source read and the mean kernel's float64 temporaries."""
+        budget = 1024 * 1024
+        out_ds = gdal.GetDriverByName('MEM').Create('', 400, 400, 1, gdal.GDT_Float32)
+        scenes = [make_raster(0, 400, 400, 400, value, data_type=gdal.GDT_Float32) for value in (1, 2, 6)]
+        tracemalloc.start()
+        try:
+            stream_merge(out_ds, [(scene, 0, 0) for scene in scenes], mean, memory_budget=budget)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, budget)
+        self.assertTrue(np.all(out_ds.GetRasterBand(1).ReadAsArray() == 3))
+
+    def test_stream_merge_small_windows(self):
+        """A merge in tiny windows matches the whole-array result."""
+        out_ds = gdal.GetDriverByName('MEM').Create('', 100, 100, 1, gdal.GDT_Byte)
+        scene = make_raster(0, 100, 30, 40, 9)
+        stream_merge(out_ds, [(self.mosaic, 0, 0), (scene, 50, 10)], last_valid, tile_size=7)
+
+        data = out_ds.GetRasterBand(1).ReadAsArray()
+        self.assertTrue(np.all(data[10:50, 50:80] == 9))
+        self.assertEqual(int(data.sum()), 100 * 100 + 8 * 30 * 40)
+
+    def test_merge_windows_skip_untouched_tiles(self):
+        """A list of regions only yields the windows that touch one of them."""
+        windows = merge_windows(self.mosaic, tile_size=10, region=[(0, 0, 5, 5), (85, 85, 10, 10)])
+        self.assertEqual(windows, [(0, 0, 10, 10), (80, 80, 10, 10), (90, 80, 5, 10),
+                                   (80, 90, 10, 5), (90, 90, 5, 5)])
+
+    def test_stream_merge_can_be_cancelled(self):
+        """A progress callback returning False stops the merge after that window."""
+        out_ds = gdal.GetDriverByName('MEM').Create('', 100, 100, 1, gdal.GDT_Byte)
+        calls = []
+
+        def progress(done, total):
+            calls.append((done, total))
+            return done < 2
+
+        completed = stream_merge(out_ds, [(self.mosaic, 0, 0)], last_valid, tile_size=50, progress=progress)
+        self.assertFalse(completed)
+        self.assertEqual(calls, [(1, 4), (2, 4)])
+        self.assertEqual(int(out_ds.GetRasterBand(1).ReadAsArray().sum()), 2 * 50 * 50)
+
+    def test_stream_merge_reports_stage_timings(self):
+        """Time spent reading, compositing and writing is added to the timings dict."""
+        out_ds = gdal.GetDriverByName('MEM').Create('', 100, 100, 1, gdal.GDT_Byte)
+        timings = {}
+        stream_merge(out_ds, [(self.mosaic, 0, 0)], last_valid, tile_size=50, timings=timings)
+        self.assertEqual(sorted(timings), ['composite', 'read', 'write'])
+        self.assertTrue(all(seconds >= 0 for seconds in timings.values()))
+
+    def test_union_grid_places_by_geotransform(self):
+        """Each input lands in its georeferenced window of the union grid."""
+        scene = make_raster(150, 120, 10, 10, 9)
+        gt, xsize, ysize = union_grid([self.mosaic, scene])
+        self.assertEqual((gt[0], gt[3], xsize, ysize), (0, 120, 160, 120))
+        self.assertEqual(place_on_grid(gt, self.mosaic)[1:], (0, 20))
+        self.assertEqual(place_on_grid(gt, scene)[1:], (150, 0))
+
+    def test_uncovered_pixels_are_nodata(self):
+        """Pixels no scene covers are nodata, so a later scene over the gap fills them in."""
+        left, right = make_raster(0, 10, 10, 10, 5), make_raster(20, 10, 10, 10, 7)
+        gt, xsize, ysize = union_grid([left, right])
+        mosaic = gdal.GetDriverByName('MEM').Create('', xsize, ysize, 1, gdal.GDT_Byte)
+        mosaic.SetGeoTransform(gt)
+        mosaic.GetRasterBand(1).SetNoDataValue(output_nodata([left, right], 1, gdal.GDT_Byte))
+        stream_merge(mosaic, [place_on_grid(gt, ds) for ds in (left, right)], first_valid)
+        self.assertEqual(mosaic.GetRasterBand(1).GetNoDataValue(), 255)
+
+        gap = make_raster(5, 10, 20, 10, 9)
+        out_ds = gdal.GetDriverByName('MEM').Create('', xsize, ysize, 1, gdal.GDT_Byte)
+        out_ds.SetGeoTransform(gt)
+        out_ds.GetRasterBand(1).SetNoDataValue(output_nodata([mosaic, gap], 1, gdal.GDT_Byte))
+        stream_merge(out_ds, [place_on_grid(gt, ds) for ds in (mosaic, gap)], first_valid)
+
+        data = out_ds.GetRasterBand(1).ReadAsArray()
+        self.assertTrue(np.all(data[:, 0:10] == 5))
+        self.assertTrue(np.all(data[:, 10:20] == 9))
+        self.assertTrue(np.all(data[:, 20:30] == 7))
+
+    def test_unaligned_scene_is_resampled(self):
+        """A scene at another resolution is snapped onto the grid."""
+        scene = make_raster(10, 80, 10, 10, 9, pixel_size=2.0)
+        placed, xoff, yoff = place_on_grid(self.mosaic.GetGeoTransform(), scene)
+        self.assertEqual((xoff, yoff, placed.RasterXSize, placed.RasterYSize), (10, 20, 20, 20))
+
+    def test_common_data_type_keeps_native_type(self):
+        """Equal inputs keep their type; mixed inputs promote only as far as needed."""
+        byte = make_raster(0, 10, 10, 10, 1)
+        uint16 = make_raster(0, 10, 10, 10, 1, data_type=gdal.GDT_UInt16)
+        int16 = make_raster(0, 10, 10, 10, 1, data_type=gdal.GDT_Int16)
+        self.assertEqual(common_data_type([byte, byte]), gdal.GDT_Byte)
+        self.assertEqual(common_data_type([byte, uint16]), gdal.GDT_UInt16)
+        self.assertEqual(common_data_type([uint16, int16]), gdal.GDT_Int32)
+
+    def test_common_data_type_holds_nodata(self):
+        """A nodata value outside the band type widens the output type."""
+        byte = make_raster(0, 10, 10, 10, 1)
+        byte.GetRasterBand(1).SetNoDataValue(-9999)
+        self.assertEqual(common_data_type([byte]), gdal.GDT_Int16)
+
+    def test_packed_merge_round_trips(self):
+        """Float values packed into UInt16 come back within one quantization step."""
+        scene = make_raster(0, 100, 100, 100, 0, data_type=gdal.GDT_Float32)
+        values = np.linspace(-5.0, 20.0, 100 * 100, dtype=np.float32).reshape(100, 100)
+        scene.GetRasterBand(1).WriteArray(values)
+        scale, offset = value_packing([scene])
+        out_ds = gdal.GetDriverByName('MEM').Create('', 100, 100, 1, gdal.GDT_UInt16)
+        stream_merge(out_ds, [(scene, 0, 0)], last_valid, packings=[(scale, offset)])
+
+        unpacked = out_ds.GetRasterBand(1).ReadAsArray() * scale + offset
+        self.assertLessEqual(float(np.abs(unpacked - values).max()), scale)
+
+    def test_wider_scene_does_not_fit_mosaic(self):
+        """A UInt16 or Float32 scene cannot be written into a Byte mosaic in place."""
+        byte = make_raster(10, 80, 20, 30, 9)
+        uint16 = make_raster(10, 80, 20, 30, 300, data_type=gdal.GDT_UInt16)
+        float32 = make_raster(10, 80, 20, 30, 0.5, data_type=gdal.GDT_Float32)
+        self.assertTrue(fits_data_type(self.mosaic, [byte]))
+        self.assertFalse(fits_data_type(self.mosaic, [byte, uint16]))
+        self.assertFalse(fits_data_type(self.mosaic, [float32]))
+        self.assertTrue(fits_data_type(make_raster(0, 100, 100, 100, 1, data_type=gdal.GDT_Float32), [uint16]))
+
+    def test_packed_mosaic_fits_float_scene(self):
+        """Float scenes are quantized into a packed mosaic, so it is updated in place."""
+        packed = make_raster(0, 100, 100, 100, 1, data_type=gdal.GDT_UInt16)
+        packed.GetRasterBand(1).SetScale(0.01)
+        float32 = make_raster(10, 80, 20, 30, 0.5, data_type=gdal.GDT_Float32)
+        self.assertTrue(fits_data_type(packed, [float32]))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RasterMergeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,130 @@
+# coding=utf-8
+"""Write coalescer test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'example3'
+__date__ = '2024-08-13'
+__copyright__ = 'Copyright 2024, example3'
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from write_coalescer import OwnWrites, WriteCoalescer
+
+
+class WriteCoalescerTest(unittest.TestCase):
+    """Test that bursts of events become a single callback."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'scene.tif')
+        self.released = []
+        self.coalescer = WriteCoalescer(self.released.append, quiet_period=1.0)
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.folder)
+
+    def write_chunk(self, now=0.0):
+        with open(self.path, 'ab') as handle:
+            handle.write(b'0' * 64)
+        self.coalescer.touch(self.path, now=now)
+
+    def release_ready(self, now):
+        for path, signature in self.coalescer.poll(now=now):
+            self.coalescer.release(path, signature)
+
+    def test_released_once_after_quiet_period(self):
+        """A file written in chunks is released once it stops changing."""
+        for _ in range(5):
+            self.write_chunk()
+            self.release_ready(now=0.0)
+        self.release_ready(now=0.5)
+        self.assertEqual(self.released, [])
+        self.release_ready(now=1.5)
+        self.assertEqual(self.released, [self.path])
+
+        # Late events for the same unchanged file are not released again
+        self.coalescer.touch(self.path, now=2.0)
+        self.release_ready(now=2.0)
+        self.release_ready(now=5.0)
+        self.assertEqual(self.released, [self.path])
+
+    def test_failing_callback_does_not_stop_thread(self):
+        """A callback that raises for one file is logged and later files are still released."""
+        def callback(path):
+            if path.endswith('bad.tif'):
+                raise RuntimeError('cannot open')
+            self.released.append(path)
+
+        errors = []
+        coalescer = WriteCoalescer(callback, quiet_period=0.0, check_interval=0.05, log=errors.append)
+        paths = [os.path.join(self.folder, name) for name in ('bad.tif', 'good.tif')]
+        for path in paths:
+            with open(path, 'wb') as handle:
+                handle.write(b'0' * 64)
+            coalescer.touch(path)
+        coalescer.start()
+        try:
+            deadline = time.monotonic() + 5.0
+            while not self.released and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(coalescer.thread.is_alive())
+        finally:
+            coalescer.stop()
+        self.assertEqual(self.released, [paths[1]])
+        self.assertEqual(len(errors), 1)
+        self.assertIn('cannot open', errors[0])
+
+    def test_old_releases_are_forgotten(self):
+        """Releases older than the retention are pruned, so the registry stays bounded."""
+        coalescer = WriteCoalescer(self.released.append, quiet_period=1.0, retention=10.0)
+        self.write_chunk()
+        coalescer.closed(self.path)
+        for path, signature in coalescer.poll(now=0.0):
+            coalescer.release(path, signature, now=0.0)
+        self.assertIn(self.path, coalescer.released)
+        coalescer.poll(now=5.0)
+        self.assertIn(self.path, coalescer.released)
+        coalescer.poll(now=11.0)
+        self.assertEqual(coalescer.released, {})
+
+    def test_close_write_releases_immediately(self):
+        """A close-write event does not wait for the quiet period."""
+        self.write_chunk()
+        self.coalescer.closed(self.path)
+        # Released by the coalescer's own poll, not on the thread reporting the event
+        self.assertEqual(self.released, [])
+        self.release_ready(now=0.0)
+        self.assertEqual(self.released, [self.path])
+        self.assertEqual(self.coalescer.pending, {})
+
+    def test_own_writes_are_recognised(self):
+        """The plugin's own writes are ignored until someone else changes the file."""
+        own_writes = OwnWrites()
+        self.assertFalse(own_writes.is_own(self.path))
+        with own_writes.writing(self.path):
+            self.assertTrue(own_writes.is_own(self.path))
+            self.write_chunk()
+        # Events delivered after the write finished still match what we left
+        self.assertTrue(own_writes.is_own(self.path))
+
+        with open(self.path, 'ab') as handle:
+            handle.write(b'external')
+        self.assertFalse(own_writes.is_own(self.path))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(WriteCoalescerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
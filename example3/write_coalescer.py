@@ -0,0 +1,169 @@
+"""Hold file system events until the file has finished being written.
+
+Also keeps the registry of files the plugin writes itself, whose events
+must not be mistaken for new scenes.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WriteCoalescer:
+    """Collapse bursts of events into one callback per completed file.
+
+    A path is released once its size and mtime stay unchanged for
+    `quiet_period` seconds, or as soon as a close-write event is seen.
+    For `retention` seconds after a release, a file whose size and mtime
+    still match is not released again; older releases are forgotten so the
+    registry does not grow over a long campaign.
+    `callback` is only called on the coalescer's own thread, never on the
+    thread reporting the events, so a callback that blocks cannot stall them.
+    An exception it raises is reported through log(message).
+    """
+
+    def __init__(self, callback, quiet_period=2.0, check_interval=0.5, retention=300.0, log=print):
+        self.callback = callback
+        self.quiet_period = quiet_period
+        self.check_interval = check_interval
+        self.retention = retention
+        self.log = log
+        self.pending = {}  # path -> ((size, mtime_ns), monotonic time of last change)
+        self.released = {}  # path -> ((size, mtime_ns), monotonic time of release)
+        self.closed_paths = set()  # paths with a close-write event, released on the next poll
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def touch(self, path, now=None):
+        """Record a created/modified event for `path`."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            signature = self.pending.get(path, (None, None))[0]
+            self.pending[path] = (signature, now)
+        self.wakeup.set()
+
+    def closed(self, path):
+        """Record a close-write event: the writer is done with `path`, so it is released on the next poll."""
+        with self.lock:
+            self.pending.pop(path, None)
+            self.closed_paths.add(path)
+        self.wakeup.set()
+
+    def run(self):
+        while self.running:
+            self.wakeup.wait(self.check_interval)
+            self.wakeup.clear()
+            for path, signature in self.poll():
+                try:
+                    self.release(path, signature)
+                except Exception as e:
+                    # One failing file must not stop the thread releasing the others
+                    self.log(f"Error handling completed file '{path}': {e}")
+
+    def poll(self, now=None):
+        """Return (path, signature) for every closed file and every pending file that has gone quiet."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            closed = list(self.closed_paths)
+            self.closed_paths.clear()
+            items = list(self.pending.items())
+        ready = [(path, file_signature(path)) for path in closed]
+
+        changed, quiet, gone = {}, {}, []
+        for path, (signature, changed_at) in items:
+            current = file_signature(path)
+            if current is None:
+                gone.append(path)
+            elif current != signature:
+                changed[path] = (current, now)
+            elif now - changed_at >= self.quiet_period:
+                quiet[path] = current
+
+        seen = dict(items)
+        with self.lock:
+            for path in [path for path, (_, released_at) in self.released.items()
+                         if now - released_at > self.retention]:
+                del self.released[path]
+            # An event that arrived while we were stat-ing wins over our view
+            untouched = [path for path in seen if self.pending.get(path) is seen[path]]
+            for path in untouched:
+                if path in changed:
+                    self.pending[path] = changed[path]
+                elif path in quiet or path in gone:
+                    del self.pending[path]
+        return ready + [(path, quiet[path]) for path in untouched if path in quiet]
+
+    def release(self, path, signature, now=None):
+        if signature is None:
+            return
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.released.get(path, (None, None))[0] == signature:
+                return
+            self.released[path] = (signature, now)
+        self.callback(path)
+
+
+class OwnWrites:
+    """Registry of paths the pipeline itself writes, so the event handler can ignore them.
+
+    A path counts as our own while it is being written and afterwards for as
+    long as its size and mtime are still the ones our write left behind, so a
+    later external write to the same path is ingested as usual. Paths are
+    compared as absolute paths.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}  # path -> number of writes in progress
+        self.written = {}  # path -> (size, mtime_ns) after our last write
+
+    @contextmanager
+    def writing(self, *paths):
+        """Register paths for the duration of a with block that writes or renames onto them."""
+        paths = [os.path.abspath(path) for path in paths]
+        with self.lock:
+            for path in paths:
+                self.active[path] = self.active.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            signatures = [file_signature(path) for path in paths]
+            with self.lock:
+                for path, signature in zip(paths, signatures):
+                    self.written[path] = signature
+                    self.active[path] -= 1
+                    if not self.active[path]:
+                        del self.active[path]
+
+    def is_own(self, path):
+        """True if an event for path was caused by the pipeline's own write."""
+        path = os.path.abspath(path)
+        with self.lock:
+            if path in self.active:
+                return True
+            signature = self.written.get(path)
+        return signature is not None and signature == file_signature(path)
+
+
+def file_signature(path):
+    """Return (size, mtime_ns) of `path`, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns